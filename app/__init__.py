@@ -3,6 +3,8 @@ from flask import Flask
 from .core.config import PROJECT_ROOT
 from .core.utils import ensure_workspace
 from .modules import register_blueprints
+from .modules.ai_clean.pose_model import start_pose_warmup
+from .modules.ai_generate.service import resume_generation_jobs
 
 def create_app():
     app = Flask(
@@ -13,6 +15,8 @@ def create_app():
 
     ensure_workspace()
     register_blueprints(app)
+    start_pose_warmup()
+    resume_generation_jobs()
 
     return app
 
@@ -1,5 +1,6 @@
 import os
 import platform
+import re
 from pathlib import Path
 
 
@@ -22,9 +23,24 @@ GENERATED_BUCKET_DIR = WORKSPACE_ROOT / "generated"
 TAGS_BUCKET_DIR = WORKSPACE_ROOT / "tags"
 TEMP_DIR = WORKSPACE_ROOT / "tmp"
 THUMBNAIL_DIR = WORKSPACE_ROOT / "thumbnails"
+CACHE_DIR = WORKSPACE_ROOT / "cache"
+POSE_CACHE_DIR = CACHE_DIR / "pose"
+GENERATION_JOBS_DB = WORKSPACE_ROOT / "generation_jobs.sqlite3"
+# 已结束的批量生成任务记录保留天数
+GENERATION_JOB_RETENTION_DAYS = max(0, int(os.environ.get("GENERATION_JOB_RETENTION_DAYS", "7")))
 
 ULTRALYTICS_WEIGHTS_DIR = BASE_MODEL_DIR / "ultralytics" / "weights"
 YOLO_POSE_WEIGHTS = Path(os.environ.get("YOLO_POSE_WEIGHTS", str(ULTRALYTICS_WEIGHTS_DIR / "YOLO26m-pose.pt")))
+YOLO_POSE_BATCH_SIZE = max(1, int(os.environ.get("YOLO_POSE_BATCH_SIZE", "8")))
+YOLO_POSE_PREFETCH_WORKERS = max(1, int(os.environ.get("YOLO_POSE_PREFETCH_WORKERS", "4")))
+YOLO_POSE_PREFETCH_DEPTH = max(1, int(os.environ.get("YOLO_POSE_PREFETCH_DEPTH", "2")))
+YOLO_POSE_WARMUP = os.environ.get("YOLO_POSE_WARMUP", "").strip().lower() in {"1", "true", "yes", "on"}
+YOLO_POSE_IDLE_TTL = int(os.environ.get("YOLO_POSE_IDLE_TTL", "1800"))
+YOLO_POSE_BACKEND = os.environ.get("YOLO_POSE_BACKEND", "pt").strip().lower()
+YOLO_POSE_IMGSZ = max(32, int(os.environ.get("YOLO_POSE_IMGSZ", "640")))
+YOLO_POSE_TORCH_THREADS = max(0, int(os.environ.get("YOLO_POSE_TORCH_THREADS", "0")))
+# 大于 1 时骨骼点推理分派到多个子进程，每个进程各自加载一份模型；0/1 表示在 Web 进程内推理
+YOLO_POSE_WORKERS = max(0, int(os.environ.get("YOLO_POSE_WORKERS", "0")))
 
 MEDIA_BUCKETS = {
     "source": SOURCE_BUCKET_DIR,
@@ -56,6 +72,33 @@ RUNNINGHUB_DEFAULT_IMAGE_PROMPT = os.environ.get(
     "请参考原图，在保持主体特征和整体构图一致的前提下，生成更精致、更完整的高质量成图。",
 )
 RUNNINGHUB_DEFAULT_ASPECT_RATIO = os.environ.get("RUNNINGHUB_DEFAULT_ASPECT_RATIO", "auto")
+# 批量生成时同时在途（上传/排队/运行/下载）的任务数，可被请求中的 concurrency 覆盖
+RUNNINGHUB_CONCURRENCY = max(1, int(os.environ.get("RUNNINGHUB_CONCURRENCY", "4")))
+RUNNINGHUB_MAX_CONCURRENCY = 16
+# 启动时继续上次进程退出前未完成的批量生成任务
+RUNNINGHUB_RESUME_JOBS = os.environ.get("RUNNINGHUB_RESUME_JOBS", "1").strip().lower() in {"1", "true", "yes", "on"}
+# 所有在途任务共用一个轮询线程，状态查询的总速率上限（次/秒）
+RUNNINGHUB_POLL_MAX_QPS = float(os.environ.get("RUNNINGHUB_POLL_MAX_QPS", "4"))
+# 本服务对 RunningHub 可达的外部地址（如 http://1.2.3.4:6008）；配置后任务完成通过回调通知，轮询只作兜底
+RUNNINGHUB_WEBHOOK_BASE_URL = os.environ.get("RUNNINGHUB_WEBHOOK_BASE_URL", "").strip()
+RUNNINGHUB_WEBHOOK_TOKEN = os.environ.get("RUNNINGHUB_WEBHOOK_TOKEN", "").strip()
+# 已上传输入图的 download_url 复用时长（秒），0 表示不缓存
+RUNNINGHUB_UPLOAD_CACHE_TTL = int(os.environ.get("RUNNINGHUB_UPLOAD_CACHE_TTL", str(12 * 3600)))
+RUNNINGHUB_WEBHOOK_POLL_INTERVAL = max(5, int(os.environ.get("RUNNINGHUB_WEBHOOK_POLL_INTERVAL", "60")))
+# API Key 池（逗号或换行分隔）；请求中未填写 api_key 时使用，批量任务按负载分摊到各个 Key
+RUNNINGHUB_API_KEYS = list(dict.fromkeys(key for key in re.split(r"[\s,;]+", os.environ.get("RUNNINGHUB_API_KEYS", "")) if key))
+# 每个 Key 同时在途的任务数上限，以及请求速率（令牌桶：每秒补充数 / 桶容量）
+RUNNINGHUB_KEY_CONCURRENCY = max(1, int(os.environ.get("RUNNINGHUB_KEY_CONCURRENCY", str(RUNNINGHUB_MAX_CONCURRENCY))))
+RUNNINGHUB_KEY_RATE = max(0.1, float(os.environ.get("RUNNINGHUB_KEY_RATE", "5")))
+RUNNINGHUB_KEY_BURST = max(1, int(os.environ.get("RUNNINGHUB_KEY_BURST", "10")))
+# Key 返回配额类错误（队列已满、余额不足、429）后暂停使用的基础时长（秒），连续出现时翻倍
+RUNNINGHUB_KEY_QUOTA_BACKOFF = max(1, int(os.environ.get("RUNNINGHUB_KEY_QUOTA_BACKOFF", "60")))
+# 对外 HTTP 请求共用的连接池：缓存的主机数、每个主机保留的连接数、TCP keep-alive 空闲探测间隔与默认超时（秒）
+HTTP_POOL_CONNECTIONS = max(1, int(os.environ.get("HTTP_POOL_CONNECTIONS", "10")))
+HTTP_POOL_MAXSIZE = max(1, int(os.environ.get("HTTP_POOL_MAXSIZE", str(RUNNINGHUB_MAX_CONCURRENCY * 2))))
+HTTP_KEEPALIVE_IDLE = max(0, int(os.environ.get("HTTP_KEEPALIVE_IDLE", "60")))
+HTTP_CONNECT_TIMEOUT = max(1.0, float(os.environ.get("HTTP_CONNECT_TIMEOUT", "10")))
+HTTP_READ_TIMEOUT = max(1.0, float(os.environ.get("HTTP_READ_TIMEOUT", "120")))
 RUNNINGHUB_ALLOWED_ASPECT_RATIOS = (
     "auto",
     "1:1",
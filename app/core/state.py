@@ -32,6 +32,7 @@ task_state: Dict[str, Dict] = {
         "total": 0,
         "processed": 0,
         "bucket": "source",
+        "needs_key": False,
     },
     "ai_tag": {
         "status": "idle",
@@ -53,6 +54,7 @@ task_state: Dict[str, Dict] = {
         "total": 0,
         "processed": 0,
         "bucket": "source",
+        "pipeline": {},
     },
 }
 
@@ -11,6 +11,7 @@ from werkzeug.utils import secure_filename
 
 from .config import (
     BASE_MODEL_DIR,
+    CACHE_DIR,
     GENERATED_BUCKET_DIR,
     MEDIA_BUCKETS,
     SOURCE_BUCKET_DIR,
@@ -35,6 +36,7 @@ def ensure_workspace() -> None:
         TAGS_BUCKET_DIR,
         TEMP_DIR,
         THUMBNAIL_DIR,
+        CACHE_DIR,
     ):
         Path(path).mkdir(parents=True, exist_ok=True)
 
@@ -0,0 +1,220 @@
+"""AI 清洗相关的基准测试。
+
+python -m app.modules.ai_clean.benchmark                      # 精确匹配的瓶颈指派微基准
+python -m app.modules.ai_clean.benchmark pose --limit 64      # 各推理配置的骨骼点检测吞吐
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from app.core.config import SOURCE_BUCKET_DIR, SUPPORTED_IMAGE_EXTENSIONS, YOLO_POSE_BATCH_SIZE, YOLO_POSE_WEIGHTS
+from .pose_math import bottleneck_assignment
+from .pose_model import (
+    ACTIVE_PROFILE,
+    PoseInferenceProfile,
+    exported_weights_path,
+    load_pose_model,
+    preserve_torch_threads,
+)
+from .pose_service import _extract_persons_from_result
+
+
+def _legacy_bottleneck_assignment(matrix: List[List[float]]) -> tuple[float | None, dict[int, int] | None]:
+    """旧实现：按降序逐个阈值尝试，每次从头跑一遍 DFS 增广（Kuhn），仅作对照。"""
+    if not matrix or not matrix[0]:
+        return None, None
+    ref_count, cand_count = len(matrix), len(matrix[0])
+    if cand_count < ref_count:
+        return None, None
+
+    def full_matching(ref_to_cands: List[List[int]]) -> dict[int, int] | None:
+        matched_to_ref = [-1] * cand_count
+
+        def dfs(ref_index: int, seen: List[bool]) -> bool:
+            for cand_index in ref_to_cands[ref_index]:
+                if seen[cand_index]:
+                    continue
+                seen[cand_index] = True
+                if matched_to_ref[cand_index] == -1 or dfs(matched_to_ref[cand_index], seen):
+                    matched_to_ref[cand_index] = ref_index
+                    return True
+            return False
+
+        for ref_index in range(ref_count):
+            if not dfs(ref_index, [False] * cand_count):
+                return None
+        return {ref: cand for cand, ref in enumerate(matched_to_ref) if ref != -1}
+
+    for threshold in sorted({round(value, 2) for row in matrix for value in row if value > 0}, reverse=True):
+        matching = full_matching([[index for index, value in enumerate(row) if value >= threshold] for row in matrix])
+        if matching is not None:
+            return float(threshold), matching
+    return None, None
+
+
+def _time_per_call(fn: Callable, matrices: List[List[List[float]]], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for matrix in matrices:
+            fn(matrix)
+        best = min(best, time.perf_counter() - started)
+    return best / len(matrices)
+
+
+def _sample_matrix(rng: np.random.Generator, refs: int, cands: int, crowd: bool) -> List[List[float]]:
+    if not crowd:
+        return (rng.random((refs, cands)) * 100.0).tolist()
+    # 人群照：所有参考人体都偏好同几个候选人，旧实现要往下试很多阈值
+    column_quality = rng.random(cands) * 100.0
+    return np.clip(column_quality[None, :] + rng.normal(0.0, 3.0, (refs, cands)), 0.0, 100.0).tolist()
+
+
+def bench_bottleneck(
+    refs: int = 10,
+    cands: int = 50,
+    samples: int = 50,
+    repeat: int = 3,
+    seed: int = 0,
+    crowd: bool = False,
+) -> dict:
+    rng = np.random.default_rng(seed)
+    matrices = [_sample_matrix(rng, refs, cands, crowd) for _ in range(samples)]
+    for matrix in matrices:
+        legacy_threshold, _ = _legacy_bottleneck_assignment(matrix)
+        threshold, _ = bottleneck_assignment(matrix)
+        # 两种实现的两位小数舍入方式不同，允许差一个刻度
+        if (legacy_threshold is None) != (threshold is None) or (
+            threshold is not None and abs(legacy_threshold - threshold) > 0.011
+        ):
+            raise AssertionError(f"阈值不一致：{legacy_threshold} != {threshold}")
+
+    legacy = _time_per_call(_legacy_bottleneck_assignment, matrices, repeat)
+    current = _time_per_call(bottleneck_assignment, matrices, repeat)
+    return {
+        "shape": f"{refs}x{cands}{' crowd' if crowd else ''}",
+        "legacy_ms": round(legacy * 1000, 3),
+        "current_ms": round(current * 1000, 3),
+        "speedup": round(legacy / current, 1) if current else None,
+    }
+
+
+def _sample_images(directory: Path, limit: int) -> List[Image.Image]:
+    paths = sorted(path for path in directory.rglob("*") if path.suffix.lower() in SUPPORTED_IMAGE_EXTENSIONS)[:limit]
+    images = []
+    for path in paths:
+        try:
+            with Image.open(path) as image:
+                images.append(ImageOps.exif_transpose(image).convert("RGB"))
+        except Exception:
+            continue
+    return images
+
+
+def _export_if_missing(profile: PoseInferenceProfile) -> None:
+    if profile.backend == "pt" or exported_weights_path(Path(YOLO_POSE_WEIGHTS), profile.backend).exists():
+        return
+    model, _, _ = load_pose_model(PoseInferenceProfile("pt", profile.imgsz, profile.threads))
+    # 动态输入导出一次即可覆盖各种 imgsz 与批大小
+    model.export(format=profile.backend, imgsz=profile.imgsz, dynamic=True)
+
+
+def bench_pose_profile(profile: PoseInferenceProfile, images: List[Image.Image], batch_size: int) -> dict:
+    started = time.perf_counter()
+    model, backend, fallback = load_pose_model(profile)
+    load_seconds = time.perf_counter() - started
+    kwargs = profile.predict_kwargs()
+    model(images[:1], verbose=False, **kwargs)  # 预热，排除首批的图构建开销
+
+    person_counts: List[int] = []
+    started = time.perf_counter()
+    for offset in range(0, len(images), batch_size):
+        for result in model(images[offset : offset + batch_size], verbose=False, **kwargs):
+            person_counts.append(len(_extract_persons_from_result(result)))
+    elapsed = time.perf_counter() - started
+    return {
+        "profile": profile.label,
+        "backend": backend,
+        "fallback": fallback,
+        "load_seconds": round(load_seconds, 2),
+        "images_per_second": round(len(images) / elapsed, 2) if elapsed else None,
+        "person_counts": person_counts,
+    }
+
+
+def run_pose_benchmark(args) -> None:
+    images = _sample_images(Path(args.images), args.limit)
+    if not images:
+        print(f"{args.images} 下没有可用的样例图片")
+        return
+    profiles = [PoseInferenceProfile.parse(text) for text in args.profiles.split(",") if text.strip()]
+    print(f"样例图片 {len(images)} 张，批大小 {args.batch}")
+
+    baseline: List[int] | None = None
+    for profile in profiles:
+        # 每个配置都从进程原本的线程数开始，threads=0（自动）不会沿用上一个配置设置的值
+        with preserve_torch_threads():
+            if args.export:
+                try:
+                    _export_if_missing(profile)
+                except Exception as exc:
+                    print(f"{profile.label}: 导出失败：{exc}")
+            try:
+                result = bench_pose_profile(profile, images, args.batch)
+            except Exception as exc:
+                print(f"{profile.label}: 失败：{exc}")
+                continue
+        counts = result.pop("person_counts")
+        baseline = baseline if baseline is not None else counts
+        # 与第一个配置比较每张图检出人数是否一致，作为精度是否可接受的粗略参考
+        agreement = sum(1 for left, right in zip(baseline, counts) if left == right) / len(counts) if counts else 0.0
+        note = f"（{result['fallback']}）" if result["fallback"] else ""
+        print(
+            f"{result['profile']} [{result['backend']}]: {result['images_per_second']} 张/秒，"
+            f"加载 {result['load_seconds']} 秒，人数一致率 {agreement:.0%}{note}"
+        )
+
+
+def run_bottleneck_benchmark(args) -> None:
+    for crowd in (False, True):
+        result = bench_bottleneck(args.refs, args.cands, args.samples, crowd=crowd)
+        print(
+            f"bottleneck {result['shape']}: 旧实现 {result['legacy_ms']} ms/次，"
+            f"新实现 {result['current_ms']} ms/次，加速 {result['speedup']}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AI 清洗基准测试")
+    parser.set_defaults(handler=run_bottleneck_benchmark, refs=10, cands=50, samples=50)
+    subparsers = parser.add_subparsers()
+
+    bottleneck = subparsers.add_parser("bottleneck", help="精确匹配的瓶颈指派微基准")
+    bottleneck.add_argument("--refs", type=int, default=10)
+    bottleneck.add_argument("--cands", type=int, default=50)
+    bottleneck.add_argument("--samples", type=int, default=50)
+    bottleneck.set_defaults(handler=run_bottleneck_benchmark)
+
+    pose = subparsers.add_parser("pose", help="各推理配置的骨骼点检测吞吐（张/秒）")
+    pose.add_argument("--images", default=str(SOURCE_BUCKET_DIR), help="样例图片目录，默认为素材目录")
+    pose.add_argument("--limit", type=int, default=64)
+    pose.add_argument("--batch", type=int, default=YOLO_POSE_BATCH_SIZE)
+    pose.add_argument(
+        "--profiles",
+        default=f"{ACTIVE_PROFILE.backend}:{ACTIVE_PROFILE.imgsz}:{ACTIVE_PROFILE.threads},pt:480,pt:320,onnx:640,openvino:640",
+        help="逗号分隔的 后端:输入尺寸:线程数，例如 pt:640,onnx:480:4",
+    )
+    pose.add_argument("--export", action="store_true", help="缺少 onnx/openvino 导出文件时先从 .pt 导出")
+    pose.set_defaults(handler=run_pose_benchmark)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+from PIL import Image
+
+from app.core.state import append_log, state_lock, task_state, update_state
+from app.core.utils import get_timestamp, normalize_relative_path, safe_bucket_path
+from app.shared.storage.media_store import delete_images_and_associations, gather_media_items
+from .hashing import (
+    DEFAULT_HASH_ALGORITHM,
+    DEFAULT_HASH_SIZE,
+    HASH_ALGORITHMS,
+    get_cached_hashes,
+)
+
+
+DEFAULT_DEDUPE_THRESHOLD = 95.0
+# 阈值越低允许的汉明距离越大，分段越多越短，几乎所有哈希都会落进同一个桶，候选比较退化为两两比较；
+# 85% 时 64 位哈希最多相差 9 位，切成 10 段、每段约 6 位
+MIN_DEDUPE_THRESHOLD = 85.0
+MAX_DEDUPE_GROUPS = 1000
+
+_dedupe_lock = threading.RLock()
+_dedupe_result: Dict = {"status": "idle", "groups": [], "non_keepers": [], "bucket": "source"}
+
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.rank = [0] * size
+
+    def find(self, index: int) -> int:
+        root = index
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[index] != root:
+            self.parent[index], index = root, self.parent[index]
+        return root
+
+    def union(self, left: int, right: int) -> bool:
+        left_root, right_root = self.find(left), self.find(right)
+        if left_root == right_root:
+            return False
+        if self.rank[left_root] < self.rank[right_root]:
+            left_root, right_root = right_root, left_root
+        self.parent[right_root] = left_root
+        if self.rank[left_root] == self.rank[right_root]:
+            self.rank[left_root] += 1
+        return True
+
+
+def _band_ranges(bits: int, max_distance: int) -> List[tuple[int, int]]:
+    # 鸽巢原理：汉明距离 ≤ d 的两个哈希切成 d+1 段后，至少有一段完全相同
+    bands = max(1, min(bits, max_distance + 1))
+    ranges = []
+    for band in range(bands):
+        start = band * bits // bands
+        end = (band + 1) * bits // bands
+        ranges.append((start, end))
+    return ranges
+
+
+def cluster_hashes(hashes: List[int], *, bits: int, max_distance: int) -> List[List[int]]:
+    union_find = _UnionFind(len(hashes))
+    for start, end in _band_ranges(bits, max_distance):
+        mask = (1 << (end - start)) - 1
+        buckets: Dict[int, List[int]] = {}
+        for index, value in enumerate(hashes):
+            buckets.setdefault((value >> start) & mask, []).append(index)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            # 完全相同的哈希直接合并，只在不同取值之间做两两比较
+            representatives: Dict[int, int] = {}
+            for index in members:
+                value = hashes[index]
+                if value in representatives:
+                    union_find.union(representatives[value], index)
+                else:
+                    representatives[value] = index
+            unique = list(representatives.items())
+            for offset, (left_value, left) in enumerate(unique):
+                for right_value, right in unique[offset + 1 :]:
+                    if (left_value ^ right_value).bit_count() > max_distance:
+                        continue
+                    union_find.union(left, right)
+
+    clusters: Dict[int, List[int]] = {}
+    for index in range(len(hashes)):
+        clusters.setdefault(union_find.find(index), []).append(index)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def _pixel_area(path: Path) -> int:
+    try:
+        with Image.open(path) as image:
+            width, height = image.size
+        return int(width) * int(height)
+    except Exception:
+        return 0
+
+
+def _pick_keeper(items: List[dict], bucket: str) -> int:
+    def rank(index: int):
+        item = items[index]
+        area = _pixel_area(safe_bucket_path(bucket, item["relative_path"]))
+        return (area, int(item.get("size") or 0), -float(item.get("modified") or 0.0))
+
+    return max(range(len(items)), key=rank)
+
+
+def find_duplicate_groups(
+    bucket: str = "source",
+    *,
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+    hash_size: int = DEFAULT_HASH_SIZE,
+    threshold: float = DEFAULT_DEDUPE_THRESHOLD,
+) -> Dict:
+    items = gather_media_items(bucket)
+    total = len(items)
+    update_state("ai_clean", total=total)
+    append_log("ai_clean", f"[{get_timestamp()}] 🧬 开始数据集去重，共 {total} 张图片")
+
+    hashed_items: List[dict] = []
+    hashes: List[int] = []
+    for processed, item in enumerate(items, start=1):
+        try:
+            image_path = safe_bucket_path(bucket, item["relative_path"])
+            hashes.append(get_cached_hashes(image_path, [hash_algorithm], hash_size=hash_size)[hash_algorithm])
+            hashed_items.append(item)
+        except Exception:
+            pass
+        if processed == total or processed % 50 == 0:
+            update_state(
+                "ai_clean",
+                progress=int(processed / total * 90) if total else 90,
+                processed=processed,
+                message=f"已计算哈希 {processed}/{total} 张图片",
+            )
+
+    bits = HASH_ALGORITHMS[hash_algorithm].bits(hash_size)
+    max_distance = int(bits * (100.0 - threshold) / 100.0)
+    update_state("ai_clean", message="正在聚类相似图片")
+    clusters = cluster_hashes(hashes, bits=bits, max_distance=max_distance)
+
+    groups: List[dict] = []
+    non_keepers: List[str] = []
+    # 记录结果涉及的每个文件的修改时间和大小，删除前据此确认文件没有变化
+    snapshot: Dict[str, tuple] = {}
+    for members in clusters:
+        member_items = [hashed_items[index] for index in members]
+        keeper_offset = _pick_keeper(member_items, bucket)
+        keeper_hash = hashes[members[keeper_offset]]
+        duplicates = []
+        for offset, index in enumerate(members):
+            if offset == keeper_offset:
+                continue
+            distance = (keeper_hash ^ hashes[index]).bit_count()
+            duplicates.append({**hashed_items[index], "probability": round((1.0 - distance / bits) * 100.0, 2)})
+        duplicates.sort(key=lambda entry: entry["probability"], reverse=True)
+        non_keepers.extend(entry["relative_path"] for entry in duplicates)
+        for index in members:
+            snapshot[hashed_items[index]["relative_path"]] = _file_signature(hashed_items[index])
+        groups.append({"keeper": member_items[keeper_offset], "duplicates": duplicates})
+
+    groups.sort(key=lambda group: len(group["duplicates"]), reverse=True)
+    return {
+        "run_id": uuid.uuid4().hex,
+        "bucket": bucket,
+        "hash_algorithm": hash_algorithm,
+        "hash_size": hash_size,
+        "threshold": threshold,
+        "total": total,
+        "group_count": len(groups),
+        "duplicate_count": len(non_keepers),
+        "groups": groups,
+        "non_keepers": non_keepers,
+        "snapshot": snapshot,
+    }
+
+
+def _file_signature(item: dict) -> tuple:
+    return (float(item.get("modified") or 0.0), int(item.get("size") or 0))
+
+
+def _run_dedupe_job(bucket: str, hash_algorithm: str, hash_size: int, threshold: float) -> None:
+    try:
+        result = find_duplicate_groups(bucket, hash_algorithm=hash_algorithm, hash_size=hash_size, threshold=threshold)
+    except Exception as exc:
+        with _dedupe_lock:
+            _dedupe_result.update(status="error", message=str(exc))
+        update_state("ai_clean", status="error", progress=100, message=f"去重失败：{exc}")
+        append_log("ai_clean", f"[{get_timestamp()}] ❌ 去重失败：{exc}")
+        return
+
+    message = f"去重完成，共 {result['group_count']} 组重复，建议移除 {result['duplicate_count']} 张图片"
+    with _dedupe_lock:
+        _dedupe_result.clear()
+        _dedupe_result.update(result, status="success", message=message)
+    update_state("ai_clean", status="success", progress=100, processed=result["total"], message=message)
+    append_log("ai_clean", f"[{get_timestamp()}] ✅ {message}")
+
+
+def queue_dedupe(
+    bucket: str = "source",
+    *,
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM,
+    hash_size: int = DEFAULT_HASH_SIZE,
+    threshold: float = DEFAULT_DEDUPE_THRESHOLD,
+) -> tuple[bool, str]:
+    with state_lock:
+        if task_state["ai_clean"]["status"] == "running":
+            return False, "已有 AI 图片清洗任务正在执行"
+        update_state(
+            "ai_clean",
+            status="running",
+            progress=0,
+            processed=0,
+            total=0,
+            bucket=bucket,
+            message="正在执行数据集去重",
+            log=[],
+        )
+    with _dedupe_lock:
+        _dedupe_result.clear()
+        _dedupe_result.update(status="running", bucket=bucket, groups=[], non_keepers=[])
+
+    threading.Thread(
+        target=_run_dedupe_job,
+        args=(bucket, hash_algorithm, hash_size, threshold),
+        daemon=True,
+    ).start()
+    return True, "数据集去重任务已启动，请在控制台查看进度"
+
+
+def get_dedupe_result() -> Dict:
+    with _dedupe_lock:
+        payload = dict(_dedupe_result)
+    payload.pop("snapshot", None)
+    payload["groups"] = list(payload.get("groups") or [])[:MAX_DEDUPE_GROUPS]
+    return payload
+
+
+def get_dedupe_non_keepers(run_id: str = "", *, verify: bool = False) -> tuple[str, List[str]]:
+    """返回最近一次去重结果中建议移除的图片。
+
+    传入 run_id 时必须与最近一次结果一致；verify 为 True 时还会确认结果涉及的文件（含保留的图片）
+    都还在且修改时间、大小没有变化，否则要求重新去重，避免按过期的结果误删。
+    """
+    with _dedupe_lock:
+        if _dedupe_result.get("status") != "success":
+            raise ValueError("请先完成一次数据集去重")
+        if run_id and run_id != _dedupe_result.get("run_id"):
+            raise ValueError("去重结果已更新，请刷新后重试")
+        bucket = _dedupe_result.get("bucket") or "source"
+        non_keepers = list(_dedupe_result.get("non_keepers") or [])
+        snapshot = dict(_dedupe_result.get("snapshot") or {})
+    if verify:
+        current = {item["relative_path"]: _file_signature(item) for item in gather_media_items(bucket)}
+        changed = [relative for relative, signature in snapshot.items() if current.get(relative) != signature]
+        if changed:
+            raise ValueError(f"去重完成后有 {len(changed)} 张图片被修改或删除，请重新执行去重")
+    return bucket, non_keepers
+
+
+def delete_duplicate_images(targets: List[str], bucket: str = "source") -> int:
+    if bucket == "source":
+        _, removed = delete_images_and_associations(targets)
+    else:
+        removed = 0
+        for relative in targets:
+            try:
+                path = safe_bucket_path(bucket, normalize_relative_path(relative))
+            except ValueError:
+                continue
+            if path.exists() and path.is_file():
+                path.unlink(missing_ok=True)
+                removed += 1
+
+    with _dedupe_lock:
+        _dedupe_result.update(status="idle", groups=[], non_keepers=[], message=f"已删除 {removed} 张重复图片")
+    return removed
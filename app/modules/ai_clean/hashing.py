@@ -0,0 +1,186 @@
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+HashCacheEntry = Tuple[float, int]
+
+DEFAULT_HASH_ALGORITHM = "dhash"
+DEFAULT_HASH_SIZE = 8
+MIN_HASH_SIZE = 4
+MAX_HASH_SIZE = 32
+PHASH_HIGHFREQ_FACTOR = 4
+WHASH_LEVELS = 2
+
+_hash_lock = threading.RLock()
+_hash_cache: Dict[str, HashCacheEntry] = {}
+
+
+def _bits_to_int(bits: np.ndarray) -> int:
+    packed = np.packbits(np.asarray(bits, dtype=bool).ravel())
+    return int.from_bytes(packed.tobytes(), "big")
+
+
+def compute_dhash(image: Image.Image, *, hash_size: int = DEFAULT_HASH_SIZE) -> int:
+    resized = image.convert("L").resize((hash_size + 1, hash_size))
+    pixels = list(resized.getdata())
+    rows = [pixels[row_index * (hash_size + 1) : (row_index + 1) * (hash_size + 1)] for row_index in range(hash_size)]
+
+    value = 0
+    bit_index = 0
+    for row in rows:
+        for left, right in zip(row, row[1:]):
+            if left > right:
+                value |= 1 << bit_index
+            bit_index += 1
+    return value
+
+
+def compute_ahash(image: Image.Image, *, hash_size: int = DEFAULT_HASH_SIZE) -> int:
+    pixels = np.asarray(image.convert("L").resize((hash_size, hash_size), Image.LANCZOS), dtype=np.float64)
+    return _bits_to_int(pixels > pixels.mean())
+
+
+@lru_cache(maxsize=8)
+def _dct_matrix(size: int) -> np.ndarray:
+    indices = np.arange(size)
+    matrix = np.cos(np.pi * (2 * indices[None, :] + 1) * indices[:, None] / (2 * size)) * np.sqrt(2.0 / size)
+    matrix[0, :] /= np.sqrt(2.0)
+    return matrix
+
+
+def compute_phash(image: Image.Image, *, hash_size: int = DEFAULT_HASH_SIZE) -> int:
+    size = hash_size * PHASH_HIGHFREQ_FACTOR
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64)
+    dct = _dct_matrix(size)
+    low_freq = (dct @ pixels @ dct.T)[:hash_size, :hash_size]
+    # 直流分量只反映整体亮度，不参与中位数计算
+    median = np.median(low_freq.ravel()[1:])
+    return _bits_to_int(low_freq > median)
+
+
+def compute_whash(image: Image.Image, *, hash_size: int = DEFAULT_HASH_SIZE) -> int:
+    size = hash_size * (2**WHASH_LEVELS)
+    pixels = np.asarray(image.convert("L").resize((size, size), Image.LANCZOS), dtype=np.float64) / 255.0
+    for _ in range(WHASH_LEVELS):
+        # Haar 小波低频子带（LL）：每个 2x2 块求和后除以 2
+        height, width = pixels.shape
+        pixels = pixels.reshape(height // 2, 2, width // 2, 2).sum(axis=(1, 3)) / 2.0
+    return _bits_to_int(pixels > np.median(pixels))
+
+
+@dataclass(frozen=True)
+class HashAlgorithm:
+    name: str
+    label: str
+    compute: Callable[..., int]
+
+    def bits(self, hash_size: int) -> int:
+        return hash_size * hash_size
+
+
+HASH_ALGORITHMS: Dict[str, HashAlgorithm] = {
+    "dhash": HashAlgorithm("dhash", "差异哈希 dHash", compute_dhash),
+    "phash": HashAlgorithm("phash", "感知哈希 pHash (DCT)", compute_phash),
+    "ahash": HashAlgorithm("ahash", "均值哈希 aHash", compute_ahash),
+    "whash": HashAlgorithm("whash", "小波哈希 wHash (Haar)", compute_whash),
+}
+
+
+def normalize_hash_algorithms(value) -> List[str]:
+    if isinstance(value, str):
+        raw_items = value.split(",")
+    elif isinstance(value, (list, tuple)):
+        raw_items = [str(item) for item in value]
+    else:
+        raw_items = []
+
+    algorithms: List[str] = []
+    for item in raw_items:
+        name = item.strip().lower()
+        if name in HASH_ALGORITHMS and name not in algorithms:
+            algorithms.append(name)
+    return algorithms or [DEFAULT_HASH_ALGORITHM]
+
+
+def normalize_hash_size(value) -> int:
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_HASH_SIZE
+    return max(MIN_HASH_SIZE, min(MAX_HASH_SIZE, size))
+
+
+def compute_hashes(image: Image.Image, algorithms: List[str], *, hash_size: int = DEFAULT_HASH_SIZE) -> Dict[str, int]:
+    return {name: HASH_ALGORITHMS[name].compute(image, hash_size=hash_size) for name in algorithms}
+
+
+def hashes_from_filestorage(file_storage, algorithms: List[str], *, hash_size: int = DEFAULT_HASH_SIZE) -> Dict[str, int]:
+    file_storage.stream.seek(0)
+    try:
+        with Image.open(file_storage.stream) as image:
+            return compute_hashes(ImageOps.exif_transpose(image), algorithms, hash_size=hash_size)
+    except Exception as exc:
+        raise ValueError(f"参考图解析失败：{exc}") from exc
+
+
+def hashes_from_path(path: Path, algorithms: List[str], *, hash_size: int = DEFAULT_HASH_SIZE) -> Dict[str, int]:
+    with Image.open(path) as image:
+        return compute_hashes(ImageOps.exif_transpose(image), algorithms, hash_size=hash_size)
+
+
+def get_cached_hashes(path: Path, algorithms: List[str], *, hash_size: int = DEFAULT_HASH_SIZE) -> Dict[str, int]:
+    """按算法与尺寸分别缓存哈希；缺失的算法共用一次解码补齐。"""
+    mtime = path.stat().st_mtime
+    values: Dict[str, int] = {}
+    missing: List[str] = []
+    with _hash_lock:
+        for name in algorithms:
+            cached = _hash_cache.get(f"{path}|{name}|{hash_size}")
+            if cached and cached[0] == mtime:
+                values[name] = cached[1]
+            else:
+                missing.append(name)
+
+    if missing:
+        computed = hashes_from_path(path, missing, hash_size=hash_size)
+        with _hash_lock:
+            for name, value in computed.items():
+                _hash_cache[f"{path}|{name}|{hash_size}"] = (mtime, value)
+        values.update(computed)
+    return values
+
+
+def compute_similarity_percent(left: int, right: int, *, bits: int) -> float:
+    distance = (left ^ right).bit_count()
+    return max(0.0, min(100.0, (1.0 - distance / bits) * 100.0))
+
+
+def hash_bit_matrix(values: List[int], *, bits: int) -> np.ndarray:
+    byte_count = (bits + 7) // 8
+    buffer = b"".join(int(value).to_bytes(byte_count, "big") for value in values)
+    packed = np.frombuffer(buffer, dtype=np.uint8).reshape(len(values), byte_count)
+    return np.unpackbits(packed, axis=1).astype(np.float32)
+
+
+def similarity_matrices(
+    reference_hashes: List[Dict[str, int]],
+    candidate_hashes: List[Dict[str, int]],
+    algorithms: List[str],
+    *,
+    hash_size: int = DEFAULT_HASH_SIZE,
+) -> Dict[str, np.ndarray]:
+    """返回每种算法的 (候选数, 参考图数) 相似度矩阵，一次矩阵乘法算完全部汉明距离。"""
+    matrices: Dict[str, np.ndarray] = {}
+    for name in algorithms:
+        bits = HASH_ALGORITHMS[name].bits(hash_size)
+        candidates = hash_bit_matrix([entry[name] for entry in candidate_hashes], bits=bits)
+        references = hash_bit_matrix([entry[name] for entry in reference_hashes], bits=bits)
+        distance = candidates.sum(axis=1)[:, None] + references.sum(axis=1)[None, :] - 2.0 * (candidates @ references.T)
+        matrices[name] = np.clip((1.0 - distance / bits) * 100.0, 0.0, 100.0)
+    return matrices
@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.core.config import POSE_CACHE_DIR
+from .pose_index import PoseIndex
+
+
+# 每次落盘都会重写整个文件，因此只按时间间隔落盘，筛选结束时再由调用方 flush 一次
+FLUSH_INTERVAL_SECONDS = 30.0
+
+_caches_lock = threading.RLock()
+_caches: Dict[str, "PoseCache"] = {}
+
+
+def weights_signature(weights_path: Path, settings: Dict) -> str:
+    """权重文件与推理参数任一变化都会得到新的签名，旧缓存自然失效。"""
+    try:
+        stat = Path(weights_path).stat()
+        weights = f"{Path(weights_path).resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+    except OSError:
+        weights = str(weights_path)
+    raw = json.dumps({"weights": weights, "settings": settings}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _encode_entries(entries: Dict[str, Tuple[float, dict]]) -> Dict[str, np.ndarray]:
+    paths: List[str] = []
+    mtimes: List[float] = []
+    image_sizes: List[Tuple[int, int]] = []
+    person_counts: List[int] = []
+    scores: List[float] = []
+    boxes: List[List[float]] = []
+    keypoint_counts: List[int] = []
+    keypoints: List[List[float]] = []
+    for path, (mtime, pose) in entries.items():
+        persons = pose.get("persons") or []
+        size = pose.get("image_size") or {}
+        paths.append(path)
+        mtimes.append(mtime)
+        image_sizes.append((int(size.get("w") or 0), int(size.get("h") or 0)))
+        person_counts.append(len(persons))
+        for person in persons:
+            scores.append(float(person.get("score") or 0.0))
+            boxes.append([float(value) for value in (person.get("bbox_xyxy") or [0, 0, 0, 0])][:4])
+            kps = person.get("keypoints_norm") or []
+            keypoint_counts.append(len(kps))
+            keypoints.extend([float(value) for value in point[:3]] for point in kps)
+
+    return {
+        "paths": np.array(paths, dtype=str),
+        "mtimes": np.array(mtimes, dtype=np.float64),
+        "image_sizes": np.array(image_sizes, dtype=np.int32).reshape(-1, 2),
+        "person_counts": np.array(person_counts, dtype=np.int32),
+        "scores": np.array(scores, dtype=np.float32),
+        "boxes": np.array(boxes, dtype=np.float32).reshape(-1, 4),
+        "keypoint_counts": np.array(keypoint_counts, dtype=np.int32),
+        "keypoints": np.array(keypoints, dtype=np.float32).reshape(-1, 3),
+    }
+
+
+def _decode_entries(arrays) -> Dict[str, Tuple[float, dict]]:
+    entries: Dict[str, Tuple[float, dict]] = {}
+    boxes = arrays["boxes"].tolist()
+    scores = arrays["scores"].tolist()
+    keypoint_counts = arrays["keypoint_counts"].tolist()
+    keypoints = arrays["keypoints"].tolist()
+    person_offset = 0
+    keypoint_offset = 0
+    for path, mtime, (width, height), count in zip(
+        arrays["paths"].tolist(),
+        arrays["mtimes"].tolist(),
+        arrays["image_sizes"].tolist(),
+        arrays["person_counts"].tolist(),
+    ):
+        persons = []
+        for person_id in range(count):
+            index = person_offset + person_id
+            kp_count = keypoint_counts[index]
+            persons.append(
+                {
+                    "person_id": person_id,
+                    "score": round(scores[index], 6),
+                    "bbox_xyxy": boxes[index],
+                    "keypoints_norm": keypoints[keypoint_offset : keypoint_offset + kp_count],
+                }
+            )
+            keypoint_offset += kp_count
+        person_offset += count
+        entries[path] = (mtime, {"persons": persons, "image_size": {"w": width, "h": height}})
+    return entries
+
+
+class PoseCache:
+    """按图片路径 + mtime 持久化骨骼点结果，存为一个 float32 数组的 .npz 文件。"""
+
+    def __init__(self, signature: str, directory: Path = POSE_CACHE_DIR):
+        self.signature = signature
+        self.file_path = Path(directory) / f"{signature}.npz"
+        self._entries: Dict[str, Tuple[float, dict]] = {}
+        self._loaded = False
+        self._index: PoseIndex | None = None
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+        # 编码与写文件在 _lock 之外进行，_write_lock 保证写入串行且旧快照不会覆盖新快照
+        self._write_lock = threading.Lock()
+        self._generation = 0
+        self._written_generation = 0
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.file_path.exists():
+            return
+        try:
+            with np.load(self.file_path, allow_pickle=False) as arrays:
+                self._entries = _decode_entries(arrays)
+        except Exception:
+            # 缓存文件损坏时直接丢弃，下次写入会重建
+            self._entries = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._entries)
+
+    def get(self, image_path: Path) -> dict | None:
+        mtime = image_path.stat().st_mtime
+        with self._lock:
+            self._ensure_loaded()
+            cached = self._entries.get(str(image_path))
+        if cached and cached[0] == mtime:
+            return cached[1]
+        return None
+
+    def peek(self, key: str, mtime: float) -> dict | None:
+        """调用方已知 mtime（如来自目录扫描）时跳过 stat。"""
+        with self._lock:
+            self._ensure_loaded()
+            cached = self._entries.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        return None
+
+    def index(self) -> PoseIndex:
+        """首次使用时由全部缓存条目建立姿态向量索引，之后随 put 增量维护。"""
+        with self._lock:
+            self._ensure_loaded()
+            if self._index is None:
+                self._index = PoseIndex()
+                self._index.load((key, pose.get("persons") or []) for key, (_, pose) in self._entries.items())
+            return self._index
+
+    def put(self, image_path: Path, pose: dict) -> None:
+        mtime = image_path.stat().st_mtime
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[str(image_path)] = (mtime, pose)
+            if self._index is not None:
+                self._index.update(str(image_path), pose.get("persons") or [])
+            self._dirty = True
+            due = time.monotonic() - self._last_flush >= FLUSH_INTERVAL_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        # 持锁只复制条目字典，编码和写盘期间 get / put 不被阻塞
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = dict(self._entries)
+            self._dirty = False
+            self._last_flush = time.monotonic()
+            self._generation += 1
+            generation = self._generation
+        with self._write_lock:
+            if generation <= self._written_generation:
+                return
+            arrays = _encode_entries(snapshot)
+            self.file_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = self.file_path.with_name(f"{self.file_path.name}.tmp")
+            try:
+                with open(temp_path, "wb") as handle:
+                    np.savez(handle, **arrays)
+                os.replace(temp_path, self.file_path)
+                self._written_generation = generation
+            except OSError:
+                temp_path.unlink(missing_ok=True)
+                with self._lock:
+                    self._dirty = True
+
+
+def get_pose_cache(signature: str) -> PoseCache:
+    with _caches_lock:
+        cache = _caches.get(signature)
+        if cache is None:
+            cache = PoseCache(signature)
+            _caches[signature] = cache
+        return cache
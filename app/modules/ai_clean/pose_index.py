@@ -0,0 +1,216 @@
+import heapq
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from .pose_math import KP_CONF_MIN, MIN_POINTS
+
+
+LEAF_SIZE = 32
+# 增量缓冲区超过该比例（或绝对数量）时重建整棵树
+REBUILD_RATIO = 0.1
+REBUILD_MIN = 512
+
+
+# COCO-17 站立姿态模板（y 轴向下），仅用于把各姿态旋转到同一朝向
+COCO_TEMPLATE = np.array(
+    [
+        [0.0, -0.80], [-0.04, -0.84], [0.04, -0.84], [-0.09, -0.82], [0.09, -0.82],
+        [-0.18, -0.60], [0.18, -0.60], [-0.24, -0.32], [0.24, -0.32], [-0.26, -0.06], [0.26, -0.06],
+        [-0.12, 0.0], [0.12, 0.0], [-0.13, 0.42], [0.13, 0.42], [-0.14, 0.84], [0.14, 0.84],
+    ]
+)
+
+
+def _canonical_angle(xy: np.ndarray, weights: np.ndarray) -> float:
+    """求把姿态旋转到模板朝向的角度；非 COCO-17 时退化为让上半部分关键点朝上。"""
+    if len(xy) == len(COCO_TEMPLATE):
+        template = COCO_TEMPLATE - (weights[:, None] * COCO_TEMPLATE).sum(axis=0)
+        cross = float((weights * (xy[:, 0] * template[:, 1] - xy[:, 1] * template[:, 0])).sum())
+        dot = float((weights * (xy * template).sum(axis=1)).sum())
+        if abs(cross) + abs(dot) > 1e-9:
+            return float(np.arctan2(cross, dot))
+    upper = weights[: max(1, len(xy) // 2)]
+    anchor = (upper[:, None] * xy[: len(upper)]).sum(axis=0)
+    if float(np.hypot(*anchor)) <= 1e-6:
+        return 0.0
+    return -float(np.arctan2(anchor[0], -anchor[1]))
+
+
+def pose_embedding(
+    keypoints: Sequence[Sequence[float]],
+    *,
+    keypoint_count: int | None = None,
+    kp_conf_min: float = KP_CONF_MIN,
+    min_points: int = MIN_POINTS,
+) -> np.ndarray | None:
+    """把一个人体的关键点转成平移、尺度、旋转都归一化后的 2K 维向量；有效点不足返回 None。
+
+    旋转通过与固定模板做加权 Procrustes 对齐确定，所有姿态对齐到同一朝向后欧氏距离近似精确得分；
+    缺失的关键点置于原点。向量距离只用于粗筛，最终得分仍由精确的 Procrustes 计算。
+    """
+    count = keypoint_count or len(keypoints)
+    if not keypoints or len(keypoints) < min_points:
+        return None
+    points = np.zeros((count, 3), dtype=np.float64)
+    rows = np.asarray([point[:3] for point in keypoints[:count]], dtype=np.float64)
+    points[: len(rows)] = rows
+
+    valid = points[:, 2] >= kp_conf_min
+    if int(valid.sum()) < min_points:
+        return None
+    # 有效点等权：置信度只决定点是否参与，避免同一姿态因置信度不同而漂移
+    weights = valid / float(valid.sum())
+
+    xy = points[:, :2] - (weights[:, None] * points[:, :2]).sum(axis=0)
+    scale = float(np.sqrt((weights * (xy**2).sum(axis=1)).sum()))
+    if scale <= 1e-6:
+        return None
+    xy /= scale
+
+    angle = _canonical_angle(xy, weights)
+    cos_a, sin_a = np.cos(angle), np.sin(angle)
+    rotated = np.stack([xy[:, 0] * cos_a - xy[:, 1] * sin_a, xy[:, 0] * sin_a + xy[:, 1] * cos_a], axis=1)
+    rotated[~valid] = 0.0
+    return rotated.ravel()
+
+
+class _KDTree:
+    """静态 KD 树：叶子内用 numpy 批量算距离，按包围盒下界做最优优先搜索。"""
+
+    def __init__(self, points: np.ndarray, leaf_size: int = LEAF_SIZE):
+        self.points = points
+        self.order = np.arange(len(points))
+        # 每个节点：(start, end, left, right, lower, upper)
+        self.nodes: List[Tuple[int, int, int, int, np.ndarray, np.ndarray]] = []
+        if len(points):
+            self._build(0, len(points), leaf_size)
+
+    def _build(self, start: int, end: int, leaf_size: int) -> int:
+        node_index = len(self.nodes)
+        subset = self.points[self.order[start:end]]
+        lower, upper = subset.min(axis=0), subset.max(axis=0)
+        self.nodes.append((start, end, -1, -1, lower, upper))
+        if end - start <= leaf_size:
+            return node_index
+
+        dimension = int(np.argmax(upper - lower))
+        middle = (end - start) // 2
+        partitioned = np.argpartition(subset[:, dimension], middle)
+        self.order[start:end] = self.order[start:end][partitioned]
+        left = self._build(start, start + middle, leaf_size)
+        right = self._build(start + middle, end, leaf_size)
+        self.nodes[node_index] = (start, end, left, right, lower, upper)
+        return node_index
+
+    @staticmethod
+    def _box_distance(query: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> float:
+        gap = np.maximum(lower - query, 0.0) + np.maximum(query - upper, 0.0)
+        return float(gap @ gap)
+
+    def query(self, query: np.ndarray, k: int, alive: np.ndarray) -> List[Tuple[float, int]]:
+        """返回 [(平方距离, 点下标)]，只考虑 alive 为真的点。"""
+        if not self.nodes or k <= 0:
+            return []
+        best: List[Tuple[float, int]] = []  # 大顶堆（存负距离）
+        frontier = [(0.0, 0)]
+        while frontier:
+            bound, node_index = heapq.heappop(frontier)
+            if len(best) >= k and bound > -best[0][0]:
+                break
+            start, end, left, right, _, _ = self.nodes[node_index]
+            if left < 0:
+                indices = self.order[start:end]
+                indices = indices[alive[indices]]
+                if not len(indices):
+                    continue
+                diff = self.points[indices] - query
+                distances = np.einsum("ij,ij->i", diff, diff)
+                for distance, index in zip(distances.tolist(), indices.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, index))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, index))
+                continue
+            for child in (left, right):
+                child_bound = self._box_distance(query, self.nodes[child][4], self.nodes[child][5])
+                if len(best) < k or child_bound <= -best[0][0]:
+                    heapq.heappush(frontier, (child_bound, child))
+        return sorted((-distance, index) for distance, index in best)
+
+
+class PoseIndex:
+    """图片中每个人体的姿态向量索引：KD 树 + 增量缓冲区，失效条目用墓碑标记，缓冲区变大时重建。"""
+
+    def __init__(self, keypoint_count: int = 17):
+        self.keypoint_count = keypoint_count
+        self._lock = threading.RLock()
+        self._vectors: List[np.ndarray] = []
+        self._owners: List[Tuple[str, int]] = []
+        self._alive: List[bool] = []
+        self._by_key: Dict[str, List[int]] = {}
+        self._tree = _KDTree(np.zeros((0, keypoint_count * 2)))
+        self._tree_size = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(slots) for slots in self._by_key.values())
+
+    def load(self, entries: Iterable[Tuple[str, Iterable[dict]]]) -> None:
+        """批量灌入后只建一次树。"""
+        with self._lock:
+            for key, persons in entries:
+                self.update(key, persons, rebuild=False)
+            self._rebuild()
+
+    def update(self, key: str, persons: Iterable[dict], *, rebuild: bool = True) -> None:
+        with self._lock:
+            for slot in self._by_key.pop(key, []):
+                self._alive[slot] = False
+            slots: List[int] = []
+            for person_id, person in enumerate(persons):
+                vector = pose_embedding(person.get("keypoints_norm") or [], keypoint_count=self.keypoint_count)
+                if vector is None:
+                    continue
+                slots.append(len(self._vectors))
+                self._vectors.append(vector)
+                self._owners.append((key, person_id))
+                self._alive.append(True)
+            if slots:
+                self._by_key[key] = slots
+            pending = len(self._vectors) - self._tree_size
+            if rebuild and pending >= max(REBUILD_MIN, int(self._tree_size * REBUILD_RATIO)):
+                self._rebuild()
+
+    def _rebuild(self) -> None:
+        # 重建时顺带压缩掉墓碑
+        keep = [slot for slot, alive in enumerate(self._alive) if alive]
+        self._vectors = [self._vectors[slot] for slot in keep]
+        self._owners = [self._owners[slot] for slot in keep]
+        self._alive = [True] * len(keep)
+        self._by_key = {}
+        for slot, (key, _) in enumerate(self._owners):
+            self._by_key.setdefault(key, []).append(slot)
+        points = np.vstack(self._vectors) if self._vectors else np.zeros((0, self.keypoint_count * 2))
+        self._tree = _KDTree(points)
+        self._tree_size = len(self._vectors)
+
+    def nearest(self, keypoints: Sequence[Sequence[float]], k: int) -> List[Tuple[str, int, float]]:
+        """返回与给定姿态最接近的 k 个人体 (key, person_id, 距离)。"""
+        vector = pose_embedding(keypoints, keypoint_count=self.keypoint_count)
+        if vector is None:
+            return []
+        with self._lock:
+            alive = np.asarray(self._alive, dtype=bool)
+            found = self._tree.query(vector, k, alive[: self._tree_size])
+            # 尚未并入树的增量条目直接线性扫描
+            if len(self._vectors) > self._tree_size:
+                pending = np.arange(self._tree_size, len(self._vectors))
+                pending = pending[alive[pending]]
+                if len(pending):
+                    diff = np.vstack([self._vectors[slot] for slot in pending]) - vector
+                    found.extend(zip(np.einsum("ij,ij->i", diff, diff).tolist(), pending.tolist()))
+                    found.sort()
+                    found = found[:k]
+            return [(self._owners[slot][0], self._owners[slot][1], float(np.sqrt(distance))) for distance, slot in found]
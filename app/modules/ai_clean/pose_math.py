@@ -0,0 +1,174 @@
+from typing import List, Sequence
+
+import numpy as np
+
+
+KP_CONF_MIN = 0.3
+# 有效关键点少于该数量时不参与比较；关键点总数不足的人体在堆叠时直接作废
+MIN_POINTS = 5
+SIGMA = 0.08
+
+
+def keypoints_array(persons_keypoints: Sequence[Sequence[Sequence[float]]], keypoint_count: int | None = None) -> np.ndarray:
+    """把若干人体的 keypoints_norm 堆叠成 (N, K, 3)；长度不足的补 0 置信度，过短的人体整体作废。"""
+    if keypoint_count is None:
+        keypoint_count = max((len(kps) for kps in persons_keypoints), default=0)
+    stacked = np.zeros((len(persons_keypoints), keypoint_count, 3), dtype=np.float64)
+    for index, kps in enumerate(persons_keypoints):
+        if not kps or len(kps) < MIN_POINTS:
+            continue
+        rows = np.asarray([point[:3] for point in kps[:keypoint_count]], dtype=np.float64)
+        stacked[index, : len(rows)] = rows
+    return stacked
+
+
+def pose_similarity_matrix(
+    references: np.ndarray,
+    candidates: np.ndarray,
+    *,
+    kp_conf_min: float = KP_CONF_MIN,
+    min_points: int = MIN_POINTS,
+    sigma: float = SIGMA,
+) -> np.ndarray:
+    """一次算出 (R, C) 的姿态相似度：加权质心、尺度归一、最优旋转与高斯得分全部按数组广播完成。"""
+    ref_count, cand_count = len(references), len(candidates)
+    if not ref_count or not cand_count:
+        return np.zeros((ref_count, cand_count), dtype=np.float64)
+
+    keypoint_count = min(references.shape[1], candidates.shape[1])
+    ref = references[:, None, :keypoint_count, :]
+    cand = candidates[None, :, :keypoint_count, :]
+
+    valid = (ref[..., 2] >= kp_conf_min) & (cand[..., 2] >= kp_conf_min)
+    weights = np.where(valid, ref[..., 2] * cand[..., 2], 0.0)
+    w_sum = weights.sum(axis=-1)
+    ok = (valid.sum(axis=-1) >= min_points) & (w_sum > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w_norm = weights / np.where(ok, w_sum, 1.0)[..., None]
+
+        ref_xy = np.broadcast_to(ref[..., :2], valid.shape + (2,))
+        cand_xy = np.broadcast_to(cand[..., :2], valid.shape + (2,))
+        ref_centered = ref_xy - (w_norm[..., None] * ref_xy).sum(axis=-2, keepdims=True)
+        cand_centered = cand_xy - (w_norm[..., None] * cand_xy).sum(axis=-2, keepdims=True)
+
+        ref_scale = np.sqrt((w_norm * (ref_centered**2).sum(axis=-1)).sum(axis=-1))
+        cand_scale = np.sqrt((w_norm * (cand_centered**2).sum(axis=-1)).sum(axis=-1))
+        ok &= (ref_scale > 1e-6) & (cand_scale > 1e-6)
+
+        ref_norm = ref_centered / np.where(ok, ref_scale, 1.0)[..., None, None]
+        cand_norm = cand_centered / np.where(ok, cand_scale, 1.0)[..., None, None]
+
+        rx, ry = ref_norm[..., 0], ref_norm[..., 1]
+        cx, cy = cand_norm[..., 0], cand_norm[..., 1]
+        c00 = (w_norm * cx * rx).sum(axis=-1)
+        c01 = (w_norm * cx * ry).sum(axis=-1)
+        c10 = (w_norm * cy * rx).sum(axis=-1)
+        c11 = (w_norm * cy * ry).sum(axis=-1)
+
+        angle = np.arctan2(c01 - c10, c00 + c11)
+        cos_a = np.cos(angle)[..., None]
+        sin_a = np.sin(angle)[..., None]
+        dx = cx * cos_a - cy * sin_a - rx
+        dy = cx * sin_a + cy * cos_a - ry
+        mse = (w_norm * (dx * dx + dy * dy)).sum(axis=-1)
+
+        value = np.exp(-mse / (2.0 * float(sigma) * float(sigma))) * 100.0
+
+    value = np.where(ok & np.isfinite(value), value, 0.0)
+    return np.clip(value, 0.0, 100.0)
+
+
+def hopcroft_karp(adjacency: List[List[int]], right_count: int) -> List[int]:
+    """二分图最大匹配（Hopcroft–Karp），返回每个左侧点匹配到的右侧下标，未匹配为 -1。"""
+    left_count = len(adjacency)
+    match_left = [-1] * left_count
+    match_right = [-1] * right_count
+    unreached = left_count + 1
+
+    while True:
+        # BFS 按层标记从自由左点出发的最短增广路
+        distance = [unreached] * left_count
+        queue = [left for left in range(left_count) if match_left[left] == -1]
+        for left in queue:
+            distance[left] = 0
+        found = False
+        for left in queue:
+            for right in adjacency[left]:
+                partner = match_right[right]
+                if partner == -1:
+                    found = True
+                elif distance[partner] == unreached:
+                    distance[partner] = distance[left] + 1
+                    queue.append(partner)
+        if not found:
+            return match_left
+
+        def augment(left: int) -> bool:
+            for right in adjacency[left]:
+                partner = match_right[right]
+                if partner == -1 or (distance[partner] == distance[left] + 1 and augment(partner)):
+                    match_left[left] = right
+                    match_right[right] = left
+                    return True
+            distance[left] = unreached
+            return False
+
+        for left in range(left_count):
+            if match_left[left] == -1:
+                augment(left)
+
+
+def bottleneck_assignment(matrix: Sequence[Sequence[float]]) -> tuple[float | None, dict[int, int] | None]:
+    """求让最差一对相似度最大的完美匹配：对降序阈值二分查找，每次用 Hopcroft–Karp 判定可行性。"""
+    if not len(matrix) or not len(matrix[0]):
+        return None, None
+
+    values = np.asarray(matrix, dtype=np.float64)
+    ref_count, cand_count = values.shape
+    if cand_count < ref_count:
+        return None, None
+
+    thresholds = np.unique(np.round(values[values > 0], 2))[::-1].tolist()
+    if not thresholds:
+        return None, None
+
+    def full_matching(threshold: float) -> dict[int, int] | None:
+        adjacency = [np.flatnonzero(row >= threshold).tolist() for row in values]
+        if any(not edges for edges in adjacency):
+            return None
+        match_left = hopcroft_karp(adjacency, cand_count)
+        if any(right == -1 for right in match_left):
+            return None
+        return {int(left): int(right) for left, right in enumerate(match_left)}
+
+    # 每个参考人体至少要有一条边：答案不会高于各行最大值中的最小者，从这里开始找
+    ceiling = float(np.round(values.max(axis=1), 2).min())
+    start = next((index for index, value in enumerate(thresholds) if value <= ceiling), len(thresholds))
+    if start == len(thresholds):
+        return None, None
+
+    # 阈值越低边越多，可行性单调：先倍增步长找到可行区间，再二分出第一个可行的阈值
+    matching = full_matching(thresholds[start])
+    if matching is not None:
+        return float(thresholds[start]), matching
+    infeasible, step = start, 1
+    feasible: tuple[int, dict[int, int]] | None = None
+    while feasible is None:
+        probe = min(infeasible + step, len(thresholds) - 1)
+        matching = full_matching(thresholds[probe])
+        if matching is not None:
+            feasible = (probe, matching)
+        elif probe == len(thresholds) - 1:
+            return None, None
+        else:
+            infeasible, step = probe, step * 2
+
+    while feasible[0] - infeasible > 1:
+        middle = (infeasible + feasible[0]) // 2
+        matching = full_matching(thresholds[middle])
+        if matching is None:
+            infeasible = middle
+        else:
+            feasible = (middle, matching)
+    return float(thresholds[feasible[0]]), feasible[1]
@@ -0,0 +1,394 @@
+import gc
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+from app.core.config import (
+    ULTRALYTICS_WEIGHTS_DIR,
+    YOLO_POSE_BACKEND,
+    YOLO_POSE_IDLE_TTL,
+    YOLO_POSE_IMGSZ,
+    YOLO_POSE_TORCH_THREADS,
+    YOLO_POSE_WARMUP,
+    YOLO_POSE_WEIGHTS,
+    YOLO_POSE_WORKERS,
+)
+from app.core.utils import get_timestamp
+
+
+REAPER_INTERVAL_SECONDS = 30
+POSE_BACKENDS = ("pt", "onnx", "openvino")
+POSE_CONFIDENCE = 0.25
+
+
+@dataclass(frozen=True)
+class PoseInferenceProfile:
+    """推理配置：后端（pt/onnx/openvino）、输入尺寸、torch 线程数（0 表示沿用默认）。"""
+
+    backend: str = "pt"
+    imgsz: int = 640
+    threads: int = 0
+
+    @classmethod
+    def parse(cls, text: str) -> "PoseInferenceProfile":
+        """解析形如 "onnx:480:4" 的配置串，缺省部分取默认值。"""
+        parts = [part.strip().lower() for part in (text or "").split(":")]
+        backend = parts[0] if parts and parts[0] in POSE_BACKENDS else "pt"
+        imgsz = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else YOLO_POSE_IMGSZ
+        threads = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 0
+        return cls(backend, max(32, imgsz), threads)
+
+    @property
+    def label(self) -> str:
+        return f"{self.backend}:{self.imgsz}:{self.threads or 'auto'}"
+
+    def predict_kwargs(self) -> Dict:
+        return {"imgsz": self.imgsz, "conf": POSE_CONFIDENCE}
+
+
+ACTIVE_PROFILE = PoseInferenceProfile(
+    YOLO_POSE_BACKEND if YOLO_POSE_BACKEND in POSE_BACKENDS else "pt",
+    YOLO_POSE_IMGSZ,
+    YOLO_POSE_TORCH_THREADS,
+)
+
+_model_lock = threading.RLock()
+_pose_model = None
+_worker_pool: ProcessPoolExecutor | None = None
+
+_info_lock = threading.RLock()
+_model_info: Dict = {
+    "status": "unloaded",
+    "weights": str(YOLO_POSE_WEIGHTS),
+    "profile": ACTIVE_PROFILE.label,
+    "backend": None,
+    "fallback": None,
+    "load_seconds": None,
+    "loaded_at": None,
+    "parameter_mb": None,
+    "rss_delta_mb": None,
+    "error": None,
+    "idle_ttl": YOLO_POSE_IDLE_TTL,
+    "workers": YOLO_POSE_WORKERS if YOLO_POSE_WORKERS > 1 else 0,
+    "worker_status": None,
+    "worker_threads": None,
+    "worker_error": None,
+}
+# 使用计数单独加锁，模型加载期间 /api/status 等读取不会被阻塞
+_usage_lock = threading.RLock()
+_last_used = 0.0
+_in_use = 0
+_reaper_started = False
+
+
+def _process_rss_mb() -> float | None:
+    try:
+        import psutil  # type: ignore
+
+        return round(psutil.Process().memory_info().rss / 1024 / 1024, 1)
+    except Exception:
+        pass
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as handle:
+            resident_pages = int(handle.read().split()[1])
+        return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+
+def _parameter_mb(model) -> float | None:
+    try:
+        parameters = model.model.parameters()
+        return round(sum(param.numel() * param.element_size() for param in parameters) / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+
+def _cuda_memory_mb() -> float | None:
+    try:
+        import torch
+
+        if not torch.cuda.is_available():
+            return None
+        return round(torch.cuda.memory_allocated() / 1024 / 1024, 1)
+    except Exception:
+        return None
+
+
+def _set_info(**kwargs) -> None:
+    with _info_lock:
+        _model_info.update(kwargs)
+
+
+def exported_weights_path(weights_path: Path, backend: str) -> Path:
+    """ultralytics 导出的默认位置：同目录下的 .onnx 文件或 <名称>_openvino_model 目录。"""
+    if backend == "onnx":
+        return weights_path.with_suffix(".onnx")
+    if backend == "openvino":
+        return weights_path.parent / f"{weights_path.stem}_openvino_model"
+    return weights_path
+
+
+def _apply_torch_threads(threads: int) -> None:
+    if threads <= 0:
+        return
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+
+
+@contextmanager
+def preserve_torch_threads() -> Iterator[None]:
+    """退出时恢复 torch 的线程数：set_num_threads 对整个进程生效，依次加载多个配置时后一个会继承前一个的设置。"""
+    try:
+        import torch
+
+        original = torch.get_num_threads()
+    except Exception:
+        original = None
+    try:
+        yield
+    finally:
+        if original is not None:
+            torch.set_num_threads(original)
+
+
+def load_pose_model(profile: PoseInferenceProfile = ACTIVE_PROFILE, weights_path: Path | None = None) -> Tuple[object, str, str | None]:
+    """按配置加载模型，返回 (模型, 实际后端, 回退原因)；导出文件缺失或加载失败时回退到 .pt。"""
+    weights_path = Path(weights_path or YOLO_POSE_WEIGHTS)
+    _apply_torch_threads(profile.threads)
+    if profile.backend != "pt":
+        exported = exported_weights_path(weights_path, profile.backend)
+        if not exported.exists():
+            fallback = f"未找到 {profile.backend} 导出文件 {exported}，已回退到 .pt"
+        else:
+            try:
+                from ultralytics import YOLO
+
+                return YOLO(str(exported), task="pose"), profile.backend, None
+            except Exception as exc:
+                fallback = f"{profile.backend} 后端加载失败（{exc}），已回退到 .pt"
+        return _load_yolo(weights_path), "pt", fallback
+    return _load_yolo(weights_path), "pt", None
+
+
+def inference_identity() -> Tuple[Path, Dict]:
+    """参与骨骼点缓存键的权重文件与推理参数（线程数不影响结果，不计入）。"""
+    with _info_lock:
+        backend = _model_info.get("backend")
+    if backend is None:
+        backend = ACTIVE_PROFILE.backend
+        if backend != "pt" and not exported_weights_path(Path(YOLO_POSE_WEIGHTS), backend).exists():
+            backend = "pt"
+    weights_path = exported_weights_path(Path(YOLO_POSE_WEIGHTS), backend)
+    return weights_path, {"backend": backend, **ACTIVE_PROFILE.predict_kwargs()}
+
+
+def _require_weights(weights_path: Path) -> None:
+    if not weights_path.exists():
+        hint = f"请将 YOLO26m-pose.pt 放入 {ULTRALYTICS_WEIGHTS_DIR}，或设置环境变量 YOLO_POSE_WEIGHTS 指向权重文件。"
+        raise ValueError(hint)
+
+
+def _load_yolo(weights_path: Path):
+    _require_weights(weights_path)
+
+    try:
+        from ultralytics import YOLO
+    except Exception as exc:  # pragma: no cover
+        raise ValueError(f"未安装 ultralytics：{exc}（请先安装 ultralytics 与 torch）") from exc
+
+    try:
+        return YOLO(str(weights_path))
+    except Exception as exc:
+        message = str(exc)
+        if "Pose26" not in message:
+            raise
+        try:
+            from ultralytics.nn.modules import head as ultralytics_head
+        except Exception:
+            raise ValueError(f"模型加载失败：{message}") from exc
+        if hasattr(ultralytics_head, "Pose") and not hasattr(ultralytics_head, "Pose26"):
+            ultralytics_head.Pose26 = ultralytics_head.Pose
+            try:
+                return YOLO(str(weights_path))
+            except Exception as retry_exc:
+                raise ValueError(f"模型加载失败：{retry_exc}") from retry_exc
+        raise ValueError(f"模型加载失败：{message}") from exc
+
+
+def _touch() -> None:
+    global _last_used
+    with _usage_lock:
+        _last_used = time.monotonic()
+
+
+def ensure_pose_model():
+    global _pose_model
+    _touch()
+    with _model_lock:
+        if _pose_model is not None:
+            return _pose_model
+
+        _set_info(status="loading", error=None)
+        rss_before = _process_rss_mb()
+        started = time.perf_counter()
+        try:
+            _pose_model, backend, fallback = load_pose_model(ACTIVE_PROFILE)
+        except Exception as exc:
+            _set_info(status="error", error=str(exc))
+            raise
+        rss_after = _process_rss_mb()
+        _set_info(
+            status="loaded",
+            backend=backend,
+            fallback=fallback,
+            load_seconds=round(time.perf_counter() - started, 2),
+            loaded_at=get_timestamp(),
+            parameter_mb=_parameter_mb(_pose_model),
+            rss_delta_mb=round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None,
+        )
+        _touch()
+        _start_idle_reaper()
+        return _pose_model
+
+
+def _worker_threads() -> int:
+    # 未显式指定线程数时按核数均分，避免多个进程的 torch 线程池互相争抢
+    return ACTIVE_PROFILE.threads or max(1, (os.cpu_count() or 1) // YOLO_POSE_WORKERS)
+
+
+def pose_worker_pool() -> ProcessPoolExecutor | None:
+    """YOLO_POSE_WORKERS > 1 时返回推理进程池（按需创建），否则返回 None 表示在本进程内推理。"""
+    global _worker_pool
+    if YOLO_POSE_WORKERS <= 1:
+        return None
+    _touch()
+    with _model_lock:
+        if _worker_pool is not None:
+            return _worker_pool
+        _require_weights(Path(YOLO_POSE_WEIGHTS))
+        from .pose_workers import init_pose_worker
+
+        threads = _worker_threads()
+        # spawn 启动的子进程不继承 Web 进程的线程与锁，只按模块路径重新导入推理代码
+        _worker_pool = ProcessPoolExecutor(
+            max_workers=YOLO_POSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_pose_worker,
+            initargs=(ACTIVE_PROFILE.backend, ACTIVE_PROFILE.imgsz, threads),
+        )
+        _set_info(worker_status="running", worker_threads=threads, worker_error=None)
+        _start_idle_reaper()
+        return _worker_pool
+
+
+def discard_pose_worker_pool(pool: ProcessPoolExecutor, error: str | None = None) -> None:
+    """子进程崩溃后进程池不可再用，丢弃后下次调用 pose_worker_pool 会重新创建。"""
+    global _worker_pool
+    with _model_lock:
+        if _worker_pool is pool:
+            _worker_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    _set_info(worker_status="error" if error else "stopped", worker_error=error)
+
+
+@contextmanager
+def pose_model_in_use():
+    """筛选期间持有引用计数，空闲回收不会在批处理中途卸载模型。"""
+    global _in_use, _last_used
+    with _usage_lock:
+        _in_use += 1
+    try:
+        yield
+    finally:
+        with _usage_lock:
+            _in_use -= 1
+            _last_used = time.monotonic()
+
+
+def release_pose_model() -> bool:
+    global _pose_model, _worker_pool
+    with _model_lock, _usage_lock:
+        if (_pose_model is None and _worker_pool is None) or _in_use:
+            return False
+        _pose_model = None
+        pool, _worker_pool = _worker_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+        _set_info(worker_status="stopped")
+    gc.collect()
+    try:
+        import torch
+
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+    _set_info(status="unloaded", backend=None, parameter_mb=None, rss_delta_mb=None)
+    return True
+
+
+def _idle_reaper() -> None:
+    while True:
+        time.sleep(min(REAPER_INTERVAL_SECONDS, max(1, YOLO_POSE_IDLE_TTL)))
+        with _usage_lock:
+            loaded = _pose_model is not None or _worker_pool is not None
+            idle = loaded and not _in_use and time.monotonic() - _last_used >= YOLO_POSE_IDLE_TTL
+        if idle:
+            release_pose_model()
+
+
+def _start_idle_reaper() -> None:
+    global _reaper_started
+    if YOLO_POSE_IDLE_TTL <= 0 or _reaper_started:
+        return
+    _reaper_started = True
+    threading.Thread(target=_idle_reaper, daemon=True).start()
+
+
+def start_pose_warmup() -> bool:
+    """YOLO_POSE_WARMUP 开启时在后台线程预加载模型，首个请求不再阻塞在加载上。"""
+    if not YOLO_POSE_WARMUP or not Path(YOLO_POSE_WEIGHTS).exists():
+        return False
+    # spawn 出的推理子进程会重新导入入口模块并再次 create_app，子进程里不再预热
+    if multiprocessing.parent_process() is not None:
+        return False
+
+    def worker() -> None:
+        try:
+            pool = pose_worker_pool()
+            if pool is None:
+                ensure_pose_model()
+                return
+            from .pose_workers import ping_pose_worker
+
+            # 每个子进程领到一个任务才会启动并加载模型
+            for future in [pool.submit(ping_pose_worker) for _ in range(YOLO_POSE_WORKERS)]:
+                future.result()
+        except Exception:
+            pass
+
+    threading.Thread(target=worker, daemon=True).start()
+    return True
+
+
+def pose_model_status() -> Dict:
+    with _info_lock:
+        payload = dict(_model_info)
+    with _usage_lock:
+        loaded = _pose_model is not None or _worker_pool is not None
+        payload["in_use"] = _in_use
+        payload["idle_seconds"] = round(time.monotonic() - _last_used, 1) if loaded else None
+    payload["process_rss_mb"] = _process_rss_mb()
+    payload["cuda_allocated_mb"] = _cuda_memory_mb() if _pose_model is not None else None
+    return payload
@@ -1,114 +1,49 @@
-import math
-import threading
+import heapq
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List
+from typing import Callable, List, NamedTuple
 
+import numpy as np
 from PIL import Image, ImageOps
 
-from app.core.config import YOLO_POSE_WEIGHTS, ULTRALYTICS_WEIGHTS_DIR
+from app.core.config import (
+    YOLO_POSE_BATCH_SIZE,
+    YOLO_POSE_PREFETCH_DEPTH,
+    YOLO_POSE_PREFETCH_WORKERS,
+    YOLO_POSE_WORKERS,
+)
 from app.core.state import append_log, state_lock, task_state, update_state
 from app.core.utils import allowed_image, get_timestamp, normalize_relative_path, safe_bucket_path
 from app.shared.storage.media_store import gather_media_items
+from .pose_cache import PoseCache, get_pose_cache, weights_signature
+from .pose_index import pose_embedding
+from .pose_math import bottleneck_assignment, keypoints_array, pose_similarity_matrix
+from .pose_model import (
+    ACTIVE_PROFILE,
+    discard_pose_worker_pool,
+    ensure_pose_model,
+    inference_identity,
+    pose_model_in_use,
+    pose_worker_pool,
+)
+from .pose_workers import predict_in_worker, worker_source
+from .prefetch import PrefetchStats, iter_prefetched
+from .reference_cache import content_token, lookup_reference_pose, read_upload, remember_reference_pose
+from .results import FilterRun, begin_filter_run
+from .service import DEFAULT_AGGREGATE_THRESHOLD, DEFAULT_REFERENCE_AGGREGATION, aggregate_reference_scores
 
 
-KP_CONF_MIN = 0.3
-MIN_POINTS = 5
-SIGMA = 0.08
 MAX_POSE_RESULTS = 500
-
-_model_lock = threading.RLock()
-_pose_model = None
-
-
-def _find_full_bipartite_matching(ref_to_cands: List[List[int]], cand_count: int) -> dict[int, int] | None:
-    matched_to_ref = [-1] * cand_count
-
-    def dfs(ref_index: int, seen: List[bool]) -> bool:
-        for cand_index in ref_to_cands[ref_index]:
-            if seen[cand_index]:
-                continue
-            seen[cand_index] = True
-            if matched_to_ref[cand_index] == -1 or dfs(matched_to_ref[cand_index], seen):
-                matched_to_ref[cand_index] = ref_index
-                return True
-        return False
-
-    match = 0
-    for ref_index in range(len(ref_to_cands)):
-        if dfs(ref_index, [False] * cand_count):
-            match += 1
-
-    if match != len(ref_to_cands):
-        return None
-
-    result: dict[int, int] = {}
-    for cand_index, ref_index in enumerate(matched_to_ref):
-        if ref_index != -1:
-            result[int(ref_index)] = int(cand_index)
-    if len(result) != len(ref_to_cands):
-        return None
-    return result
-
-
-def _bottleneck_assignment_min_similarity(matrix: List[List[float]]) -> tuple[float | None, dict[int, int] | None]:
-    if not matrix or not matrix[0]:
-        return None, None
-
-    ref_count = len(matrix)
-    cand_count = len(matrix[0])
-    if cand_count < ref_count:
-        return None, None
-
-    unique_scores = sorted({round(value, 2) for row in matrix for value in row if value > 0}, reverse=True)
-    if not unique_scores:
-        return None, None
-
-    for threshold in unique_scores:
-        ref_to_cands = []
-        for row in matrix:
-            ref_to_cands.append([index for index, value in enumerate(row) if value >= threshold])
-        matching = _find_full_bipartite_matching(ref_to_cands, cand_count)
-        if matching is not None:
-            return float(threshold), matching
-
-    return None, None
-
-
-def _ensure_pose_model():
-    global _pose_model
-    with _model_lock:
-        if _pose_model is not None:
-            return _pose_model
-
-        weights_path = Path(YOLO_POSE_WEIGHTS)
-        if not weights_path.exists():
-            hint = f"请将 YOLO26m-pose.pt 放入 {ULTRALYTICS_WEIGHTS_DIR}，或设置环境变量 YOLO_POSE_WEIGHTS 指向权重文件。"
-            raise ValueError(hint)
-
-        try:
-            from ultralytics import YOLO
-        except Exception as exc:  # pragma: no cover
-            raise ValueError(f"未安装 ultralytics：{exc}（请先安装 ultralytics 与 torch）") from exc
-
-        try:
-            _pose_model = YOLO(str(weights_path))
-        except Exception as exc:
-            message = str(exc)
-            if "Pose26" not in message:
-                raise
-            try:
-                from ultralytics.nn.modules import head as ultralytics_head
-            except Exception:
-                raise ValueError(f"模型加载失败：{message}") from exc
-            if hasattr(ultralytics_head, "Pose") and not hasattr(ultralytics_head, "Pose26"):
-                ultralytics_head.Pose26 = ultralytics_head.Pose
-                try:
-                    _pose_model = YOLO(str(weights_path))
-                except Exception as retry_exc:
-                    raise ValueError(f"模型加载失败：{retry_exc}") from retry_exc
-            else:
-                raise ValueError(f"模型加载失败：{message}") from exc
-        return _pose_model
+# 已缓存候选达到该数量时改用姿态向量索引粗筛：每个参考人体先取最近的 POSE_SHORTLIST_SIZE 个人体精排，
+# 新取到的一圈里还有能进入前 MAX_POSE_RESULTS 名的结果就把近邻数翻倍继续取
+POSE_INDEX_MIN_CANDIDATES = 2000
+POSE_SHORTLIST_SIZE = 1000
+# 预读解码时把长边缩到推理尺寸的两倍以内：模型本来就会缩放到 imgsz，预读队列里不必保留原图分辨率
+PREFETCH_MAX_SIDE_FACTOR = 2
+# EXIF 方向为这些值时图像需要旋转 90°，宽高互换
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
 
 
 def _open_reference_image(file_storage) -> Image.Image:
@@ -174,18 +109,11 @@ def _sort_persons(persons: List[dict]) -> List[dict]:
     return sorted(persons, key=lambda item: (area(item), float(item.get("score") or 0.0)), reverse=True)
 
 
-def build_reference_pose_preview(reference_storage) -> dict:
-    model = _ensure_pose_model()
-    image = _open_reference_image(reference_storage)
-    try:
-        results = model(image, verbose=False)
-    except Exception as exc:  # pragma: no cover
-        raise ValueError(f"骨骼点检测失败：{exc}") from exc
-
-    persons = _sort_persons(_extract_persons_from_result(results[0] if results else None))
-    orig_shape = getattr(results[0], "orig_shape", None) if results else None
-    height = int(orig_shape[0]) if isinstance(orig_shape, (tuple, list)) and len(orig_shape) >= 2 else int(image.size[1])
-    width = int(orig_shape[1]) if isinstance(orig_shape, (tuple, list)) and len(orig_shape) >= 2 else int(image.size[0])
+def _build_pose_payload(result, fallback_size: tuple[int, int] = (0, 0)) -> dict:
+    persons = _sort_persons(_extract_persons_from_result(result))
+    orig_shape = getattr(result, "orig_shape", None) if result is not None else None
+    height = int(orig_shape[0]) if isinstance(orig_shape, (tuple, list)) and len(orig_shape) >= 2 else int(fallback_size[1])
+    width = int(orig_shape[1]) if isinstance(orig_shape, (tuple, list)) and len(orig_shape) >= 2 else int(fallback_size[0])
     payload = []
     for person_id, person in enumerate(persons):
         payload.append(
@@ -199,74 +127,158 @@ def build_reference_pose_preview(reference_storage) -> dict:
     return {"persons": payload, "image_size": {"w": width, "h": height}}
 
 
-def _compute_pose_similarity_percent(
-    reference_kps: List[List[float]],
-    candidate_kps: List[List[float]],
-    *,
-    kp_conf_min: float = KP_CONF_MIN,
-    min_points: int = MIN_POINTS,
-    sigma: float = SIGMA,
-) -> float:
-    if not reference_kps or not candidate_kps:
-        return 0.0
-    if len(reference_kps) < 5 or len(candidate_kps) < 5:
-        return 0.0
-
-    valid = []
-    for idx in range(min(len(reference_kps), len(candidate_kps))):
-        rx, ry, rc = reference_kps[idx]
-        cx, cy, cc = candidate_kps[idx]
-        if rc >= kp_conf_min and cc >= kp_conf_min:
-            valid.append((idx, rc, cc))
-    if len(valid) < min_points:
-        return 0.0
-
-    weights = [float(rc) * float(cc) for _, rc, cc in valid]
-    w_sum = sum(weights)
-    if w_sum <= 0:
-        return 0.0
-
-    ref_points = [(float(reference_kps[idx][0]), float(reference_kps[idx][1])) for idx, _, _ in valid]
-    cand_points = [(float(candidate_kps[idx][0]), float(candidate_kps[idx][1])) for idx, _, _ in valid]
-
-    ref_cx = sum(w * p[0] for w, p in zip(weights, ref_points)) / w_sum
-    ref_cy = sum(w * p[1] for w, p in zip(weights, ref_points)) / w_sum
-    cand_cx = sum(w * p[0] for w, p in zip(weights, cand_points)) / w_sum
-    cand_cy = sum(w * p[1] for w, p in zip(weights, cand_points)) / w_sum
-
-    ref_centered = [(x - ref_cx, y - ref_cy) for x, y in ref_points]
-    cand_centered = [(x - cand_cx, y - cand_cy) for x, y in cand_points]
-
-    ref_scale = math.sqrt(sum(w * (x * x + y * y) for w, (x, y) in zip(weights, ref_centered)) / w_sum)
-    cand_scale = math.sqrt(sum(w * (x * x + y * y) for w, (x, y) in zip(weights, cand_centered)) / w_sum)
-    if ref_scale <= 1e-6 or cand_scale <= 1e-6:
-        return 0.0
-
-    ref_norm = [(x / ref_scale, y / ref_scale) for x, y in ref_centered]
-    cand_norm = [(x / cand_scale, y / cand_scale) for x, y in cand_centered]
-
-    w_norm = [w / w_sum for w in weights]
-    c00 = sum(w * (cx * rx) for w, (cx, _), (rx, _) in zip(w_norm, cand_norm, ref_norm))
-    c01 = sum(w * (cx * ry) for w, (cx, _), (_, ry) in zip(w_norm, cand_norm, ref_norm))
-    c10 = sum(w * (cy * rx) for w, (_, cy), (rx, _) in zip(w_norm, cand_norm, ref_norm))
-    c11 = sum(w * (cy * ry) for w, (_, cy), (_, ry) in zip(w_norm, cand_norm, ref_norm))
-
-    angle = math.atan2(c01 - c10, c00 + c11)
-    cos_a = math.cos(angle)
-    sin_a = math.sin(angle)
-
-    mse = 0.0
-    for w, (cx, cy), (rx, ry) in zip(w_norm, cand_norm, ref_norm):
-        x_rot = cx * cos_a - cy * sin_a
-        y_rot = cx * sin_a + cy * cos_a
-        dx = x_rot - rx
-        dy = y_rot - ry
-        mse += w * (dx * dx + dy * dy)
-
-    value = math.exp(-mse / (2.0 * float(sigma) * float(sigma))) * 100.0
-    if not math.isfinite(value):
-        return 0.0
-    return max(0.0, min(100.0, value))
+def _active_pose_cache() -> PoseCache:
+    return get_pose_cache(weights_signature(*inference_identity()))
+
+
+def _lookup_cached_pose(image_path: Path) -> dict | None:
+    return _active_pose_cache().get(image_path)
+
+
+def _store_cached_pose(image_path: Path, pose: dict) -> None:
+    _active_pose_cache().put(image_path, pose)
+
+
+def _predict_poses(model, sources: List) -> List[dict | None]:
+    try:
+        inputs = [str(source) if isinstance(source, Path) else source for source in sources]
+        predictions = list(model(inputs, verbose=False, **ACTIVE_PROFILE.predict_kwargs()))
+        if len(predictions) != len(sources):
+            raise RuntimeError("batch size mismatch")
+        return [
+            _restore_original_scale(_build_pose_payload(prediction), source)
+            for prediction, source in zip(predictions, sources)
+        ]
+    except Exception:
+        if len(sources) == 1:
+            return [None]
+
+    # 整批失败时逐张重试，避免单张损坏图片拖垮整批
+    poses: List[dict | None] = []
+    for source in sources:
+        poses.extend(_predict_poses(model, [source]))
+    return poses
+
+
+def _restore_original_scale(pose: dict, source) -> dict:
+    """预读时缩小过的图像，把检测框与图像尺寸换算回原图像素；归一化的关键点坐标不受影响。"""
+    original_size = source.info.get("original_size") if isinstance(source, Image.Image) else None
+    if not original_size or tuple(original_size) == source.size:
+        return pose
+    scale_x = original_size[0] / source.size[0]
+    scale_y = original_size[1] / source.size[1]
+    for person in pose["persons"]:
+        x1, y1, x2, y2 = person["bbox_xyxy"]
+        person["bbox_xyxy"] = [x1 * scale_x, y1 * scale_y, x2 * scale_x, y2 * scale_y]
+    pose["image_size"] = {"w": int(original_size[0]), "h": int(original_size[1])}
+    return pose
+
+
+class _PosePrediction(NamedTuple):
+    future: Future
+    pool: object
+    sources: List
+
+
+def _submit_pose_prediction(sources: List) -> _PosePrediction:
+    """有推理进程池时交给子进程异步执行；否则在当前线程同步推理，返回已完成的 Future。"""
+    pool = pose_worker_pool()
+    if pool is not None:
+        try:
+            return _PosePrediction(pool.submit(predict_in_worker, [worker_source(source) for source in sources]), pool, sources)
+        except (BrokenProcessPool, RuntimeError) as exc:
+            discard_pose_worker_pool(pool, str(exc) or type(exc).__name__)
+    future: Future = Future()
+    future.set_result(_predict_poses(ensure_pose_model(), sources))
+    return _PosePrediction(future, None, sources)
+
+
+def _collect_pose_prediction(prediction: _PosePrediction) -> List[dict | None]:
+    try:
+        return prediction.future.result()
+    except BrokenProcessPool as exc:
+        # 子进程异常退出（如内存不足被杀）时丢弃进程池，本批改在当前进程内推理
+        discard_pose_worker_pool(prediction.pool, str(exc) or "推理进程异常退出")
+        sources = [Path(source) if isinstance(source, str) else source for source in prediction.sources]
+        return _predict_poses(ensure_pose_model(), sources)
+
+
+def _predict_pose(source) -> dict:
+    pose = _collect_pose_prediction(_submit_pose_prediction([source]))[0]
+    if pose is None:
+        raise ValueError("骨骼点检测失败：模型推理出错")
+    return pose
+
+
+def _prefetch_pose_source(
+    pose_cache: PoseCache, image_path: Path | None, decode: bool = True
+) -> tuple[dict | None, Image.Image | Path | None]:
+    """预读线程里完成缓存查询与解码，返回 (缓存命中的骨骼点, 待推理的 RGB 图像)。
+
+    decode 为 False 时（推理在子进程中进行）不在本进程解码，直接返回待推理的路径。
+    """
+    if image_path is None:
+        return None, None
+    cached = pose_cache.get(image_path)
+    if cached is not None:
+        return cached, None
+    if not decode:
+        return None, image_path
+    max_side = ACTIVE_PROFILE.imgsz * PREFETCH_MAX_SIDE_FACTOR
+    with Image.open(image_path) as image:
+        width, height = image.size
+        if image.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        # JPEG 在解码阶段直接按 1/2、1/4、1/8 缩小，省掉整幅解码
+        image.draft("RGB", (max_side, max_side))
+        decoded = ImageOps.exif_transpose(image).convert("RGB")
+        decoded.load()
+    if max(decoded.size) > max_side:
+        decoded.thumbnail((max_side, max_side), Image.BILINEAR)
+    decoded.info["original_size"] = (width, height)
+    return None, decoded
+
+
+def get_cached_pose(image_path: Path) -> dict:
+    cached = _lookup_cached_pose(image_path)
+    if cached is not None:
+        return cached
+
+    pose = _predict_pose(image_path)
+    _store_cached_pose(image_path, pose)
+    return pose
+
+
+def build_reference_pose_preview(reference) -> dict:
+    # 预览同样持有引用计数，空闲回收不会在推理中途卸载模型或关闭进程池
+    with pose_model_in_use():
+        return _build_reference_pose_preview(reference)
+
+
+def _build_reference_pose_preview(reference) -> dict:
+    if isinstance(reference, Path):
+        try:
+            return get_cached_pose(reference)
+        except ValueError:
+            raise
+        except Exception as exc:  # pragma: no cover
+            raise ValueError(f"骨骼点检测失败：{exc}") from exc
+
+    # 预览与筛选会先后提交同一张参考图，按内容哈希复用推理结果
+    content = read_upload(reference)
+    if pose_worker_pool() is None:
+        # 先加载模型再取缓存签名：导出文件加载失败回退到 .pt 时，签名要对应实际使用的后端
+        ensure_pose_model()
+    signature = _active_pose_cache().signature
+    token = content_token(content)
+    cached = lookup_reference_pose(token, signature)
+    if cached is not None:
+        return {**cached, "reference_token": token}
+
+    image = _open_reference_image(reference)
+    pose = _predict_pose(image)
+    remember_reference_pose(reference, content, signature, pose)
+    return {**pose, "reference_token": token}
 
 
 def _resolve_pose_candidates(targets: List[str], bucket: str) -> List[dict]:
@@ -298,22 +310,142 @@ def _resolve_pose_candidates(targets: List[str], bucket: str) -> List[dict]:
     return items
 
 
-def find_pose_similar_images(
-    reference_storage,
+def _shortlist_candidates(
+    pose_cache: PoseCache,
+    candidates: List[dict],
+    image_paths: List[Path | None],
+    reference_groups: List[List[List[List[float]]]],
+    score_cached: Callable[[int, dict], float | None],
+) -> List[int] | None:
+    """返回需要逐张精排的候选下标：未缓存的全部保留，已缓存的只保留索引近邻中排名靠前的；不适用时返回 None。
+
+    向量距离与精确得分并不单调对应，所以近邻数不是固定的：每圈新取到的候选先用缓存姿态精确打分，
+    只要这一圈里还有分数能挤进当前前 MAX_POSE_RESULTS 名的，就把近邻数翻倍再取一圈。
+    """
+    cached: dict[str, int] = {}
+    poses: dict[int, dict] = {}
+    for index, (item, image_path) in enumerate(zip(candidates, image_paths)):
+        pose = pose_cache.peek(str(image_path), item.get("modified")) if image_path is not None else None
+        if pose is not None:
+            cached[str(image_path)] = index
+            poses[index] = pose
+    if len(cached) < POSE_INDEX_MIN_CANDIDATES:
+        return None
+    reference_kps = [kps for group in reference_groups for kps in group]
+    if any(pose_embedding(kps) is None for kps in reference_kps):
+        return None
+
+    pose_index = pose_cache.index()
+    indexed = len(pose_index)
+    # 索引里还有其他目录的图片，按比例多取一些再过滤
+    k = int(POSE_SHORTLIST_SIZE * max(1.0, len(pose_cache) / len(cached)))
+    scores: dict[int, float] = {}
+    while True:
+        ring = set()
+        for kps in reference_kps:
+            for key, _, _ in pose_index.nearest(kps, k):
+                index = cached.get(key)
+                if index is not None and index not in scores:
+                    ring.add(index)
+        top = heapq.nlargest(MAX_POSE_RESULTS, scores.values())
+        floor = top[-1] if len(top) >= MAX_POSE_RESULTS else -1.0
+        improved = False
+        for index in ring:
+            # 没有结果的候选记为 -1，与四舍五入后为 0 分但仍会出现在结果里的候选区分开
+            score = score_cached(index, poses[index])
+            scores[index] = -1.0 if score is None else score
+            improved = improved or scores[index] > floor
+        if not improved or k >= indexed:
+            break
+        k *= 2
+
+    # 已缓存的候选里排不进前 MAX_POSE_RESULTS 名的，最终结果里也排不进
+    kept = heapq.nlargest(MAX_POSE_RESULTS, (index for index, score in scores.items() if score >= 0), key=scores.get)
+    uncached = [index for index in range(len(candidates)) if index not in poses]
+    return sorted(set(kept).union(uncached))
+
+
+def _resolve_reference_person_ids(reference_person_ids: List, reference_count: int) -> List[List[int]]:
+    if reference_person_ids and all(isinstance(entry, list) for entry in reference_person_ids):
+        groups = [list(entry) for entry in reference_person_ids[:reference_count]]
+        return groups + [[] for _ in range(reference_count - len(groups))]
+    return [list(reference_person_ids) for _ in range(reference_count)]
+
+
+def _score_against_reference(
+    matrix: List[List[float]],
+    persons_pred: List[dict],
+    pose_match_mode: str,
+) -> tuple[float, List[List[float]] | None, List[List[List[float]]] | None]:
+    """matrix 为该参考图选中人体 × 候选人体的相似度矩阵。"""
+    if pose_match_mode == "precise":
+        if not persons_pred or len(persons_pred) < len(matrix):
+            return 0.0, None, None
+        threshold, matching = bottleneck_assignment(matrix)
+        if threshold is None or matching is None:
+            return 0.0, None, None
+
+        matched_keypoints: List[List[List[float]]] = []
+        best_value = 0.0
+        best_kps = None
+        for ref_index, cand_index in matching.items():
+            if not (0 <= cand_index < len(persons_pred)):
+                continue
+            cand_kps = persons_pred[cand_index].get("keypoints_norm") or []
+            if cand_kps:
+                matched_keypoints.append(cand_kps)
+            value = matrix[ref_index][cand_index]
+            if value > best_value:
+                best_value = value
+                best_kps = cand_kps or None
+        return float(threshold), best_kps, matched_keypoints or None
+
+    best_score = 0.0
+    best_kps = None
+    for cand_index, person in enumerate(persons_pred):
+        cand_kps = person.get("keypoints_norm") or []
+        score = max((row[cand_index] for row in matrix), default=0.0)
+        if score > best_score:
+            best_score = score
+            best_kps = cand_kps
+    return best_score, best_kps, None
+
+
+def find_pose_similar_images(references: List, **kwargs) -> List[dict]:
+    with pose_model_in_use():
+        return _find_pose_similar_images(references, **kwargs)
+
+
+def _find_pose_similar_images(
+    references: List,
     *,
-    reference_person_ids: List[int],
+    reference_person_ids: List,
     pose_match_mode: str = "any",
     bucket: str = "source",
     targets: List[str] | None = None,
+    aggregation: str = DEFAULT_REFERENCE_AGGREGATION,
+    aggregate_threshold: float = DEFAULT_AGGREGATE_THRESHOLD,
+    use_index: bool = True,
+    run: FilterRun | None = None,
 ) -> List[dict]:
-    model = _ensure_pose_model()
+    run = run or begin_filter_run("pose")
+    try:
+        # 配置了推理进程池时 Web 进程本身不加载模型
+        use_workers = pose_worker_pool() is not None
+        if not use_workers:
+            ensure_pose_model()
+    except Exception as exc:
+        run.fail(str(exc))
+        raise
     candidates = _resolve_pose_candidates(list(targets or []), bucket=bucket)
     if not candidates:
         update_state("ai_clean", status="idle", progress=0, processed=0, total=0, bucket=bucket, message="未找到可筛选的图片")
+        run.finish([], message="未找到可筛选的图片")
         return []
 
     with state_lock:
         if task_state["ai_clean"]["status"] == "running":
+            run.fail("已有 AI 图片清洗任务正在执行")
             raise RuntimeError("已有 AI 图片清洗任务正在执行")
         update_state(
             "ai_clean",
@@ -324,122 +456,193 @@ def find_pose_similar_images(
             bucket=bucket,
             message="正在执行骨骼点筛选",
             log=[],
+            pipeline={},
         )
-    append_log("ai_clean", f"[{get_timestamp()}] 🦴 开始骨骼点筛选，共 {len(candidates)} 张图片")
-
-    reference_preview = build_reference_pose_preview(reference_storage)
-    persons = reference_preview.get("persons") or []
-    if not persons:
-        update_state("ai_clean", status="error", progress=100, message="参考图未检测到人体/关键点")
-        append_log("ai_clean", f"[{get_timestamp()}] ❌ 参考图未检测到人体/关键点")
-        raise ValueError("参考图未检测到人体/关键点")
-    if not reference_person_ids:
-        raise ValueError("请先在参考图中选择基准人体")
-
-    valid_reference_ids = [rid for rid in reference_person_ids if isinstance(rid, int) and 0 <= rid < len(persons)]
-    if not valid_reference_ids:
-        raise ValueError("参考图基准人体选择无效，请重新选择")
-
-    pose_match_mode = (pose_match_mode or "any").strip().lower()
-    if pose_match_mode not in {"any", "precise"}:
-        pose_match_mode = "any"
-
-    reference_kps_list: List[List[List[float]]] = []
-    for rid in valid_reference_ids:
-        reference_kps_list.append(persons[rid].get("keypoints_norm") or [])
-
-    def best_similarity_any(cand_kps: List[List[float]]) -> float:
-        return max((_compute_pose_similarity_percent(ref_kps, cand_kps) for ref_kps in reference_kps_list), default=0.0)
-
-    def best_similarity_precise(cand_people: List[dict]) -> tuple[float | None, dict[int, int] | None]:
-        if not cand_people:
-            return None, None
-        ref_count = len(reference_kps_list)
-        if len(cand_people) < ref_count:
-            return None, None
-
-        matrix: List[List[float]] = []
-        for ref_kps in reference_kps_list:
-            row = []
-            for cand in cand_people:
-                row.append(_compute_pose_similarity_percent(ref_kps, cand.get("keypoints_norm") or []))
-            matrix.append(row)
-        threshold, matching = _bottleneck_assignment_min_similarity(matrix)
-        if threshold is None or matching is None:
-            return None, None
-        return float(threshold), matching
-
-    total = len(candidates)
-    processed = 0
-    results: List[dict] = []
-    for item in candidates:
-        best_score = 0.0
-        best_kps = None
-        people_count = 0
-        try:
-            relative_path = item.get("relative_path") or ""
-            image_path = safe_bucket_path(bucket, relative_path)
-            if not image_path.exists():
-                raise FileNotFoundError(relative_path)
-            predictions = model(str(image_path), verbose=False)
-            persons_pred = _sort_persons(_extract_persons_from_result(predictions[0] if predictions else None))
-            people_count = len(persons_pred)
-            if pose_match_mode == "precise":
-                score, matching = best_similarity_precise(persons_pred)
-                if score is None:
-                    continue
-                best_score = float(score)
-                if matching:
-                    matched_keypoints: List[List[List[float]]] = []
-                    best_value = 0.0
-                    best_kps = None
-                    for ref_index, cand_index in matching.items():
-                        if not (0 <= cand_index < len(persons_pred)):
-                            continue
-                        cand_kps = persons_pred[cand_index].get("keypoints_norm") or []
-                        if cand_kps:
-                            matched_keypoints.append(cand_kps)
-                        value = _compute_pose_similarity_percent(reference_kps_list[ref_index], cand_kps)
-                        if value > best_value:
-                            best_value = value
-                            best_kps = cand_kps or None
-                    if matched_keypoints:
-                        item = {**item, "pose_keypoints_list": matched_keypoints}
-            else:
-                for person in persons_pred:
-                    cand_kps = person.get("keypoints_norm") or []
-                    score = best_similarity_any(cand_kps)
-                    if score > best_score:
-                        best_score = score
-                        best_kps = cand_kps
-        except Exception:
-            pass
-        finally:
-            processed += 1
-            if processed == total or processed % 10 == 0:
-                update_state(
-                    "ai_clean",
-                    progress=int(processed / total * 100) if total else 100,
-                    processed=processed,
-                    message=f"已处理 {processed}/{total} 张图片",
-                )
-
-        if best_score <= 0:
-            continue
+    append_log("ai_clean", f"[{get_timestamp()}] 🦴 开始骨骼点筛选，共 {len(candidates)} 张图片，参考图 {len(references)} 张")
 
-        payload = {**item, "probability": round(float(best_score), 2), "pose_people": people_count}
-        if best_kps:
-            payload["pose_keypoints"] = best_kps
-        results.append(payload)
+    # 状态已置为 running：此后任何异常都要把状态与本次筛选标记为失败，避免界面一直停在执行中
+    pose_cache = None
+    try:
+        reference_groups: List[List[List[List[float]]]] = []
+        if not reference_person_ids:
+            raise ValueError("请先在参考图中选择基准人体")
+        person_id_groups = _resolve_reference_person_ids(list(reference_person_ids), len(references))
+        for ref_index, reference in enumerate(references):
+            prefix = f"第 {ref_index + 1} 张参考图" if len(references) > 1 else "参考图"
+            persons = build_reference_pose_preview(reference).get("persons") or []
+            if not persons:
+                raise ValueError(f"{prefix}未检测到人体/关键点")
+            valid_reference_ids = [
+                rid for rid in person_id_groups[ref_index] if isinstance(rid, int) and 0 <= rid < len(persons)
+            ]
+            if not valid_reference_ids:
+                raise ValueError(f"{prefix}基准人体选择无效，请重新选择")
+            reference_groups.append([persons[rid].get("keypoints_norm") or [] for rid in valid_reference_ids])
+
+        reference_array = keypoints_array([kps for group in reference_groups for kps in group])
+        reference_slices: List[tuple[int, int]] = []
+        for group in reference_groups:
+            start = reference_slices[-1][1] if reference_slices else 0
+            reference_slices.append((start, start + len(group)))
+
+        pose_match_mode = (pose_match_mode or "any").strip().lower()
+        if pose_match_mode not in {"any", "precise"}:
+            pose_match_mode = "any"
+
+        def score_item(item: dict, pose: dict | None) -> dict | None:
+            if pose is None:
+                return None
+            persons_pred = pose.get("persons") or []
+            # 所有参考人体 × 候选人体一次算出相似度矩阵，再按参考图切片打分
+            full_matrix = pose_similarity_matrix(
+                reference_array,
+                keypoints_array([person.get("keypoints_norm") or [] for person in persons_pred], reference_array.shape[1]),
+            ).tolist()
+            scored = [
+                _score_against_reference(full_matrix[start:end], persons_pred, pose_match_mode)
+                for start, end in reference_slices
+            ]
+            row = np.array([[entry[0] for entry in scored]], dtype=np.float64)
+            scores, best_reference, keep = aggregate_reference_scores(row, aggregation, threshold=aggregate_threshold)
+            if not keep[0] or float(scores[0]) <= 0:
+                return None
+            reference_index = int(best_reference[0])
+            _, best_kps, matched_keypoints = scored[reference_index]
+
+            payload = {**item, "probability": round(float(scores[0]), 2), "pose_people": len(persons_pred)}
+            if len(references) > 1:
+                payload["reference_index"] = reference_index
+            if matched_keypoints:
+                payload["pose_keypoints_list"] = matched_keypoints
+            if best_kps:
+                payload["pose_keypoints"] = best_kps
+            return payload
+
+        total = len(candidates)
+        processed = 0
+        results: List[dict] = []
+        pose_cache = _active_pose_cache()
+        image_paths: List[Path | None] = []
+        for item in candidates:
+            try:
+                image_paths.append(safe_bucket_path(bucket, item.get("relative_path") or ""))
+            except ValueError:
+                image_paths.append(None)
 
+        def score_cached(index: int, pose: dict) -> float | None:
+            try:
+                payload = score_item(candidates[index], pose)
+            except Exception:
+                return None
+            return payload["probability"] if payload else None
+
+        selected = (
+            _shortlist_candidates(pose_cache, candidates, image_paths, reference_groups, score_cached) if use_index else None
+        )
+        if selected is not None:
+            processed = total - len(selected)
+            append_log(
+                "ai_clean",
+                f"[{get_timestamp()}] 🗂️ 姿态索引粗筛：跳过 {processed} 张不相近的已缓存图片，精排 {len(selected)} 张",
+            )
+            candidates = [candidates[index] for index in selected]
+            image_paths = [image_paths[index] for index in selected]
+        path_batches = [
+            image_paths[start : start + YOLO_POSE_BATCH_SIZE] for start in range(0, len(image_paths), YOLO_POSE_BATCH_SIZE)
+        ]
+        # 后台线程读取并解码后续批次，模型处理当前批时磁盘不空闲
+        prefetch_stats = PrefetchStats(YOLO_POSE_PREFETCH_WORKERS, YOLO_POSE_PREFETCH_DEPTH)
+        prefetched = iter_prefetched(
+            path_batches,
+            lambda image_path: _prefetch_pose_source(pose_cache, image_path, decode=not use_workers),
+            workers=YOLO_POSE_PREFETCH_WORKERS,
+            depth=YOLO_POSE_PREFETCH_DEPTH,
+            stats=prefetch_stats,
+        )
+        # 进程池模式下每个推理进程保持约两批在途，结果仍按提交顺序合并
+        max_in_flight = YOLO_POSE_WORKERS * 2 if use_workers else 0
+        in_flight: deque = deque()
+
+        def merge_batch(batch: List[dict], batch_paths: List[Path | None], poses: List[dict | None], pending: List[int], prediction) -> None:
+            nonlocal processed
+            if prediction is not None:
+                for index, pose in zip(pending, _collect_pose_prediction(prediction)):
+                    poses[index] = pose
+                    if pose is not None:
+                        try:
+                            pose_cache.put(batch_paths[index], pose)
+                        except OSError:
+                            pass
+
+            for item, pose in zip(batch, poses):
+                try:
+                    payload = score_item(item, pose)
+                except Exception:
+                    payload = None
+                if payload is not None:
+                    results.append(payload)
+                    run.publish([payload])
+
+            processed += len(batch)
+            update_state(
+                "ai_clean",
+                progress=int(processed / total * 100) if total else 100,
+                processed=processed,
+                message=f"已处理 {processed}/{total} 张图片",
+                pipeline={**prefetch_stats.as_dict(), "inference_workers": YOLO_POSE_WORKERS if use_workers else 0},
+            )
+
+        for batch_index, loaded in enumerate(prefetched):
+            if run.cancelled:
+                prefetched.close()
+                break
+            batch = candidates[batch_index * YOLO_POSE_BATCH_SIZE : (batch_index + 1) * YOLO_POSE_BATCH_SIZE]
+            poses: List[dict | None] = [entry[0] if entry else None for entry in loaded]
+            pending = [index for index, entry in enumerate(loaded) if entry and entry[1] is not None]
+            prediction = _submit_pose_prediction([loaded[index][1] for index in pending]) if pending else None
+            in_flight.append((batch, path_batches[batch_index], poses, pending, prediction))
+            while len(in_flight) > max_in_flight:
+                merge_batch(*in_flight.popleft())
+
+        if run.cancelled:
+            for *_, prediction in in_flight:
+                if prediction is not None:
+                    prediction.future.cancel()
+            in_flight.clear()
+        while in_flight:
+            merge_batch(*in_flight.popleft())
+    except Exception as exc:
+        if pose_cache is not None:
+            pose_cache.flush()
+        update_state("ai_clean", status="error", progress=100, message=str(exc))
+        append_log("ai_clean", f"[{get_timestamp()}] ❌ {exc}")
+        run.fail(str(exc))
+        raise
+
+    pose_cache.flush()
+    pipeline = prefetch_stats.as_dict()
+    append_log(
+        "ai_clean",
+        f"[{get_timestamp()}] 📦 预读队列平均深度 {pipeline['avg_queue_depth']}/{pipeline['depth']}，"
+        f"推理等待读图共 {pipeline['stall_seconds']} 秒",
+    )
     results.sort(key=lambda entry: entry.get("probability", 0), reverse=True)
     results = results[:MAX_POSE_RESULTS]
+    if run.cancelled:
+        message = f"骨骼点筛选已取消，已处理 {processed}/{total} 张图片"
+        update_state("ai_clean", status="idle", processed=processed, message=message)
+        append_log("ai_clean", f"[{get_timestamp()}] ⏹️ {message}")
+        run.finish(results, status="cancelled", message=message)
+        return results
+
+    message = f"骨骼点筛选完成，共 {len(results)} 张图片"
     update_state(
         "ai_clean",
         status="success",
         progress=100,
         processed=processed,
-        message=f"骨骼点筛选完成，共 {len(results)} 张图片",
+        message=message,
     )
-    append_log("ai_clean", f"[{get_timestamp()}] ✅ 骨骼点筛选完成，共 {len(results)} 张图片")
+    append_log("ai_clean", f"[{get_timestamp()}] ✅ {message}")
+    run.finish(results, message=message)
     return results
@@ -0,0 +1,55 @@
+"""骨骼点推理子进程：进程池以 spawn 方式启动，每个进程在初始化时加载一次模型。
+
+这里的函数会在子进程中按模块路径导入执行，只能放模块级函数，参数与返回值都要可序列化。
+"""
+
+import os
+from pathlib import Path
+from typing import List
+
+from PIL import Image, ImageOps
+
+from .pose_model import PoseInferenceProfile, load_pose_model
+
+
+_worker_model = None
+
+
+def init_pose_worker(backend: str, imgsz: int, threads: int) -> None:
+    global _worker_model
+    _worker_model, _, _ = load_pose_model(PoseInferenceProfile(backend, imgsz, threads))
+
+
+def ping_pose_worker() -> int:
+    """预热用：确认进程已完成初始化，返回进程号。"""
+    return os.getpid()
+
+
+def _decode(source):
+    if not isinstance(source, str):
+        return source
+    try:
+        with Image.open(source) as image:
+            decoded = ImageOps.exif_transpose(image).convert("RGB")
+            decoded.load()
+        return decoded
+    except Exception:
+        return None
+
+
+def predict_in_worker(sources: List) -> List[dict | None]:
+    """sources 为图片路径字符串或 PIL 图像；读图与解码也在子进程完成，主进程只传路径。"""
+    from .pose_service import _predict_poses
+
+    decoded = [_decode(source) for source in sources]
+    pending = [index for index, image in enumerate(decoded) if image is not None]
+    poses: List[dict | None] = [None] * len(sources)
+    if pending:
+        for index, pose in zip(pending, _predict_poses(_worker_model, [decoded[index] for index in pending])):
+            poses[index] = pose
+    return poses
+
+
+def worker_source(source) -> object:
+    """把主进程侧的输入转换成可跨进程传递的形式。"""
+    return str(source) if isinstance(source, Path) else source
@@ -0,0 +1,74 @@
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Iterator, List, Sequence, TypeVar
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class PrefetchStats:
+    """记录消费端等待预读的时间与就绪批次数，用于判断瓶颈在磁盘还是模型。"""
+
+    def __init__(self, workers: int, depth: int):
+        self.workers = workers
+        self.depth = depth
+        self.batches = 0
+        self.stall_seconds = 0.0
+        self.ready_total = 0
+        self.last_ready = 0
+
+    def record(self, ready: int, stall: float) -> None:
+        self.batches += 1
+        self.last_ready = ready
+        self.ready_total += ready
+        self.stall_seconds += stall
+
+    def as_dict(self) -> Dict:
+        return {
+            "workers": self.workers,
+            "depth": self.depth,
+            "batches": self.batches,
+            "queue_depth": self.last_ready,
+            "avg_queue_depth": round(self.ready_total / self.batches, 2) if self.batches else 0.0,
+            "stall_seconds": round(self.stall_seconds, 3),
+        }
+
+
+def iter_prefetched(
+    batches: Sequence[Sequence[T]],
+    load_item: Callable[[T], R],
+    *,
+    workers: int,
+    depth: int,
+    stats: PrefetchStats | None = None,
+) -> Iterator[List[R | None]]:
+    """按顺序产出每批的加载结果；后台线程池最多提前加载 depth 批，单项失败记为 None。"""
+    stats = stats or PrefetchStats(workers, depth)
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ai-clean-prefetch")
+    in_flight: Deque[List[Future]] = deque()
+    next_batch = 0
+    try:
+        while next_batch < len(batches) or in_flight:
+            while next_batch < len(batches) and len(in_flight) < max(1, depth):
+                in_flight.append([executor.submit(load_item, item) for item in batches[next_batch]])
+                next_batch += 1
+
+            ready = sum(1 for futures in in_flight if all(future.done() for future in futures))
+            futures = in_flight.popleft()
+            # 先补满预读队列再等待当前批，保证模型处理这一批时后面的批次都在加载
+            if next_batch < len(batches):
+                in_flight.append([executor.submit(load_item, item) for item in batches[next_batch]])
+                next_batch += 1
+            started = time.perf_counter()
+            loaded: List[R | None] = []
+            for future in futures:
+                try:
+                    loaded.append(future.result())
+                except Exception:
+                    loaded.append(None)
+            stats.record(ready, time.perf_counter() - started)
+            yield loaded
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
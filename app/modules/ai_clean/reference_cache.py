@@ -0,0 +1,90 @@
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict
+
+from werkzeug.datastructures import FileStorage
+
+
+REFERENCE_CACHE_TTL_SECONDS = 600
+REFERENCE_CACHE_SIZE = 16
+
+
+@dataclass
+class _CachedReference:
+    content: bytes
+    filename: str
+    content_type: str
+    expires_at: float
+    poses: Dict[str, dict]
+
+
+_reference_lock = threading.RLock()
+_references: "OrderedDict[str, _CachedReference]" = OrderedDict()
+
+
+def content_token(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _touch(token: str) -> _CachedReference | None:
+    entry = _references.get(token)
+    if entry is None:
+        return None
+    if entry.expires_at < time.monotonic():
+        _references.pop(token, None)
+        return None
+    entry.expires_at = time.monotonic() + REFERENCE_CACHE_TTL_SECONDS
+    _references.move_to_end(token)
+    return entry
+
+
+def read_upload(file_storage: FileStorage) -> bytes:
+    file_storage.stream.seek(0)
+    content = file_storage.stream.read()
+    file_storage.stream.seek(0)
+    return content
+
+
+def lookup_reference_pose(token: str, signature: str) -> dict | None:
+    with _reference_lock:
+        entry = _touch(token)
+        return entry.poses.get(signature) if entry else None
+
+
+def remember_reference_pose(file_storage: FileStorage, content: bytes, signature: str, pose: dict) -> str:
+    """按上传内容的 sha256 缓存参考图与其骨骼点结果（短 TTL + 小容量 LRU），返回可复用的令牌。"""
+    token = content_token(content)
+    with _reference_lock:
+        entry = _touch(token)
+        if entry is None:
+            entry = _CachedReference(
+                content=content,
+                filename=file_storage.filename or "reference",
+                content_type=file_storage.content_type or "application/octet-stream",
+                expires_at=time.monotonic() + REFERENCE_CACHE_TTL_SECONDS,
+                poses={},
+            )
+            _references[token] = entry
+        entry.poses[signature] = pose
+        while len(_references) > REFERENCE_CACHE_SIZE:
+            _references.popitem(last=False)
+    return token
+
+
+class ReferenceExpiredError(ValueError):
+    """参考图令牌已过期或不存在；接口以 HTTP 410 和 error_code 返回，前端据此改为重新上传。"""
+
+    error_code = "reference_expired"
+
+
+def restore_reference(token: str) -> FileStorage:
+    """用预览时返回的令牌还原参考图，调用方无需再次上传。"""
+    with _reference_lock:
+        entry = _touch(token)
+    if entry is None:
+        raise ReferenceExpiredError("参考图已过期，请重新上传")
+    return FileStorage(stream=io.BytesIO(entry.content), filename=entry.filename, content_type=entry.content_type)
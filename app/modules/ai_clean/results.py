@@ -0,0 +1,139 @@
+import heapq
+import io
+import itertools
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List
+
+from werkzeug.datastructures import FileStorage
+
+from app.core.utils import get_timestamp
+
+
+PARTIAL_TOP_K = 50
+MAX_TRACKED_RUNS = 4
+
+_runs_lock = threading.RLock()
+_runs: "OrderedDict[str, FilterRun]" = OrderedDict()
+
+
+class FilterRun:
+    """一次筛选任务的增量结果：边打分边维护 top-k，前端通过游标轮询。"""
+
+    def __init__(self, mode: str, *, top_k: int = PARTIAL_TOP_K):
+        self.run_id = uuid.uuid4().hex
+        self.mode = mode
+        self.top_k = top_k
+        self.status = "running"
+        self.message = ""
+        self.started_at = get_timestamp()
+        self.version = 0
+        self.scored = 0
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+        self._final_items: List[dict] | None = None
+        self._cancel_event = threading.Event()
+        self._lock = threading.RLock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self) -> None:
+        self._cancel_event.set()
+
+    def publish(self, items: Iterable[dict]) -> None:
+        with self._lock:
+            changed = False
+            for item in items:
+                self.scored += 1
+                entry = (float(item.get("probability") or 0.0), next(self._sequence), item)
+                if len(self._heap) < self.top_k:
+                    heapq.heappush(self._heap, entry)
+                    changed = True
+                elif entry[0] > self._heap[0][0]:
+                    heapq.heapreplace(self._heap, entry)
+                    changed = True
+            if changed:
+                self.version += 1
+
+    def finish(self, items: List[dict], *, status: str = "success", message: str = "") -> None:
+        with self._lock:
+            self._final_items = list(items)
+            self.status = "cancelled" if self.cancelled and status == "success" else status
+            self.message = message
+            self.version += 1
+
+    def fail(self, message: str) -> None:
+        self.finish([], status="error", message=message)
+
+    def snapshot(self, cursor: int | None = None) -> Dict:
+        with self._lock:
+            payload = {
+                "run_id": self.run_id,
+                "mode": self.mode,
+                "status": self.status,
+                "message": self.message,
+                "started_at": self.started_at,
+                "scored": self.scored,
+                "cursor": self.version,
+                "done": self._final_items is not None,
+                "changed": cursor is None or cursor != self.version,
+            }
+            if not payload["changed"]:
+                return payload
+            if self._final_items is not None:
+                payload["items"] = list(self._final_items)
+            else:
+                payload["items"] = [entry[2] for entry in sorted(self._heap, key=lambda entry: (-entry[0], entry[1]))]
+            return payload
+
+
+def begin_filter_run(mode: str) -> FilterRun:
+    run = FilterRun(mode)
+    with _runs_lock:
+        _runs[run.run_id] = run
+        while len(_runs) > MAX_TRACKED_RUNS:
+            _runs.popitem(last=False)
+    return run
+
+
+def get_filter_run(run_id: str | None = None) -> FilterRun | None:
+    with _runs_lock:
+        if run_id:
+            return _runs.get(run_id)
+        return next(reversed(_runs.values()), None)
+
+
+def run_filter_async(mode: str, filter_fn: Callable[..., List[dict]], references: List, **kwargs) -> FilterRun:
+    run = begin_filter_run(mode)
+    detached = detach_uploads(references)
+
+    def worker() -> None:
+        try:
+            filter_fn(detached, run=run, **kwargs)
+        except Exception as exc:
+            if not run.snapshot()["done"]:
+                run.fail(str(exc))
+
+    threading.Thread(target=worker, daemon=True).start()
+    return run
+
+
+def detach_uploads(storages: List) -> List:
+    """请求结束后上传流会被关闭，后台筛选前先把参考图读入内存。"""
+    detached: List[FileStorage] = []
+    for storage in storages:
+        if not isinstance(storage, FileStorage):
+            detached.append(storage)
+            continue
+        storage.stream.seek(0)
+        detached.append(
+            FileStorage(
+                stream=io.BytesIO(storage.stream.read()),
+                filename=storage.filename,
+                content_type=storage.content_type,
+            )
+        )
+    return detached
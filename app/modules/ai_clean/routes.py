@@ -3,24 +3,46 @@ import datetime
 from flask import Blueprint, request, send_file
 
 from app.core.responses import error_response, success_response
-from .schemas import normalize_ai_clean_payload
-from .service import build_export_zip, find_similar_images
+from app.core.state import state_lock, task_state
+from .dedupe import delete_duplicate_images, get_dedupe_non_keepers, get_dedupe_result, queue_dedupe
+from .results import get_filter_run, run_filter_async
+from .schemas import normalize_ai_clean_payload, normalize_dedupe_payload
+from .service import build_export_zip, find_similar_images, resolve_reference_paths
 from .pose_service import build_reference_pose_preview, find_pose_similar_images
+from .reference_cache import ReferenceExpiredError, restore_reference
 
 
 bp = Blueprint("ai_clean", __name__, url_prefix="/api")
 blueprints = [bp]
 
+
+def _request_data() -> dict:
+    data: dict = {}
+    data.update(request.args.to_dict(flat=True))
+    data.update(request.form.to_dict(flat=True))
+    if request.is_json:
+        data.update(request.get_json(silent=True) or {})
+    return data
+
+
 @bp.route("/ai/clean/pose/reference", methods=["POST"])
 def ai_clean_pose_reference():
-    reference = request.files.get("reference")
-    if not reference:
-        return error_response("请上传一张参考图")
+    payload = normalize_ai_clean_payload(_request_data())
     try:
-        payload = build_reference_pose_preview(reference)
-        persons = payload.get("persons") or []
+        if payload["reference_paths"]:
+            reference = resolve_reference_paths(payload["reference_paths"][:1], payload["bucket"])[0]
+        elif payload["reference_tokens"]:
+            reference = restore_reference(payload["reference_tokens"][0])
+        else:
+            reference = request.files.get("reference")
+        if not reference:
+            return error_response("请上传一张参考图")
+        result = build_reference_pose_preview(reference)
+        persons = result.get("persons") or []
         message = "参考图骨骼点解析完成" if persons else "参考图未检测到人体/关键点"
-        return success_response(message, **payload)
+        return success_response(message, **result)
+    except ReferenceExpiredError as exc:
+        return error_response(str(exc), status_code=410, error_code=exc.error_code)
     except ValueError as exc:
         return error_response(str(exc))
     except Exception as exc:
@@ -29,34 +51,47 @@ def ai_clean_pose_reference():
 
 @bp.route("/ai/clean/similar", methods=["POST"])
 def ai_clean_similar():
-    reference = request.files.get("reference")
-    data: dict = {}
-    data.update(request.args.to_dict(flat=True))
-    data.update(request.form.to_dict(flat=True))
-    payload = normalize_ai_clean_payload(data)
+    payload = normalize_ai_clean_payload(_request_data())
+    references: list = [item for item in request.files.getlist("reference") if item]
+    try:
+        # 预览接口返回的 reference_token 可代替重新上传参考图
+        references.extend(restore_reference(token) for token in payload["reference_tokens"])
+        references.extend(resolve_reference_paths(payload["reference_paths"], payload["bucket"]))
+    except ReferenceExpiredError as exc:
+        return error_response(str(exc), status_code=410, error_code=exc.error_code)
+    except ValueError as exc:
+        return error_response(str(exc))
+
+    if not references:
+        return error_response("请上传至少一张参考图")
+    if payload["mode"] == "pose":
+        reference_person_ids = payload.get("reference_person_ids") or []
+        if not reference_person_ids:
+            return error_response("请先选择参考图中的基准人体")
+        filter_fn = find_pose_similar_images
+        options = {
+            "reference_person_ids": reference_person_ids,
+            "pose_match_mode": payload.get("pose_match_mode") or "any",
+            "use_index": payload["pose_index"],
+        }
+    else:
+        filter_fn = find_similar_images
+        options = {"hash_algorithms": payload["hash_algorithms"], "hash_size": payload["hash_size"]}
+    options.update(
+        bucket=payload["bucket"],
+        targets=payload["targets"],
+        aggregation=payload["aggregation"],
+        aggregate_threshold=payload["aggregate_threshold"],
+    )
 
     try:
-        if payload["mode"] == "pose":
-            if not reference:
-                return error_response("请上传一张参考图")
-            reference_person_ids = payload.get("reference_person_ids") or []
-            if not reference_person_ids:
-                return error_response("请先选择参考图中的基准人体")
-            matches = find_pose_similar_images(
-                reference,
-                reference_person_ids=reference_person_ids,
-                pose_match_mode=payload.get("pose_match_mode") or "any",
-                bucket=payload["bucket"],
-                targets=payload["targets"],
-            )
-        else:
-            if not reference:
-                return error_response("请上传一张参考图")
-            matches = find_similar_images(
-                reference,
-                bucket=payload["bucket"],
-                targets=payload["targets"],
-            )
+        if payload["run_async"]:
+            with state_lock:
+                if task_state["ai_clean"]["status"] == "running":
+                    return error_response("已有 AI 图片清洗任务正在执行", status_code=409)
+            run = run_filter_async(payload["mode"], filter_fn, references, **options)
+            return success_response("筛选任务已启动，可通过结果游标查看实时结果", run_id=run.run_id)
+        matches = filter_fn(references, **options)
     except ValueError as exc:
         return error_response(str(exc))
     except Exception as exc:
@@ -72,6 +107,25 @@ def ai_clean_similar():
     return success_response(message, items=matches)
 
 
+@bp.route("/ai/clean/results", methods=["GET"])
+def ai_clean_results():
+    run = get_filter_run(request.args.get("run_id", "").strip() or None)
+    if run is None:
+        return error_response("未找到筛选任务", status_code=404)
+    cursor_raw = request.args.get("cursor", "").strip()
+    cursor = int(cursor_raw) if cursor_raw.isdigit() else None
+    return success_response(**run.snapshot(cursor))
+
+
+@bp.route("/ai/clean/cancel", methods=["POST"])
+def ai_clean_cancel():
+    run = get_filter_run(str((request.get_json(silent=True) or {}).get("run_id") or "").strip() or None)
+    if run is None or run.snapshot()["done"]:
+        return error_response("当前没有正在执行的筛选任务")
+    run.cancel()
+    return success_response("已请求取消筛选任务", run_id=run.run_id)
+
+
 @bp.route("/ai/clean/export", methods=["POST"])
 def ai_clean_export():
     payload = request.get_json(force=True) or {}
@@ -90,3 +144,51 @@ def ai_clean_export():
         return error_response(str(exc))
     except Exception as exc:
         return error_response(f"导出失败：{exc}", status_code=500)
+
+
+@bp.route("/ai/clean/dedupe", methods=["POST"])
+def ai_clean_dedupe():
+    payload = normalize_dedupe_payload(request.get_json(force=True) or {})
+    ok, message = queue_dedupe(
+        payload["bucket"],
+        hash_algorithm=payload["hash_algorithm"],
+        hash_size=payload["hash_size"],
+        threshold=payload["threshold"],
+    )
+    if ok:
+        return success_response(message)
+    return error_response(message, status_code=409)
+
+
+@bp.route("/ai/clean/dedupe", methods=["GET"])
+def ai_clean_dedupe_result():
+    return success_response(**get_dedupe_result())
+
+
+@bp.route("/ai/clean/dedupe/apply", methods=["POST"])
+def ai_clean_dedupe_apply():
+    data = request.get_json(force=True) or {}
+    action = (data.get("action") or "").strip().lower()
+    if action not in {"export", "delete"}:
+        return error_response("无效的操作指令")
+    run_id = str(data.get("run_id") or "").strip()
+    if action == "delete" and not run_id:
+        return error_response("删除前请提供去重结果的 run_id")
+    try:
+        bucket, non_keepers = get_dedupe_non_keepers(run_id, verify=action == "delete")
+        if not non_keepers:
+            return error_response("没有需要处理的重复图片")
+        if action == "delete":
+            removed = delete_duplicate_images(non_keepers, bucket=bucket)
+            return success_response(f"已删除 {removed} 张重复图片", deleted=removed)
+        memory_file, _ = build_export_zip(non_keepers, bucket=bucket)
+        return send_file(
+            memory_file,
+            mimetype="application/zip",
+            as_attachment=True,
+            download_name=f"ai_clean_duplicates_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+        )
+    except ValueError as exc:
+        return error_response(str(exc))
+    except Exception as exc:
+        return error_response(f"处理失败：{exc}", status_code=500)
@@ -1,5 +1,22 @@
 import json
 
+from .dedupe import DEFAULT_DEDUPE_THRESHOLD, MIN_DEDUPE_THRESHOLD
+from .hashing import normalize_hash_algorithms, normalize_hash_size
+from .service import DEFAULT_AGGREGATE_THRESHOLD, DEFAULT_REFERENCE_AGGREGATION, REFERENCE_AGGREGATIONS
+
+
+def normalize_reference_list(raw) -> list[str]:
+    if isinstance(raw, str) and raw.strip():
+        if not raw.strip().startswith("["):
+            return [raw.strip()]
+        try:
+            raw = json.loads(raw)
+        except Exception:
+            return []
+    if isinstance(raw, list):
+        return [str(item) for item in raw if item]
+    return []
+
 
 def normalize_ai_clean_payload(data: dict) -> dict:
     bucket = (data.get("bucket") or "source").strip().lower()
@@ -27,21 +44,45 @@ def normalize_ai_clean_payload(data: dict) -> dict:
         pose_match_mode = "any"
 
     reference_person_ids_raw = data.get("reference_person_ids")
-    reference_person_ids: list[int] = []
     if isinstance(reference_person_ids_raw, str) and reference_person_ids_raw.strip():
         try:
-            parsed = json.loads(reference_person_ids_raw)
-            if isinstance(parsed, list):
-                reference_person_ids = [int(item) for item in parsed if str(item).strip()]
+            reference_person_ids_raw = json.loads(reference_person_ids_raw)
         except Exception:
-            reference_person_ids = []
-    elif isinstance(reference_person_ids_raw, list):
+            reference_person_ids_raw = None
+
+    reference_person_ids: list = []
+    if isinstance(reference_person_ids_raw, list):
         try:
-            reference_person_ids = [int(item) for item in reference_person_ids_raw if str(item).strip()]
+            if any(isinstance(item, list) for item in reference_person_ids_raw):
+                # 多参考图：每张参考图各自的基准人体列表
+                reference_person_ids = [
+                    sorted({int(value) for value in item if str(value).strip()}) if isinstance(item, list) else []
+                    for item in reference_person_ids_raw
+                ]
+            else:
+                reference_person_ids = sorted({int(item) for item in reference_person_ids_raw if str(item).strip()})
         except Exception:
             reference_person_ids = []
 
-    reference_person_ids = sorted(set(reference_person_ids))
+    aggregation = (data.get("aggregation") or DEFAULT_REFERENCE_AGGREGATION).strip().lower()
+    if aggregation not in REFERENCE_AGGREGATIONS:
+        aggregation = DEFAULT_REFERENCE_AGGREGATION
+
+    # 显式传入的 0 是有效阈值，只有缺省或空字符串才使用默认值
+    aggregate_threshold_raw = data.get("aggregate_threshold")
+    if aggregate_threshold_raw is None or str(aggregate_threshold_raw).strip() == "":
+        aggregate_threshold_raw = DEFAULT_AGGREGATE_THRESHOLD
+    try:
+        aggregate_threshold = float(aggregate_threshold_raw)
+    except (TypeError, ValueError):
+        aggregate_threshold = DEFAULT_AGGREGATE_THRESHOLD
+
+    hash_algorithms_raw = data.get("hash_algorithms")
+    if isinstance(hash_algorithms_raw, str) and hash_algorithms_raw.strip().startswith("["):
+        try:
+            hash_algorithms_raw = json.loads(hash_algorithms_raw)
+        except Exception:
+            hash_algorithms_raw = None
 
     return {
         "mode": mode,
@@ -49,4 +90,31 @@ def normalize_ai_clean_payload(data: dict) -> dict:
         "targets": targets,
         "reference_person_ids": reference_person_ids,
         "pose_match_mode": pose_match_mode,
+        # 传 pose_index=0 时不走姿态向量索引粗筛，逐张精确比对全部候选
+        "pose_index": str(data.get("pose_index", "1")).strip().lower() not in {"0", "false", "no", "off"},
+        "aggregation": aggregation,
+        "aggregate_threshold": max(0.0, min(100.0, aggregate_threshold)),
+        "hash_algorithms": normalize_hash_algorithms(hash_algorithms_raw),
+        "hash_size": normalize_hash_size(data.get("hash_size")),
+        "reference_paths": normalize_reference_list(data.get("reference_path")),
+        "reference_tokens": normalize_reference_list(data.get("reference_token")),
+        "run_async": str(data.get("async") or "").strip().lower() in {"1", "true", "yes", "on"},
+    }
+
+
+def normalize_dedupe_payload(data: dict) -> dict:
+    bucket = (data.get("bucket") or "source").strip().lower()
+    if bucket not in {"source", "generated"}:
+        bucket = "source"
+
+    try:
+        threshold = float(data.get("threshold") or DEFAULT_DEDUPE_THRESHOLD)
+    except (TypeError, ValueError):
+        threshold = DEFAULT_DEDUPE_THRESHOLD
+
+    return {
+        "bucket": bucket,
+        "hash_algorithm": normalize_hash_algorithms(data.get("hash_algorithm"))[0],
+        "hash_size": normalize_hash_size(data.get("hash_size")),
+        "threshold": max(MIN_DEDUPE_THRESHOLD, min(100.0, threshold)),
     }
@@ -1,67 +1,28 @@
-import threading
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import List
 
-from PIL import Image, ImageOps
+import numpy as np
 
 from app.core.state import append_log, state_lock, task_state, update_state
 from app.core.utils import allowed_image, get_timestamp, normalize_relative_path, safe_bucket_path
 from app.shared.storage.media_store import create_export_zip_for_targets, gather_media_items
+from .hashing import (
+    DEFAULT_HASH_SIZE,
+    HASH_ALGORITHMS,
+    get_cached_hashes,
+    hashes_from_filestorage,
+    normalize_hash_algorithms,
+    normalize_hash_size,
+    similarity_matrices,
+)
+from .results import FilterRun, begin_filter_run
 
 
-HashCacheEntry = Tuple[float, int]
-
-_hash_lock = threading.RLock()
-_hash_cache: Dict[str, HashCacheEntry] = {}
 MAX_SIMILAR_RESULTS = 500
-
-
-def compute_dhash(image: Image.Image, *, hash_size: int = 8) -> int:
-    resized = image.convert("L").resize((hash_size + 1, hash_size))
-    pixels = list(resized.getdata())
-    rows = [pixels[row_index * (hash_size + 1) : (row_index + 1) * (hash_size + 1)] for row_index in range(hash_size)]
-
-    value = 0
-    bit_index = 0
-    for row in rows:
-        for left, right in zip(row, row[1:]):
-            if left > right:
-                value |= 1 << bit_index
-            bit_index += 1
-    return value
-
-
-def dhash_from_filestorage(file_storage, *, hash_size: int = 8) -> int:
-    file_storage.stream.seek(0)
-    try:
-        with Image.open(file_storage.stream) as image:
-            return compute_dhash(ImageOps.exif_transpose(image), hash_size=hash_size)
-    except Exception as exc:
-        raise ValueError(f"参考图解析失败：{exc}") from exc
-
-
-def dhash_from_path(path: Path, *, hash_size: int = 8) -> int:
-    with Image.open(path) as image:
-        return compute_dhash(ImageOps.exif_transpose(image), hash_size=hash_size)
-
-
-def get_cached_dhash(path: Path, *, hash_size: int = 8) -> int:
-    cache_key = f"{path}|{hash_size}"
-    mtime = path.stat().st_mtime
-    with _hash_lock:
-        cached = _hash_cache.get(cache_key)
-        if cached and cached[0] == mtime:
-            return cached[1]
-
-    value = dhash_from_path(path, hash_size=hash_size)
-    with _hash_lock:
-        _hash_cache[cache_key] = (mtime, value)
-    return value
-
-
-def compute_similarity_percent(left: int, right: int, *, bits: int) -> float:
-    distance = (left ^ right).bit_count()
-    return max(0.0, min(100.0, (1.0 - distance / bits) * 100.0))
+REFERENCE_AGGREGATIONS = ("max", "mean", "any")
+DEFAULT_REFERENCE_AGGREGATION = "max"
+DEFAULT_AGGREGATE_THRESHOLD = 80.0
+SCORE_CHUNK_SIZE = 256
 
 
 def resolve_similarity_targets(targets: List[str], bucket: str) -> List[dict]:
@@ -93,20 +54,60 @@ def resolve_similarity_targets(targets: List[str], bucket: str) -> List[dict]:
     return items
 
 
+def resolve_reference_paths(reference_paths: List[str], bucket: str) -> List[Path]:
+    paths: List[Path] = []
+    for relative in reference_paths:
+        normalized = normalize_relative_path(relative)
+        try:
+            path = safe_bucket_path(bucket, normalized)
+        except ValueError as exc:
+            raise ValueError(f"参考图路径无效：{relative}") from exc
+        if not normalized or not path.is_file() or not allowed_image(path.name):
+            raise ValueError(f"参考图不存在：{relative}")
+        paths.append(path)
+    return paths
+
+
+def aggregate_reference_scores(
+    matrix: np.ndarray,
+    aggregation: str = DEFAULT_REFERENCE_AGGREGATION,
+    *,
+    threshold: float = DEFAULT_AGGREGATE_THRESHOLD,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """把 (候选数, 参考图数) 的分数矩阵聚合为每个候选一个分数，返回 (分数, 最佳参考图下标, 是否保留)。"""
+    best_reference = matrix.argmax(axis=1)
+    best = matrix.max(axis=1)
+    if aggregation == "mean":
+        return matrix.mean(axis=1), best_reference, np.ones(len(matrix), dtype=bool)
+    if aggregation == "any":
+        return best, best_reference, best >= threshold
+    return best, best_reference, np.ones(len(matrix), dtype=bool)
+
+
 def find_similar_images(
-    reference_storage,
+    references: List,
     *,
     bucket: str = "source",
     targets: List[str] | None = None,
+    hash_algorithms: List[str] | None = None,
+    hash_size: int = DEFAULT_HASH_SIZE,
+    aggregation: str = DEFAULT_REFERENCE_AGGREGATION,
+    aggregate_threshold: float = DEFAULT_AGGREGATE_THRESHOLD,
+    run: FilterRun | None = None,
 ) -> List[dict]:
+    run = run or begin_filter_run("similarity")
+    algorithms = normalize_hash_algorithms(hash_algorithms)
+    hash_size = normalize_hash_size(hash_size)
     candidates = resolve_similarity_targets(list(targets or []), bucket=bucket)
     if not candidates:
         update_state("ai_clean", status="idle", progress=0, processed=0, total=0, bucket=bucket, message="未找到可筛选的图片")
+        run.finish([], message="未找到可筛选的图片")
         return []
 
     total = len(candidates)
     with state_lock:
         if task_state["ai_clean"]["status"] == "running":
+            run.fail("已有 AI 图片清洗任务正在执行")
             raise RuntimeError("已有 AI 图片清洗任务正在执行")
         update_state(
             "ai_clean",
@@ -118,31 +119,66 @@ def find_similar_images(
             message="正在筛选相似图片",
             log=[],
         )
-    append_log("ai_clean", f"[{get_timestamp()}] 🧹 开始相似图片筛选，共 {total} 张图片")
+    append_log("ai_clean", f"[{get_timestamp()}] 🧹 开始相似图片筛选，共 {total} 张图片，参考图 {len(references)} 张")
+    labels = "、".join(HASH_ALGORITHMS[name].label for name in algorithms)
+    append_log("ai_clean", f"[{get_timestamp()}] 🔢 哈希算法：{labels}，尺寸 {hash_size}x{hash_size}")
 
     try:
-        reference_hash = dhash_from_filestorage(reference_storage)
+        reference_hashes = [
+            get_cached_hashes(reference, algorithms, hash_size=hash_size)
+            if isinstance(reference, Path)
+            else hashes_from_filestorage(reference, algorithms, hash_size=hash_size)
+            for reference in references
+        ]
     except Exception as exc:
         update_state("ai_clean", status="error", progress=100, message=str(exc))
+        run.fail(str(exc))
         raise
 
-    bits = 8 * 8
-
     results: List[dict] = []
+    pending_items: List[dict] = []
+    pending_hashes: List[dict] = []
+
+    def flush_pending() -> None:
+        if not pending_items:
+            return
+        matrices = similarity_matrices(reference_hashes, pending_hashes, algorithms, hash_size=hash_size)
+        fused = sum(matrices.values()) / len(matrices)
+        scores, best_reference, keep = aggregate_reference_scores(fused, aggregation, threshold=aggregate_threshold)
+        scored: List[dict] = []
+        for index, item in enumerate(pending_items):
+            if not keep[index]:
+                continue
+            payload = {**item, "probability": round(float(scores[index]), 2)}
+            if len(references) > 1:
+                payload["reference_index"] = int(best_reference[index])
+            if len(algorithms) > 1:
+                payload["hash_scores"] = {
+                    name: round(float(matrix[index, best_reference[index]]), 2) for name, matrix in matrices.items()
+                }
+            scored.append(payload)
+        results.extend(scored)
+        run.publish(scored)
+        pending_items.clear()
+        pending_hashes.clear()
+
     processed = 0
     for item in candidates:
+        if run.cancelled:
+            break
         try:
             relative_path = item.get("relative_path") or ""
             image_path = safe_bucket_path(bucket, relative_path)
             if not image_path.exists():
                 raise FileNotFoundError(relative_path)
-            image_hash = get_cached_dhash(image_path)
-            probability = compute_similarity_percent(reference_hash, image_hash, bits=bits)
-            results.append({**item, "probability": round(probability, 2)})
+            pending_hashes.append(get_cached_hashes(image_path, algorithms, hash_size=hash_size))
+            pending_items.append(item)
         except Exception:
             pass
         finally:
             processed += 1
+            if len(pending_items) >= SCORE_CHUNK_SIZE:
+                flush_pending()
             if processed == total or processed % 25 == 0:
                 update_state(
                     "ai_clean",
@@ -150,26 +186,36 @@ def find_similar_images(
                     processed=processed,
                     message=f"已处理 {processed}/{total} 张图片",
                 )
+    flush_pending()
 
     results.sort(key=lambda entry: entry.get("probability", 0), reverse=True)
     results = results[:MAX_SIMILAR_RESULTS]
+    if run.cancelled:
+        message = f"筛选已取消，已处理 {processed}/{total} 张图片"
+        update_state("ai_clean", status="idle", processed=processed, message=message)
+        append_log("ai_clean", f"[{get_timestamp()}] ⏹️ {message}")
+        run.finish(results, status="cancelled", message=message)
+        return results
     if not results:
         update_state("ai_clean", status="error", progress=100, processed=processed, message="筛选失败：未获得有效结果")
         append_log("ai_clean", f"[{get_timestamp()}] ❌ 筛选失败：未获得有效结果")
+        run.fail("筛选失败：未获得有效结果")
         return []
 
     best = results[0]
+    message = f"筛选完成，找到 {len(results)} 张相似图片"
     update_state(
         "ai_clean",
         status="success",
         progress=100,
         processed=processed,
-        message=f"筛选完成，找到 {len(results)} 张相似图片",
+        message=message,
     )
     append_log(
         "ai_clean",
         f"[{get_timestamp()}] ✅ 筛选完成，最佳匹配：{best.get('name', '')}（{best.get('probability', 0)}%）",
     )
+    run.finish(results, message=message)
     return results
 
 
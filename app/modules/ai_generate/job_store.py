@@ -0,0 +1,205 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from app.core.config import GENERATION_JOB_RETENTION_DAYS, GENERATION_JOBS_DB
+from app.shared.integrations.runninghub_keys import api_key_fingerprint
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS generation_jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS generation_items (
+    job_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    relative_path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    task_id TEXT,
+    key_index INTEGER,
+    outputs TEXT,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, relative_path)
+);
+"""
+
+# 条目状态：pending 待提交，submitted 已提交待完成（task_id 与 key_index 有效），success / failed 已结束
+FINISHED_ITEM_STATUSES = ("success", "failed")
+# 任务参数中的 API Key 不落盘，只保存 Key 的短哈希（api_key_ids），恢复时按哈希从环境变量的 Key 池中找回
+SECRET_PAYLOAD_FIELDS = ("api_key", "api_keys")
+
+
+def persistable_payload(payload: Dict) -> Dict:
+    api_keys = payload.get("api_keys") or ([payload["api_key"]] if payload.get("api_key") else [])
+    stored = {key: value for key, value in payload.items() if key not in SECRET_PAYLOAD_FIELDS}
+    stored["api_key_ids"] = [api_key_fingerprint(api_key) for api_key in api_keys]
+    return stored
+
+
+class GenerationJobStore:
+    """批量生成任务的本地 SQLite 持久化：记录条目、尝试次数、RunningHub taskId 与输出文件。
+
+    进程重启后未完成的任务可以继续：已提交的条目按 taskId 重新轮询，不会重复提交扣费。
+    任务参数中的 API Key 不落盘，只保存短哈希；已结束的任务超过保留期后删除。
+    """
+
+    def __init__(self, db_path: Path = GENERATION_JOBS_DB) -> None:
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if not self._initialized:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            try:
+                connection.row_factory = sqlite3.Row
+                if not self._initialized:
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    connection.executescript(SCHEMA)
+                    columns = {row["name"] for row in connection.execute("PRAGMA table_info(generation_items)")}
+                    if "key_index" not in columns:
+                        # 旧版本创建的库没有这一列：记录提交任务所用的 API Key 在 payload["api_keys"] 中的下标
+                        connection.execute("ALTER TABLE generation_items ADD COLUMN key_index INTEGER")
+                    self._scrub_secrets(connection)
+                    self._initialized = True
+                with connection:
+                    yield connection
+            finally:
+                connection.close()
+
+    def create_job(self, payload: Dict, filenames: List[str], bucket: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO generation_jobs (id, status, bucket, payload, created_at, updated_at) VALUES (?, 'running', ?, ?, ?, ?)",
+                (job_id, bucket, json.dumps(persistable_payload(payload), ensure_ascii=False), now, now),
+            )
+            connection.executemany(
+                "INSERT OR IGNORE INTO generation_items (job_id, position, relative_path, updated_at) VALUES (?, ?, ?, ?)",
+                [(job_id, position, filename, now) for position, filename in enumerate(filenames)],
+            )
+        return job_id
+
+    def load_job(self, job_id: str) -> Dict | None:
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM generation_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            items = connection.execute(
+                "SELECT * FROM generation_items WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "bucket": row["bucket"],
+            "payload": json.loads(row["payload"]),
+            "items": [dict(item) for item in items],
+        }
+
+    def unfinished_jobs(self) -> List[str]:
+        """按创建时间倒序返回仍处于 running 状态的任务。"""
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id FROM generation_jobs WHERE status = 'running' ORDER BY created_at DESC"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def latest_job_id(self, status: str) -> str | None:
+        """返回指定状态下最近创建的任务，没有时返回 None。"""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT id FROM generation_jobs WHERE status = ? ORDER BY created_at DESC LIMIT 1", (status,)
+            ).fetchone()
+        return row["id"] if row else None
+
+    def mark_submitted(self, job_id: str, relative_path: str, task_id: str, attempts: int, key_index: int = 0) -> None:
+        self._update_item(job_id, relative_path, status="submitted", task_id=task_id, attempts=attempts, key_index=key_index)
+
+    def mark_retry(self, job_id: str, relative_path: str, attempts: int, error: str) -> None:
+        # 重新排队的条目需要重新提交，旧 taskId 作废
+        self._update_item(job_id, relative_path, status="pending", task_id=None, attempts=attempts, error=error)
+
+    def mark_finished(
+        self,
+        job_id: str,
+        relative_path: str,
+        status: str,
+        *,
+        outputs: List[str] | None = None,
+        error: str | None = None,
+    ) -> None:
+        self._update_item(
+            job_id,
+            relative_path,
+            status=status,
+            outputs=json.dumps(outputs or [], ensure_ascii=False),
+            error=error,
+        )
+
+    def finish_job(self, job_id: str, status: str) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE generation_jobs SET status = ?, updated_at = ? WHERE id = ?",
+                (status, time.time(), job_id),
+            )
+
+    def prune_finished_jobs(self, retention_days: int = GENERATION_JOB_RETENTION_DAYS) -> int:
+        """删除结束超过 retention_days 天的任务及其条目，返回删除的任务数。"""
+        cutoff = time.time() - retention_days * 86400
+        with self._connect() as connection:
+            job_ids = [
+                row["id"]
+                for row in connection.execute(
+                    "SELECT id FROM generation_jobs WHERE status != 'running' AND updated_at < ?", (cutoff,)
+                ).fetchall()
+            ]
+            connection.executemany("DELETE FROM generation_items WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+            connection.executemany("DELETE FROM generation_jobs WHERE id = ?", [(job_id,) for job_id in job_ids])
+        return len(job_ids)
+
+    @staticmethod
+    def _scrub_secrets(connection: sqlite3.Connection) -> None:
+        # 旧版本按原样保存了含 API Key 的任务参数，打开数据库时改写为只含 Key 哈希的版本
+        for row in connection.execute("SELECT id, payload FROM generation_jobs").fetchall():
+            payload = json.loads(row["payload"])
+            if any(field in payload for field in SECRET_PAYLOAD_FIELDS):
+                connection.execute(
+                    "UPDATE generation_jobs SET payload = ? WHERE id = ?",
+                    (json.dumps(persistable_payload(payload), ensure_ascii=False), row["id"]),
+                )
+
+    def _update_item(self, job_id: str, relative_path: str, **fields) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as connection:
+            connection.execute(
+                f"UPDATE generation_items SET {assignments}, updated_at = ? WHERE job_id = ? AND relative_path = ?",
+                (*fields.values(), time.time(), job_id, relative_path),
+            )
+
+
+_store_lock = threading.Lock()
+_store: GenerationJobStore | None = None
+
+
+def get_job_store() -> GenerationJobStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = GenerationJobStore()
+        return _store
@@ -4,11 +4,13 @@ from flask import Blueprint, request, send_file
 
 from app.core.responses import error_response, success_response
 from app.modules.images.service import validate_generated_upload
-from .schemas import normalize_generation_payload
+from app.shared.integrations.runninghub_webhook import handle_webhook, verify_webhook_token
+from .schemas import normalize_generation_payload, resolve_api_keys
 from .service import (
     build_ai_export,
     list_ai_pairs,
     queue_generation,
+    resume_needs_key_job,
     save_manual_generated,
     validate_generation_request,
 )
@@ -52,6 +54,19 @@ def parse_runninghub_example():
         return error_response(f"解析示例失败：{exc}", status_code=500)
 
 
+@bp.route("/runninghub/webhook", methods=["POST"])
+def runninghub_webhook():
+    token = request.args.get("token") or request.headers.get("X-Webhook-Token", "")
+    if not verify_webhook_token(token):
+        return error_response("回调鉴权失败", status_code=401)
+    body = request.get_json(force=True, silent=True)
+    if not isinstance(body, dict):
+        return error_response("回调内容不是有效的 JSON")
+    outcome = handle_webhook(body)
+    # 未匹配的回调也返回 200，避免对方反复重试已结束的任务
+    return success_response("回调已处理" if outcome != "unknown" else "未找到对应的在途任务", outcome=outcome)
+
+
 @bp.route("/images/generate", methods=["POST"])
 def generate_images():
     payload = normalize_generation_payload(request.get_json(force=True) or {})
@@ -64,6 +79,15 @@ def generate_images():
     return error_response(message, status_code=409 if "正在执行" in message else 400)
 
 
+@bp.route("/ai/generate/resume", methods=["POST"])
+def resume_generation():
+    data = request.get_json(force=True) or {}
+    ok, message = resume_needs_key_job(resolve_api_keys(data.get("api_keys") or data.get("api_key")))
+    if ok:
+        return success_response(message)
+    return error_response(message, status_code=409 if "正在执行" in message else 400)
+
+
 @bp.route("/ai/export", methods=["GET"])
 def ai_export():
     memory_file = build_ai_export()
@@ -73,3 +97,4 @@ def ai_export():
         as_attachment=True,
         download_name=f"ai_export_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
     )
+
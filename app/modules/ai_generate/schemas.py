@@ -1,7 +1,11 @@
 import json
+import re
 from typing import Any, Dict
 
 from app.core.config import (
+    RUNNINGHUB_API_KEYS,
+    RUNNINGHUB_CONCURRENCY,
+    RUNNINGHUB_MAX_CONCURRENCY,
     RUNNINGHUB_QUERY_URL,
 )
 from app.shared.integrations.runninghub import guess_model_from_endpoint, normalize_model_name
@@ -40,7 +44,26 @@ def _resolve_node_field(extra_params: dict[str, Any], field_name: str, default:
     return default
 
 
+def _resolve_concurrency(value: Any) -> int:
+    try:
+        concurrency = int(value)
+    except (TypeError, ValueError):
+        concurrency = RUNNINGHUB_CONCURRENCY
+    return min(max(1, concurrency), RUNNINGHUB_MAX_CONCURRENCY)
+
+
+def resolve_api_keys(value: Any) -> list[str]:
+    """api_key 可填写多个（逗号、分号或换行分隔）；未填写时使用环境变量中的 Key 池。"""
+    if isinstance(value, (list, tuple)):
+        candidates = [str(item or "") for item in value]
+    else:
+        candidates = re.split(r"[\s,;]+", str(value or ""))
+    api_keys = list(dict.fromkeys(item.strip() for item in candidates if item.strip()))
+    return api_keys or list(RUNNINGHUB_API_KEYS)
+
+
 def normalize_generation_payload(data: Dict) -> Dict:
+    api_keys = resolve_api_keys(data.get("api_keys") or data.get("api_key"))
     extra_params = _parse_object(data.get("extra_params"))
     image_api_url = (data.get("image_api_url") or "").strip()
     model = normalize_model_name(data.get("model") or guess_model_from_endpoint(image_api_url) or "")
@@ -50,7 +73,8 @@ def normalize_generation_payload(data: Dict) -> Dict:
         "prompt": (data.get("prompt") or "").strip(),
         "overwrite": bool(data.get("overwrite", True)),
         "targets": data.get("targets") or [],
-        "api_key": (data.get("api_key") or "").strip(),
+        "api_key": api_keys[0] if api_keys else "",
+        "api_keys": api_keys,
         "aspect_ratio": str(
             _resolve_value(
                 data.get("aspect_ratio"),
@@ -79,4 +103,5 @@ def normalize_generation_payload(data: Dict) -> Dict:
         ).strip(),
         "extra_params": extra_params,
         "extra_reference_images": data.get("extra_reference_images") or [],
+        "concurrency": _resolve_concurrency(data.get("concurrency")),
     }
@@ -1,29 +1,61 @@
+import heapq
+import itertools
+import multiprocessing
+import sqlite3
 import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
 from typing import Dict, List
 
-from app.core.config import RUNNINGHUB_DEFAULT_IMAGE_PROMPT
+from app.core.config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    RUNNINGHUB_API_KEYS,
+    RUNNINGHUB_CONCURRENCY,
+    RUNNINGHUB_DEFAULT_IMAGE_PROMPT,
+    RUNNINGHUB_RESUME_JOBS,
+)
 from app.core.state import append_log, state_lock, task_state, update_state
 from app.core.utils import allowed_image, get_timestamp, normalize_relative_path, safe_bucket_path
+from app.shared.integrations.http_pool import get_http_session
 from app.shared.integrations.runninghub import (
+    PERMANENT_ERRORS,
+    QuotaExceededError,
     RUNNINGHUB_MAX_RETRIES,
     RunningHubClient,
     RunningHubError,
-    TaskFailedError,
-    TaskTimeoutError,
+    SubmissionUnknownError,
     UnifiedImageRequest,
     ValidationError,
     extract_result_urls,
     get_model_spec,
     resolve_model_name,
 )
+from app.shared.integrations.runninghub_keys import api_key_fingerprint, get_key_pool, mask_api_key
+from app.shared.integrations.runninghub_retry import CircuitBreaker, RetryPolicy
+from app.shared.integrations.runninghub_webhook import local_webhook_url
+from app.shared.integrations.upload_cache import get_upload_cache
 from app.shared.storage.media_store import (
     create_ai_export_zip,
     gather_media_items,
     get_ai_pairs,
+    commit_generation_outputs,
+    generation_output_paths,
+    generation_part_path,
     save_file_storage,
-    save_generation_outputs,
 )
+from .job_store import FINISHED_ITEM_STATUSES, get_job_store
+
+
+# 单张图片整体重试（重新提交任务）的退避：比单次 HTTP 重试更保守
+GENERATION_RETRY_POLICY = RetryPolicy(max_attempts=RUNNINGHUB_MAX_RETRIES, base_delay=5.0, max_delay=120.0)
+# 单个任务返回多张结果时的并发下载数与流式写盘的块大小
+RESULT_DOWNLOAD_WORKERS = 4
+RESULT_DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# 单张图片因 Key 配额限制被放回队列的次数上限，避免所有 Key 长期不可用时无限等待
+QUOTA_MAX_REQUEUES = 10
 
 
 def list_ai_pairs(keyword: str | None = None):
@@ -41,7 +73,7 @@ def save_manual_generated(file, target_stem: str) -> str:
 
 def validate_generation_request(payload: Dict) -> str | None:
     if not payload["api_key"]:
-        return "请填写 RunningHub API Key"
+        return "请填写 RunningHub API Key，或通过环境变量 RUNNINGHUB_API_KEYS 配置 Key 池"
     try:
         resolved_model_name = resolve_model_name(payload.get("model", ""), payload.get("image_api_url", ""))
         payload["model"] = resolved_model_name
@@ -105,16 +137,125 @@ def queue_generation(payload: Dict) -> tuple[bool, str]:
             total=len(filenames),
             processed=0,
             bucket="source",
+            needs_key=False,
         )
 
+    store = get_job_store()
+    try:
+        store.prune_finished_jobs()
+    except sqlite3.Error:
+        pass
+    job_id = store.create_job(payload, filenames, "source")
     threading.Thread(
         target=generate_images_worker,
-        args=(payload, filenames, "source"),
+        args=(payload, filenames, "source", job_id),
         daemon=True,
     ).start()
     return True, "AI批量生成任务已启动，请在右侧控制台查看进度"
 
 
+def resume_generation_jobs() -> bool:
+    """启动时继续最近一个未完成的批量生成任务：已提交的条目按 taskId 继续轮询，其余照常提交。
+
+    同一时间只能运行一个生成任务，更早的未完成任务标记为 interrupted。API Key 不落盘，
+    恢复时按保存的 Key 哈希从 RUNNINGHUB_API_KEYS 中找回；找不到时任务标记为 needs_key，
+    由用户重新填写 Key 后通过 resume_needs_key_job 继续。
+    """
+    if not RUNNINGHUB_RESUME_JOBS or multiprocessing.parent_process() is not None:
+        return False
+    store = get_job_store()
+    try:
+        store.prune_finished_jobs()
+        job_ids = store.unfinished_jobs()
+        for stale_id in job_ids[1:]:
+            store.finish_job(stale_id, "interrupted")
+        job = store.load_job(job_ids[0]) if job_ids else None
+    except sqlite3.Error:
+        return False
+    if job is None:
+        return False
+
+    items = job["items"]
+    payload = job["payload"]
+    api_keys = _restore_api_keys(payload.get("api_key_ids") or [], RUNNINGHUB_API_KEYS)
+    with state_lock:
+        if task_state["image_generation"]["status"] == "running":
+            return False
+        if api_keys is None:
+            store.finish_job(job["id"], "needs_key")
+            update_state(
+                "image_generation",
+                status="error",
+                message="上次未完成的生成任务无法自动恢复：所用 API Key 不在 RUNNINGHUB_API_KEYS 中，请重新填写 Key 后点击恢复任务",
+                total=len(items),
+                processed=sum(1 for item in items if item["status"] in FINISHED_ITEM_STATUSES),
+                bucket=job["bucket"],
+                needs_key=True,
+            )
+            return False
+        _start_resumed_job(job, api_keys)
+    return True
+
+
+def resume_needs_key_job(api_keys: List[str]) -> tuple[bool, str]:
+    """用重新填写的 Key 继续最近一个 needs_key 任务。
+
+    填写的 Key 按哈希与任务记录的 api_key_ids 比对，顺序以任务记录为准；已提交的条目按 taskId 继续轮询，不会重新提交。
+    """
+    store = get_job_store()
+    try:
+        job_id = store.latest_job_id("needs_key")
+        job = store.load_job(job_id) if job_id else None
+    except sqlite3.Error as exc:
+        return False, f"读取生成任务记录失败：{exc}"
+    if job is None:
+        return False, "没有等待重新填写 Key 的生成任务"
+    restored = _restore_api_keys(job["payload"].get("api_key_ids") or [], [*api_keys, *RUNNINGHUB_API_KEYS])
+    if restored is None:
+        return False, "填写的 API Key 与待恢复任务所用的 Key 不一致，请填写提交该任务时使用的全部 Key"
+    with state_lock:
+        if task_state["image_generation"]["status"] == "running":
+            return False, "已有生成任务正在执行"
+        try:
+            store.finish_job(job["id"], "running")
+        except sqlite3.Error as exc:
+            return False, f"更新生成任务记录失败：{exc}"
+        _start_resumed_job(job, restored)
+    return True, "已恢复未完成的生成任务，请在右侧控制台查看进度"
+
+
+def _start_resumed_job(job: Dict, api_keys: List[str]) -> None:
+    items = job["items"]
+    payload = job["payload"]
+    payload["api_keys"] = api_keys
+    payload["api_key"] = api_keys[0]
+    update_state(
+        "image_generation",
+        status="queued",
+        progress=0,
+        message="正在恢复未完成的生成任务",
+        log=[],
+        prompt=payload.get("prompt") or RUNNINGHUB_DEFAULT_IMAGE_PROMPT,
+        total=len(items),
+        processed=sum(1 for item in items if item["status"] in FINISHED_ITEM_STATUSES),
+        bucket=job["bucket"],
+        needs_key=False,
+    )
+    threading.Thread(
+        target=generate_images_worker,
+        args=(payload, [item["relative_path"] for item in items], job["bucket"], job["id"]),
+        daemon=True,
+    ).start()
+
+
+def _restore_api_keys(key_ids: List[str], candidates: List[str]) -> List[str] | None:
+    # 保持原来的顺序，条目记录的 key_index 才能对应到同一个 Key
+    pool = {api_key_fingerprint(api_key): api_key for api_key in candidates}
+    if not key_ids or any(key_id not in pool for key_id in key_ids):
+        return None
+    return [pool[key_id] for key_id in key_ids]
+
+
 def build_generation_request(payload: Dict, source_path: str, bucket: str) -> UnifiedImageRequest:
     image_inputs = [str(safe_bucket_path(bucket, source_path))]
     for extra_ref in payload.get("extra_reference_images") or []:
@@ -135,29 +276,57 @@ def build_generation_request(payload: Dict, source_path: str, bucket: str) -> Un
         input_fidelity=payload.get("input_fidelity") or "",
         sequential_image_generation=payload.get("sequential_image_generation") or "",
         max_images=_to_int(payload.get("max_images")),
-        webhook_url=payload.get("webhook_url") or "",
+        webhook_url=payload.get("webhook_url") or local_webhook_url(),
         extra_params=payload.get("extra_params") or {},
         endpoint_override=payload.get("image_api_url") or "",
         query_url=payload.get("query_url") or "",
     )
 
 
-def generate_images_worker(payload: Dict, filenames: List[str], bucket: str) -> None:
-    total = len(filenames)
-    completed_count = 0
-    success_count = 0
-    failed_count = 0
+def generate_images_worker(payload: Dict, filenames: List[str], bucket: str, job_id: str | None = None) -> None:
+    """后台线程入口：任何未预料的异常都把任务标记为 error，避免状态一直停在 running 导致无法再提交新任务。"""
+    store = get_job_store()
+    try:
+        if job_id is None:
+            job_id = store.create_job(payload, filenames, bucket)
+        _run_generation_job(store, payload, bucket, job_id)
+    except Exception as exc:
+        append_log("image_generation", f"[{get_timestamp()}] 生成任务异常终止：{exc}")
+        if job_id is not None:
+            try:
+                store.finish_job(job_id, "error")
+            except sqlite3.Error:
+                pass
+        update_state("image_generation", status="error", message=f"生成任务异常终止：{exc}")
+
+
+def _run_generation_job(store, payload: Dict, bucket: str, job_id: str) -> None:
+    items = store.load_job(job_id)["items"]
+    total = len(items)
+    success_count = sum(1 for item in items if item["status"] == "success")
+    failed_count = sum(1 for item in items if item["status"] == "failed")
+    completed_count = success_count + failed_count
+    # 已提交但未完成的条目：恢复时直接按 taskId 等待结果，不再重新提交
+    resume_tasks = {
+        item["relative_path"]: (item["task_id"], item.get("key_index") or 0)
+        for item in items
+        if item["status"] == "submitted" and item["task_id"]
+    }
     prompt = payload["prompt"] or RUNNINGHUB_DEFAULT_IMAGE_PROMPT
     spec = get_model_spec(payload["model"], payload.get("extra_params"))
 
     def log_message(message: str) -> None:
         append_log("image_generation", f"[{get_timestamp()}] {message}")
 
-    client = RunningHubClient(
-        api_key=payload["api_key"],
-        query_url=payload["query_url"],
-        log=log_message,
-    )
+    # 旧版本保存的任务只有单个 api_key
+    api_keys = payload.get("api_keys") or [payload["api_key"]]
+    key_pool = get_key_pool()
+    # 各个 Key 的客户端共享熔断器：接口整体异常时整批一起暂停
+    breaker = CircuitBreaker(log=log_message)
+    clients = {
+        api_key: RunningHubClient(api_key=api_key, query_url=payload["query_url"], log=log_message, breaker=breaker)
+        for api_key in api_keys
+    }
 
     update_state(
         "image_generation",
@@ -170,66 +339,161 @@ def generate_images_worker(payload: Dict, filenames: List[str], bucket: str) ->
         bucket=bucket,
     )
     log_message(f"开始 AI批量生成任务，共 {total} 张图片")
+    if completed_count or resume_tasks:
+        log_message(f"恢复未完成的任务：已完成 {completed_count} 张，{len(resume_tasks)} 张已提交待完成")
     log_message(f"当前模型：{spec.label} ({spec.model_name})")
     log_message(f"模型接口：{payload.get('image_api_url') or spec.endpoint}")
-    log_message(f"查询接口：{payload.get('query_url') or client.query_url}")
+    log_message(f"查询接口：{payload.get('query_url') or clients[api_keys[0]].query_url}")
     if payload.get("aspect_ratio"):
         log_message(f"当前 aspectRatio：{payload.get('aspect_ratio')}")
     if payload.get("extra_params"):
         log_message(f"附加模型参数：{payload['extra_params']}")
 
-    queue = [(filename, 0) for filename in filenames]
-    while queue:
-        relative_path, attempts = queue.pop(0)
+    concurrency = max(1, int(payload.get("concurrency") or RUNNINGHUB_CONCURRENCY))
+    log_message(f"同时进行的任务数：{min(concurrency, key_pool.capacity(api_keys))}")
+    if len(api_keys) > 1:
+        log_message(f"使用 {len(api_keys)} 个 API Key 分摊任务：{', '.join(mask_api_key(api_key) for api_key in api_keys)}")
+    quota_requeues: Dict[str, int] = {}
+
+    def generate_one(relative_path: str, attempts: int) -> tuple[str, float | None]:
+        """在线程池中完成单张图片的上传、提交、轮询与保存，
+        返回 (success / retry / requeue / failed, 建议等待秒数)。"""
+        try:
+            return attempt_one(relative_path, attempts)
+        except Exception as exc:
+            # 取 Key、写任务库（如数据库被锁）等环节出错时本条目判定失败，不影响其他条目和调度循环
+            log_message(f"生成 {relative_path} 失败：{exc}")
+            try:
+                store.mark_finished(job_id, relative_path, "failed", error=str(exc))
+            except sqlite3.Error:
+                pass
+            return "failed", None
+
+    def attempt_one(relative_path: str, attempts: int) -> tuple[str, float | None]:
         try:
             source_file = safe_bucket_path(bucket, relative_path)
         except ValueError as exc:
             log_message(f"跳过非法路径：{relative_path} ({exc})")
-            completed_count += 1
-            failed_count += 1
-            continue
+            store.mark_finished(job_id, relative_path, "failed", error=str(exc))
+            return "failed", None
 
         if not source_file.exists():
             log_message(f"跳过不存在的文件：{relative_path}")
-            completed_count += 1
-            failed_count += 1
-            continue
+            store.mark_finished(job_id, relative_path, "failed", error="文件不存在")
+            return "failed", None
+
+        resume_task_id, key_index = resume_tasks.pop(relative_path, ("", 0))
+        api_key = api_keys[key_index] if key_index < len(api_keys) else api_keys[0]
 
-        update_state("image_generation", message=f"正在生成 {relative_path}（第 {attempts + 1} 次尝试）")
-        log_message(f"正在生成：{relative_path} (第 {attempts + 1} 次尝试)")
+        def on_submitted(task: Dict) -> None:
+            key_pool.record_success(api_key)
+            store.mark_submitted(job_id, relative_path, task["taskId"], attempts, api_keys.index(api_key))
 
         try:
-            request = build_generation_request(payload, relative_path, bucket)
-            result = client.run(request, wait=True)
+            if resume_task_id:
+                key_pool.occupy(api_key)
+            else:
+                # 按负载挑选 Key，所有 Key 满载或处于退避期时在这里等待
+                api_key = key_pool.acquire(api_keys)
+                log_message(f"正在生成：{relative_path} (第 {attempts + 1} 次尝试)")
+            # 取到名额后才进入这里，finally 中释放
+            try:
+                request = build_generation_request(payload, relative_path, bucket)
+                result = clients[api_key].run(request, wait=True, resume_task_id=resume_task_id, on_submitted=on_submitted)
+            finally:
+                # 任务结束（成功或失败）即释放该 Key 的在途名额，下载结果不占用
+                key_pool.release(api_key)
             result_urls = extract_result_urls(result)
             if not result_urls:
                 raise RunningHubError("RunningHub 任务已完成，但未返回结果图片")
-            saved = save_generation_outputs(download_generated_payloads(result_urls), relative_path, bucket, payload["overwrite"])
+            saved = download_generation_outputs(result_urls, relative_path, bucket, payload["overwrite"])
+            store.mark_finished(job_id, relative_path, "success", outputs=saved)
             log_message(f"完成 {relative_path}，输出 {len(saved)} 个文件")
-            completed_count += 1
-            success_count += 1
-        except (ValidationError, TaskFailedError, TaskTimeoutError, RunningHubError) as exc:
+            return "success", None
+        except QuotaExceededError as exc:
+            cooldown = key_pool.record_quota_error(api_key, exc.retry_after)
+            log_message(f"API Key {mask_api_key(api_key)} 触发配额限制，暂停使用 {cooldown:.0f} 秒：{exc}")
+            if quota_requeues.get(relative_path, 0) < QUOTA_MAX_REQUEUES:
+                # 配额错误不消耗重试次数，放回队列换 Key 或等待退避结束
+                store.mark_retry(job_id, relative_path, attempts, str(exc))
+                return "requeue", None
+            log_message(f"{relative_path} 多次因配额限制未能提交，跳过此图片")
+            store.mark_finished(job_id, relative_path, "failed", error=str(exc))
+            return "failed", None
+        except SubmissionUnknownError as exc:
+            # 服务端可能已经创建了任务，自动重新提交会重复扣费：标记失败，由用户在 RunningHub 核对后决定是否重新生成
+            log_message(f"{relative_path} 提交结果未知，可能已在 RunningHub 创建任务，不再自动重新提交：{exc}")
+            store.mark_finished(job_id, relative_path, "failed", error=f"提交结果未知：{exc}")
+            return "failed", None
+        except PERMANENT_ERRORS as exc:
+            log_message(f"生成 {relative_path} 失败：{exc}（参数或输入有误，不再重试）")
+            store.mark_finished(job_id, relative_path, "failed", error=str(exc))
+            return "failed", None
+        except RunningHubError as exc:
             log_message(f"生成 {relative_path} 失败：{exc}")
-            attempts += 1
-            if attempts < RUNNINGHUB_MAX_RETRIES:
-                log_message("已重新加入队列，稍后重试")
-                queue.append((relative_path, attempts))
-            else:
-                log_message("达到最大重试次数，跳过此图片")
-                completed_count += 1
-                failed_count += 1
+            if attempts + 1 < RUNNINGHUB_MAX_RETRIES:
+                store.mark_retry(job_id, relative_path, attempts + 1, str(exc))
+                return "retry", getattr(exc, "retry_after", None)
+            log_message(f"{relative_path} 达到最大重试次数，跳过此图片")
+            store.mark_finished(job_id, relative_path, "failed", error=str(exc))
+            return "failed", None
         except Exception as exc:
             log_message(f"生成 {relative_path} 失败：{exc}")
-            completed_count += 1
-            failed_count += 1
-
-        update_state(
-            "image_generation",
-            progress=int(completed_count / total * 100) if total else 100,
-            processed=completed_count,
-            message=f"已处理 {completed_count}/{total} 张图片（队列剩余 {len(queue)}）",
-        )
-
+            store.mark_finished(job_id, relative_path, "failed", error=str(exc))
+            return "failed", None
+
+    queue = deque((item["relative_path"], item["attempts"]) for item in items if item["status"] not in FINISHED_ITEM_STATUSES)
+    # 待重试的条目按可执行时间排队，退避期间不占用并发名额
+    delayed: List[tuple[float, int, str, int]] = []
+    retry_sequence = itertools.count()
+    in_flight: Dict[Future, tuple[str, int]] = {}
+    # 有界线程池：最多 concurrency 个任务同时在途，完成一个补一个
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="runninghub-generate") as executor:
+        while queue or delayed or in_flight:
+            while delayed and delayed[0][0] <= time.monotonic():
+                _, _, relative_path, attempts = heapq.heappop(delayed)
+                queue.append((relative_path, attempts))
+            while queue and len(in_flight) < concurrency:
+                relative_path, attempts = queue.popleft()
+                in_flight[executor.submit(generate_one, relative_path, attempts)] = (relative_path, attempts)
+            if not in_flight:
+                time.sleep(max(0.0, delayed[0][0] - time.monotonic()))
+                continue
+            update_state("image_generation", message=f"正在生成 {len(in_flight)} 张图片（已处理 {completed_count}/{total}）")
+
+            timeout = max(0.0, delayed[0][0] - time.monotonic()) if delayed else None
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                relative_path, attempts = in_flight.pop(future)
+                try:
+                    outcome, retry_after = future.result()
+                except Exception as exc:
+                    log_message(f"生成 {relative_path} 失败：{exc}")
+                    outcome, retry_after = "failed", None
+                if outcome == "requeue":
+                    quota_requeues[relative_path] = quota_requeues.get(relative_path, 0) + 1
+                    queue.append((relative_path, attempts))
+                    continue
+                if outcome == "retry":
+                    delay = GENERATION_RETRY_POLICY.delay(attempts, retry_after)
+                    log_message(f"{relative_path} 将在 {delay:.1f} 秒后重试")
+                    heapq.heappush(delayed, (time.monotonic() + delay, next(retry_sequence), relative_path, attempts + 1))
+                    continue
+                completed_count += 1
+                if outcome == "success":
+                    success_count += 1
+                else:
+                    failed_count += 1
+
+            update_state(
+                "image_generation",
+                progress=int(completed_count / total * 100) if total else 100,
+                processed=completed_count,
+                message=f"已处理 {completed_count}/{total} 张图片（进行中 {len(in_flight)}，队列剩余 {len(queue) + len(delayed)}）",
+            )
+
+    get_upload_cache().flush()
+    store.finish_job(job_id, "success" if failed_count == 0 else "error")
     update_state(
         "image_generation",
         status="success" if failed_count == 0 else "error",
@@ -239,18 +503,35 @@ def generate_images_worker(payload: Dict, filenames: List[str], bucket: str) ->
     )
 
 
-def download_generated_payloads(result_urls: List[str]) -> List[bytes]:
-    import requests
-
-    payloads: List[bytes] = []
-    for url in result_urls:
-        response = requests.get(url, timeout=120)
+def download_generation_outputs(result_urls: List[str], relative_path: str, bucket: str, overwrite: bool) -> List[str]:
+    """多张结果并发下载，逐块写入目标目录下的临时文件；全部成功后再原子地移动到位。"""
+    if not result_urls:
+        raise RuntimeError("未下载到任何生成结果")
+    destinations = generation_output_paths(relative_path, bucket, overwrite, len(result_urls))
+    part_files = [generation_part_path(destination) for destination in destinations]
+    try:
+        if len(result_urls) == 1:
+            _stream_download(result_urls[0], part_files[0])
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(len(result_urls), RESULT_DOWNLOAD_WORKERS),
+                thread_name_prefix="runninghub-download",
+            ) as executor:
+                list(executor.map(_stream_download, result_urls, part_files))
+        return commit_generation_outputs(part_files, relative_path, bucket, overwrite)
+    finally:
+        # 任一下载失败时不留下半成品；成功移动后这里不会再有残留文件
+        for part_file in part_files:
+            part_file.unlink(missing_ok=True)
+
+
+def _stream_download(url: str, part_file: Path) -> None:
+    with get_http_session().get(url, stream=True, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)) as response:
         if response.status_code != 200:
             raise RuntimeError(f"下载生成结果失败：HTTP {response.status_code} - {url}")
-        payloads.append(response.content)
-    if not payloads:
-        raise RuntimeError("未下载到任何生成结果")
-    return payloads
+        with part_file.open("wb") as handle:
+            for chunk in response.iter_content(chunk_size=RESULT_DOWNLOAD_CHUNK_SIZE):
+                handle.write(chunk)
 
 
 def _to_int(value):
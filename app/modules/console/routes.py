@@ -2,6 +2,10 @@ from flask import Blueprint, jsonify
 
 from app.core.config import BASE_MODEL_DIR, CURRENT_VERSION, IS_LINUX, SYSTEM_NAME
 from app.core.state import state_lock, task_state
+from app.modules.ai_clean.pose_model import pose_model_status
+from app.shared.integrations.http_pool import http_pool_stats
+from app.shared.integrations.runninghub_keys import get_key_pool
+from app.shared.integrations.runninghub_poller import get_runninghub_poller
 
 
 bp = Blueprint("console", __name__, url_prefix="/api")
@@ -22,4 +26,8 @@ def status():
             "ai_tag": dict(task_state["ai_tag"]),
             "version": CURRENT_VERSION,
         }
+    payload["pose_model"] = pose_model_status()
+    payload["runninghub_poller"] = get_runninghub_poller().stats()
+    payload["runninghub_keys"] = get_key_pool().stats()
+    payload["http_pool"] = http_pool_stats()
     return jsonify(payload)
@@ -5,6 +5,7 @@ from app.core.config import (
     CURRENT_VERSION,
     GITEE_REPO,
     IS_LINUX,
+    RUNNINGHUB_API_KEYS,
     RUNNINGHUB_DEFAULT_ASPECT_RATIO,
     RUNNINGHUB_QUERY_URL,
     RUNNINGHUB_WORKFLOW_ASPECT_RATIO_FIELD_DATA,
@@ -27,6 +28,7 @@ def build_index_context() -> dict:
         "is_linux": IS_LINUX,
         "base_dir": str(BASE_MODEL_DIR),
         "runninghub_query_url": RUNNINGHUB_QUERY_URL,
+        "runninghub_key_pool_size": len(RUNNINGHUB_API_KEYS),
         "runninghub_default_aspect_ratio": RUNNINGHUB_DEFAULT_ASPECT_RATIO,
         "runninghub_workflow_image_node_id": RUNNINGHUB_WORKFLOW_IMAGE_NODE_ID,
         "runninghub_workflow_image_field_name": RUNNINGHUB_WORKFLOW_IMAGE_FIELD_NAME,
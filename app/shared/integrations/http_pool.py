@@ -0,0 +1,154 @@
+import socket
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Dict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from app.core.config import (
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_IDLE,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    HTTP_READ_TIMEOUT,
+)
+
+
+class _HostStats:
+    """按主机统计请求数与新建连接数，两者之差即复用已有连接的次数。"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, int]] = {}
+
+    def _entry(self, host: str) -> Dict[str, int]:
+        return self._hosts.setdefault(host or "unknown", {"requests": 0, "connections": 0, "errors": 0})
+
+    def record_request(self, host: str) -> None:
+        with self._lock:
+            self._entry(host)["requests"] += 1
+
+    def record_connection(self, host: str) -> None:
+        with self._lock:
+            self._entry(host)["connections"] += 1
+
+    def record_error(self, host: str) -> None:
+        with self._lock:
+            self._entry(host)["errors"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for host, entry in self._hosts.items():
+                reused = max(0, entry["requests"] - entry["connections"])
+                result[host] = {
+                    **entry,
+                    "reused": reused,
+                    "reuse_rate": round(reused / entry["requests"], 3) if entry["requests"] else 0.0,
+                }
+            return result
+
+
+_host_stats = _HostStats()
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    # 连接断开后 urllib3 会复用连接对象重新建连，所以在 connect 而不是新建连接对象时计数
+    def connect(self) -> None:
+        _host_stats.record_connection(self.host)
+        super().connect()
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def connect(self) -> None:
+        _host_stats.record_connection(self.host)
+        super().connect()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+
+def _socket_options() -> list:
+    options = list(HTTPConnection.default_socket_options)
+    if HTTP_KEEPALIVE_IDLE <= 0:
+        return options
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    # TCP_KEEPIDLE / TCP_KEEPINTVL 只在部分平台上可用
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, HTTP_KEEPALIVE_IDLE))
+    if hasattr(socket, "TCP_KEEPINTVL"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(1, HTTP_KEEPALIVE_IDLE // 3)))
+    return options
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """连接池大小与 TCP keep-alive 可配置，并记录每个主机的连接复用情况。重试由调用方负责。"""
+
+    def __init__(self, pool_connections: int = HTTP_POOL_CONNECTIONS, pool_maxsize: int = HTTP_POOL_MAXSIZE) -> None:
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs) -> None:
+        pool_kwargs.setdefault("socket_options", _socket_options())
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        host = urlsplit(request.url).hostname or ""
+        _host_stats.record_request(host)
+        try:
+            return super().send(request, **kwargs)
+        except requests.RequestException:
+            _host_stats.record_error(host)
+            raise
+
+
+class PooledSession(requests.Session):
+    """进程内共享的 Session：不保存 Cookie（多线程共用时避免互相干扰），
+    未指定超时时使用默认超时，只给出一个数字时把它当作读取超时，连接超时单独限制。"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = PooledHTTPAdapter()
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def request(self, method, url, **kwargs):
+        timeout = kwargs.get("timeout")
+        if timeout is None:
+            kwargs["timeout"] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        elif isinstance(timeout, (int, float)):
+            kwargs["timeout"] = (min(HTTP_CONNECT_TIMEOUT, timeout), timeout)
+        return super().request(method, url, **kwargs)
+
+
+_session_lock = threading.Lock()
+_session: PooledSession | None = None
+
+
+def get_http_session() -> PooledSession:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = PooledSession()
+        return _session
+
+
+def http_pool_stats() -> Dict[str, Any]:
+    return {
+        "pool_connections": HTTP_POOL_CONNECTIONS,
+        "pool_maxsize": HTTP_POOL_MAXSIZE,
+        "hosts": _host_stats.snapshot(),
+    }
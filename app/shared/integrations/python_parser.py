@@ -2,10 +2,19 @@
 Python代码解析器 - 从用户上传的Python示例代码中自动提取API参数
 """
 import ast
+import copy
+import hashlib
 import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple
 
 
+# 编译结果按代码内容的 sha256 缓存，批量任务中同一份示例代码只解析一次
+COMPILED_EXAMPLE_CACHE_SIZE = 32
+
+
 class PythonAPIParser:
     """解析Python示例代码，提取API调用参数"""
     
@@ -256,3 +265,68 @@ def build_payload_from_parsed(
             payload[key] = value
     
     return payload
+
+
+@dataclass(frozen=True)
+class CompiledExample:
+    """解析一次后可重复使用的示例代码：endpoint 与 payload 模板。
+
+    build_payload 的结果与 build_payload_from_parsed 一致，但每次只需填入 prompt、图片与用户参数。
+    """
+
+    endpoint: str
+    # 必填参数（不含 imageUrls / images / prompt）按示例中的顺序排列，值为示例默认值，空值表示无默认值
+    required_params: Tuple[Tuple[str, Any], ...]
+    optional_params: Tuple[str, ...]
+    enum_values: Dict[str, Tuple[str, ...]]
+
+    def build_payload(self, user_prompt: str, user_images: List[str], user_params: Dict[str, Any]) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {"imageUrls": user_images, "prompt": user_prompt}
+        for key, default_value in self.required_params:
+            value = user_params.get(key)
+            if value not in (None, ""):
+                payload[key] = value
+            elif default_value not in (None, ""):
+                # 默认值可能是列表或字典，复制一份避免多个 payload 共用同一对象
+                payload[key] = copy.deepcopy(default_value)
+        for key in self.optional_params:
+            value = user_params.get(key)
+            if value in (None, ""):
+                continue
+            allowed = self.enum_values.get(key)
+            if allowed is not None and value not in allowed:
+                continue
+            payload[key] = value
+        return payload
+
+
+_compiled_lock = threading.Lock()
+_compiled_examples: "OrderedDict[str, CompiledExample]" = OrderedDict()
+
+
+def compile_python_example(python_code: str) -> CompiledExample:
+    """解析示例代码并编译成 CompiledExample，按代码哈希做 LRU 缓存。"""
+    code_hash = hashlib.sha256(python_code.encode("utf-8")).hexdigest()
+    with _compiled_lock:
+        compiled = _compiled_examples.get(code_hash)
+        if compiled is not None:
+            _compiled_examples.move_to_end(code_hash)
+            return compiled
+
+    parsed_info = parse_python_example(python_code)
+    compiled = CompiledExample(
+        endpoint=parsed_info.get("endpoint", ""),
+        required_params=tuple(
+            (key, value)
+            for key, value in parsed_info.get("required_params", {}).items()
+            if key not in ("imageUrls", "images", "prompt")
+        ),
+        optional_params=tuple(parsed_info.get("optional_params", {})),
+        enum_values={key: tuple(values) for key, values in parsed_info.get("enum_values", {}).items()},
+    )
+    with _compiled_lock:
+        _compiled_examples[code_hash] = compiled
+        _compiled_examples.move_to_end(code_hash)
+        while len(_compiled_examples) > COMPILED_EXAMPLE_CACHE_SIZE:
+            _compiled_examples.popitem(last=False)
+    return compiled
@@ -3,23 +3,36 @@ import copy
 import mimetypes
 import re
 import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import asdict, dataclass, field, replace
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Callable, Dict, Iterable, List
 
 import requests
+from urllib3.exceptions import NewConnectionError
 
 from app.core.config import (
     RUNNINGHUB_API_BASE,
     RUNNINGHUB_QUERY_URL,
     RUNNINGHUB_SITE_BASE,
     RUNNINGHUB_UPLOAD_URL,
+    RUNNINGHUB_WEBHOOK_POLL_INTERVAL,
 )
+from app.shared.integrations.http_pool import get_http_session
+from app.shared.integrations.runninghub_keys import get_key_pool
+from app.shared.integrations.runninghub_retry import RETRYABLE_STATUS_CODES, CircuitBreaker, RetryPolicy, parse_retry_after
+from app.shared.integrations.upload_cache import get_upload_cache, hash_bytes, hash_file
 
 
 RUNNINGHUB_MAX_RETRIES = 3
 RUNNINGHUB_POLL_INTERVAL_SECONDS = 5
 RUNNINGHUB_MAX_POLL_ROUNDS = 120
+# 等待轮询结果时在任务超时之外多等的时间：最后一次查询本身可能还要重试、等待响应
+WAIT_RESULT_GRACE_SECONDS = 180
+
+
 class RunningHubError(RuntimeError):
     pass
 
@@ -40,6 +53,37 @@ class TaskTimeoutError(RunningHubError):
     pass
 
 
+class RequestRejectedError(RunningHubError):
+    """接口明确拒绝了请求（4xx，非限流），重试不会有不同结果。"""
+
+
+class TransientError(RunningHubError):
+    """超时、连接失败、限流或 5xx：重试可能成功。retry_after 为服务端建议的等待秒数。"""
+
+    retryable = True
+
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaExceededError(TransientError):
+    """当前 API Key 的队列已满、余额不足或被限流：换一个 Key 或等待一段时间后再提交。"""
+
+
+class SubmissionUnknownError(RunningHubError):
+    """提交请求可能已送达（读超时、连接中断、408/5xx），无法确定任务是否已创建；自动重新提交可能重复扣费。"""
+
+
+# RunningHub 表示账号排队已满、实例数已满、余额不足的错误码与关键字
+QUOTA_ERROR_CODES = frozenset({"415", "416", "421"})
+QUOTA_ERROR_MARKERS = ("QUEUE_MAXED", "INSTANCE_MAXED", "NOT_ENOUGH", "quota", "insufficient", "余额", "队列已满", "排队")
+
+
+# 这些错误重试也不会成功，批量任务中直接判定失败
+PERMANENT_ERRORS = (ValidationError, UploadError, RequestRejectedError)
+
+
 @dataclass(frozen=True)
 class ModelSpec:
     model_name: str
@@ -195,10 +239,16 @@ def resolve_model_name(model_name: str = "", endpoint: str = "") -> str:
 
 
 def get_model_spec(model_name: str, extra_params: dict[str, Any] | None = None) -> ModelSpec:
+    # 只有是否带 python_code 会影响结果，批量任务中每次提交都会调用，按参数缓存
+    return _resolve_model_spec(model_name or "", bool(extra_params and extra_params.get("python_code")))
+
+
+@lru_cache(maxsize=128)
+def _resolve_model_spec(model_name: str, uses_python_code: bool) -> ModelSpec:
     normalized = normalize_model_name(model_name)
     
     # 如果提供了python_code，使用python_code适配器
-    if extra_params and extra_params.get("python_code"):
+    if uses_python_code:
         return ModelSpec(
             model_name=normalized or "custom-python-model",
             label="Custom Python Model",
@@ -259,6 +309,15 @@ def extract_error_message(response: requests.Response, payload: dict[str, Any] |
     return response.text.strip() or f"HTTP {response.status_code}"
 
 
+def is_quota_error(payload: dict[str, Any] | None, message: str = "") -> bool:
+    if isinstance(payload, dict):
+        code = str(payload.get("code") or payload.get("errorCode") or "").strip()
+        if code in QUOTA_ERROR_CODES:
+            return True
+    lowered = message.lower()
+    return any(marker.lower() in lowered for marker in QUOTA_ERROR_MARKERS)
+
+
 def extract_result_urls(result: dict[str, Any]) -> list[str]:
     urls: list[str] = []
     containers = [result]
@@ -476,10 +535,10 @@ class PythonCodeAdapter(BaseAdapter):
 
     def build_payload(self, request: UnifiedImageRequest, spec: ModelSpec) -> dict[str, Any]:
         self.validate(request, spec)
-        from app.shared.integrations.python_parser import parse_python_example, build_payload_from_parsed
-        
-        python_code = request.extra_params.get("python_code", "")
-        parsed_info = parse_python_example(python_code)
+        from app.shared.integrations.python_parser import compile_python_example
+
+        # 同一份示例代码只解析一次，之后每张图片只填入 prompt、图片与参数
+        compiled = compile_python_example(request.extra_params.get("python_code", ""))
         
         user_params = {
             "resolution": request.resolution,
@@ -501,12 +560,7 @@ class PythonCodeAdapter(BaseAdapter):
             if key != "python_code" and value not in (None, ""):
                 user_params[key] = value
         
-        payload = build_payload_from_parsed(
-            parsed_info,
-            request.prompt,
-            request.images,
-            user_params
-        )
+        payload = compiled.build_payload(request.prompt, request.images, user_params)
         
         if request.webhook_url:
             payload["webhookUrl"] = request.webhook_url
@@ -616,13 +670,19 @@ class RunningHubClient:
         upload_url: str = RUNNINGHUB_UPLOAD_URL,
         log: Callable[[str], None] | None = None,
         session: requests.Session | None = None,
+        retry_policy: RetryPolicy | None = None,
+        breaker: CircuitBreaker | None = None,
     ) -> None:
         self.api_key = (api_key or "").strip()
         self.base_url = (base_url or RUNNINGHUB_SITE_BASE).rstrip("/")
         self.query_url = (query_url or f"{self.base_url}/openapi/v2/query").strip()
         self.upload_url = (upload_url or f"{self.base_url}/openapi/v2/media/upload/binary").strip()
         self.log = log
-        self.session = session or requests.Session()
+        # 默认使用进程内共享的连接池，不同任务、不同 Key 之间复用到同一主机的连接
+        self.session = session or get_http_session()
+        self.retry_policy = retry_policy or RetryPolicy()
+        # 同一个客户端（即同一批任务）共享熔断器，接口持续失败时整批一起暂停
+        self.breaker = breaker or CircuitBreaker(log=self._log)
         if not self.api_key:
             raise ValidationError("请填写 RunningHub API Key")
 
@@ -632,11 +692,32 @@ class RunningHubClient:
         wait: bool = True,
         interval: int = RUNNINGHUB_POLL_INTERVAL_SECONDS,
         timeout: int = RUNNINGHUB_POLL_INTERVAL_SECONDS * RUNNINGHUB_MAX_POLL_ROUNDS,
+        *,
+        resume_task_id: str = "",
+        on_submitted: Callable[[dict[str, Any]], None] | None = None,
     ) -> dict[str, Any]:
-        task = self.submit_task(request)
-        if not wait:
-            return task["response"]
-        result = self.wait_for_task(task["taskId"], request.query_url or self.query_url, interval=interval, timeout=timeout)
+        """resume_task_id 非空时不再提交，直接等待这个已提交的任务；on_submitted 在拿到 taskId 后立即回调。"""
+        from app.shared.integrations.runninghub_webhook import is_local_webhook
+
+        if resume_task_id:
+            self._log(f"继续等待已提交的任务，taskId={resume_task_id}")
+            task = {"taskId": resume_task_id, "endpoint": request.endpoint_override or request.model}
+        else:
+            task = self.submit_task(request)
+            if on_submitted:
+                on_submitted(task)
+            if not wait:
+                return task["response"]
+            if is_local_webhook(request.webhook_url):
+                # 完成时会收到回调，轮询只作兜底
+                interval = max(interval, RUNNINGHUB_WEBHOOK_POLL_INTERVAL)
+        result = self.wait_for_task(
+            task["taskId"],
+            request.query_url or self.query_url,
+            interval=interval,
+            timeout=timeout,
+            key=task["endpoint"],
+        )
         urls = extract_result_urls(result)
         if urls:
             self._log(f"成功结果链接：{', '.join(urls)}")
@@ -662,44 +743,53 @@ class RunningHubClient:
         # 如果使用python_code适配器，从解析结果中获取endpoint
         endpoint = prepared_request.endpoint_override or spec.endpoint
         if spec.adapter_type == "python_code" and not endpoint:
-            from app.shared.integrations.python_parser import parse_python_example
-            python_code = prepared_request.extra_params.get("python_code", "")
-            parsed_info = parse_python_example(python_code)
-            endpoint = parsed_info.get("endpoint", "")
+            from app.shared.integrations.python_parser import compile_python_example
+            endpoint = compile_python_example(prepared_request.extra_params.get("python_code", "")).endpoint
             if not endpoint:
                 raise ValidationError("无法从Python代码中提取API endpoint")
         
         self._log(f"提交任务：model={spec.model_name}, endpoint={endpoint}")
-        response = self.session.post(
+        # 提交不是幂等的：请求可能已送达时不在这里重试，避免重复创建任务
+        response = self._post(
             endpoint,
+            action="提交任务",
+            idempotent=False,
             headers=self._json_headers(),
             json=payload,
             timeout=120,
         )
         parsed = parse_json_response(response)
         if response.status_code != 200:
-            raise RunningHubError(f"提交任务失败：HTTP {response.status_code} - {extract_error_message(response, parsed)}")
+            message = extract_error_message(response, parsed)
+            if is_quota_error(parsed, message):
+                raise QuotaExceededError(f"提交任务失败：HTTP {response.status_code} - {message}")
+            raise RequestRejectedError(f"提交任务失败：HTTP {response.status_code} - {message}")
         if not parsed:
             raise RunningHubError("提交任务失败：接口未返回有效 JSON")
         task_id = str(parsed.get("taskId") or parsed.get("data", {}).get("taskId") or "").strip()
         if not task_id:
+            if is_quota_error(parsed, extract_error_message(response, parsed)):
+                raise QuotaExceededError(f"提交任务失败：{extract_error_message(response, parsed)}")
             raise RunningHubError(f"提交任务失败：未返回 taskId，响应内容：{parsed}")
         self._log(f"任务已提交，taskId={task_id}")
         return {"taskId": task_id, "response": parsed, "payload": payload, "endpoint": endpoint}
 
-    def query_task(self, task_id: str, query_url: str = "") -> dict[str, Any]:
+    def query_task(self, task_id: str, query_url: str = "", *, retry: bool = True) -> dict[str, Any]:
+        """retry=False 时只请求一次，由调用方（如共享轮询器）自行安排下一次查询。"""
         if not task_id:
             raise ValidationError("task_id 不能为空")
         endpoint = (query_url or self.query_url or RUNNINGHUB_QUERY_URL).strip()
-        response = self.session.post(
+        response = self._post(
             endpoint,
+            action="查询任务",
+            attempts=None if retry else 1,
             headers=self._json_headers(),
             json={"taskId": task_id},
             timeout=60,
         )
         parsed = parse_json_response(response)
         if response.status_code != 200:
-            raise RunningHubError(f"查询任务失败：HTTP {response.status_code} - {extract_error_message(response, parsed)}")
+            raise RequestRejectedError(f"查询任务失败：HTTP {response.status_code} - {extract_error_message(response, parsed)}")
         if not parsed:
             raise RunningHubError("查询任务失败：接口未返回有效 JSON")
         return parsed
@@ -711,25 +801,42 @@ class RunningHubClient:
         *,
         interval: int = RUNNINGHUB_POLL_INTERVAL_SECONDS,
         timeout: int = RUNNINGHUB_POLL_INTERVAL_SECONDS * RUNNINGHUB_MAX_POLL_ROUNDS,
+        key: str = "",
     ) -> dict[str, Any]:
-        started_at = time.time()
-        last_status = ""
-        while time.time() - started_at <= timeout:
-            result = self.query_task(task_id, query_url=query_url)
-            status = str(result.get("status") or result.get("data", {}).get("status") or "").upper()
-            if status and status != last_status:
-                self._log(f"轮询状态：{status}")
-            last_status = status
-            if status == "SUCCESS":
-                return result
-            if status == "FAILED":
-                raise TaskFailedError(
-                    str(result.get("errorMessage") or result.get("message") or result.get("data", {}).get("message") or "RunningHub 任务失败")
-                )
-            if status not in {"QUEUED", "RUNNING"}:
-                raise RunningHubError(f"未知任务状态：{status or result}")
-            time.sleep(max(1, interval))
-        raise TaskTimeoutError(f"RunningHub 任务轮询超时：taskId={task_id}")
+        future = self.track_task(task_id, query_url, interval=interval, timeout=timeout, key=key)
+        try:
+            # 轮询器会在截止时间后结束任务；这里的超时只是兜底，防止 Future 因意外一直不结束
+            return future.result(timeout=timeout + WAIT_RESULT_GRACE_SECONDS)
+        except FutureTimeoutError as exc:
+            raise TaskTimeoutError(f"RunningHub 任务等待超时：taskId={task_id}") from exc
+
+    def track_task(
+        self,
+        task_id: str,
+        query_url: str = "",
+        *,
+        interval: int = RUNNINGHUB_POLL_INTERVAL_SECONDS,
+        timeout: int = RUNNINGHUB_POLL_INTERVAL_SECONDS * RUNNINGHUB_MAX_POLL_ROUNDS,
+        key: str = "",
+    ) -> Future:
+        """交给进程内共享的轮询器跟踪，key 相同的任务共享耗时统计以调整轮询间隔。"""
+        from app.shared.integrations.runninghub_poller import get_runninghub_poller
+
+        if not task_id:
+            raise ValidationError("task_id 不能为空")
+        return get_runninghub_poller().track(
+            task_id,
+            lambda: self.query_task(task_id, query_url=query_url, retry=False),
+            interval=max(1, interval),
+            timeout=timeout,
+            key=key,
+            log=self._log,
+            ready=self.ready_in,
+        )
+
+    def ready_in(self) -> float:
+        """熔断冷却或当前 Key 令牌不足时返回需要等待的秒数，供轮询器推迟查询而不是阻塞等待。"""
+        return max(self.breaker.remaining(), get_key_pool().throttle_delay(self.api_key))
 
     def prepare_image_urls(self, images: list[str], spec: ModelSpec | None = None) -> list[str]:
         prepared: list[str] = []
@@ -737,9 +844,12 @@ class RunningHubClient:
             value = str(item or "").strip()
             if not value:
                 continue
-            if value.startswith(("http://", "https://", "data:image/")):
+            if value.startswith(("http://", "https://")):
                 prepared.append(value)
                 continue
+            if value.startswith("data:image/"):
+                prepared.append(self.upload_data_uri(value))
+                continue
             path = Path(value)
             if not path.exists():
                 raise UploadError(f"找不到本地图片：{value}")
@@ -751,18 +861,41 @@ class RunningHubClient:
         return prepared
 
     def upload_file(self, file_path: str | Path) -> str:
+        """同一内容在同一 API Key 下只上传一次，重试与后续任务直接复用缓存的 download_url。"""
         path = Path(file_path)
         if not path.exists():
             raise UploadError(f"找不到本地图片：{path}")
+        url, cached = get_upload_cache().get_or_upload(hash_file(path), self.api_key, lambda: self._upload_path(path))
+        if cached:
+            self._log(f"复用已上传图片：{path.name}")
+        return url
+
+    def upload_data_uri(self, data_uri: str) -> str:
+        """Data URI 参考图上传一次换成链接，批次内的每个任务不再重复内联发送整张图；上传失败时仍内联。"""
+        try:
+            mime_type, payload = decode_data_uri(data_uri)
+            filename = f"reference{mimetypes.guess_extension(mime_type) or '.png'}"
+            url, _ = get_upload_cache().get_or_upload(
+                hash_bytes(payload),
+                self.api_key,
+                lambda: _upload_binary(self, payload, filename, mime_type),
+            )
+            return url
+        except RunningHubError as exc:
+            self._log(f"参考图上传失败，改为内联发送：{exc}")
+            return data_uri
+
+    def _upload_path(self, path: Path) -> str:
         self._log(f"上传图片：{path.name}")
         mime_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
-        with path.open("rb") as file_handle:
-            response = self.session.post(
-                self.upload_url,
-                headers={"Authorization": f"Bearer {self.api_key}"},
-                files={"file": (path.name, file_handle, mime_type)},
-                timeout=120,
-            )
+        # 读成字节再发送，重试时可以直接重放请求体
+        response = self._post(
+            self.upload_url,
+            action="上传图片",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            files={"file": (path.name, path.read_bytes(), mime_type)},
+            timeout=120,
+        )
         parsed = parse_json_response(response)
         if response.status_code != 200:
             raise UploadError(f"上传图片失败：HTTP {response.status_code} - {extract_error_message(response, parsed)}")
@@ -774,6 +907,54 @@ class RunningHubClient:
             raise UploadError(f"上传图片成功但未返回 download_url：{parsed}")
         return download_url
 
+    def _post(
+        self,
+        url: str,
+        *,
+        action: str,
+        idempotent: bool = True,
+        attempts: int | None = None,
+        **kwargs,
+    ) -> requests.Response:
+        """发送 POST：超时、连接失败、408/429/5xx 按退避策略重试，重试耗尽抛出 TransientError；
+        其余响应原样返回，由调用方判断。
+
+        非幂等请求（提交任务）只在连接未建立（连接超时、连接被拒绝）时重发：网关返回 502/504 时
+        任务可能已经创建，直接抛出 SubmissionUnknownError；被限流（429）时抛出 QuotaExceededError，交给调度方换 Key 或退避。"""
+        max_attempts = attempts or self.retry_policy.max_attempts
+        attempt = 0
+        while True:
+            self.breaker.wait_until_closed()
+            get_key_pool().throttle(self.api_key)
+            retry_after = None
+            try:
+                response = self.session.post(url, **kwargs)
+            except requests.RequestException as exc:
+                error = f"{action}失败：{exc}"
+                if not idempotent and not _connection_not_opened(exc):
+                    self.breaker.record_failure()
+                    raise SubmissionUnknownError(error) from exc
+            else:
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    self.breaker.record_success()
+                    return response
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                error = f"{action}失败：HTTP {response.status_code} - {extract_error_message(response, parse_json_response(response))}"
+                if response.status_code == 429 and not idempotent:
+                    # 限流只针对当前 Key，不计入整体熔断
+                    raise QuotaExceededError(error, retry_after=retry_after)
+                if not idempotent:
+                    self.breaker.record_failure()
+                    raise SubmissionUnknownError(error)
+
+            self.breaker.record_failure()
+            attempt += 1
+            if attempt >= max_attempts:
+                raise TransientError(error, retry_after=retry_after)
+            delay = self.retry_policy.delay(attempt - 1, retry_after)
+            self._log(f"{error}，{delay:.1f} 秒后重试（第 {attempt} 次）")
+            time.sleep(delay)
+
     def validate_request(self, request: UnifiedImageRequest) -> None:
         spec = get_model_spec(resolve_model_name(request.model, request.endpoint_override), request.extra_params)
         ADAPTERS[spec.adapter_type].validate(request, spec)
@@ -791,6 +972,15 @@ class RunningHubClient:
             print(message)
 
 
+def _connection_not_opened(exc: requests.RequestException) -> bool:
+    """请求是否确定没有发出：连接超时或连接被拒绝。读超时、连接中断等情况下服务端可能已经收到请求。"""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    if isinstance(exc, requests.ConnectionError) and exc.args:
+        return isinstance(getattr(exc.args[0], "reason", None), NewConnectionError)
+    return False
+
+
 def build_unified_request_payload(request: UnifiedImageRequest) -> dict[str, Any]:
     return asdict(request)
 
@@ -844,13 +1034,13 @@ def upload_image_candidates(path: Path, api_key: str) -> list[tuple[str, str]]:
 
 
 def _upload_binary(client: RunningHubClient, payload: bytes, filename: str, mime_type: str) -> str:
-    with requests.Session() as session:
-        response = session.post(
-            client.upload_url,
-            headers={"Authorization": f"Bearer {client.api_key}"},
-            files={"file": (filename, payload, mime_type)},
-            timeout=120,
-        )
+    response = client._post(
+        client.upload_url,
+        action="上传图片",
+        headers={"Authorization": f"Bearer {client.api_key}"},
+        files={"file": (filename, payload, mime_type)},
+        timeout=120,
+    )
     parsed = parse_json_response(response)
     if response.status_code != 200:
         raise UploadError(f"上传图片失败：HTTP {response.status_code} - {extract_error_message(response, parsed)}")
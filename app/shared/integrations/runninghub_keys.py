@@ -0,0 +1,206 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Sequence
+
+from app.core.config import (
+    RUNNINGHUB_KEY_BURST,
+    RUNNINGHUB_KEY_CONCURRENCY,
+    RUNNINGHUB_KEY_QUOTA_BACKOFF,
+    RUNNINGHUB_KEY_RATE,
+)
+
+
+# 配额类错误连续出现时退避时间翻倍的上限（秒）
+KEY_MAX_BACKOFF_SECONDS = 15 * 60
+
+
+def api_key_fingerprint(api_key: str) -> str:
+    """API Key 的短哈希，用于在落盘数据中标识 Key 而不保存明文。"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def mask_api_key(api_key: str) -> str:
+    return f"{api_key[:4]}…{api_key[-4:]}" if len(api_key) > 10 else "****"
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个；取不到令牌时阻塞等待。"""
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """取一个令牌，返回等待的秒数。"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def wait_time(self) -> float:
+        """不取令牌，只返回现在取一个令牌需要等待的秒数。"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+@dataclass
+class _KeyState:
+    api_key: str
+    bucket: TokenBucket
+    limit: int
+    active: int = 0
+    submitted: int = 0
+    quota_errors: int = 0
+    consecutive_quota_errors: int = 0
+    cooldown_until: float = 0.0
+    last_acquired: float = 0.0
+    throttled_seconds: float = 0.0
+
+
+class ApiKeyPool:
+    """进程内所有 RunningHub API Key 的限流与调度状态。
+
+    每个 Key 有独立的令牌桶（限制请求速率）和在途任务上限；批量任务在若干 Key 中选择
+    负载最低、未处于退避期的那个提交。同一个 Key 被多个批量任务同时使用时共享这些限制。
+    """
+
+    def __init__(
+        self,
+        rate: float = RUNNINGHUB_KEY_RATE,
+        burst: int = RUNNINGHUB_KEY_BURST,
+        concurrency: int = RUNNINGHUB_KEY_CONCURRENCY,
+        quota_backoff: float = RUNNINGHUB_KEY_QUOTA_BACKOFF,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.quota_backoff = quota_backoff
+        self._lock = threading.Condition()
+        self._keys: Dict[str, _KeyState] = {}
+
+    def _state(self, api_key: str) -> _KeyState:
+        state = self._keys.get(api_key)
+        if state is None:
+            state = _KeyState(api_key=api_key, bucket=TokenBucket(self.rate, self.burst), limit=self.concurrency)
+            self._keys[api_key] = state
+        return state
+
+    def throttle(self, api_key: str) -> None:
+        """发送每个请求前调用，按该 Key 的令牌桶限速。"""
+        with self._lock:
+            state = self._state(api_key)
+        waited = state.bucket.acquire()
+        if waited:
+            with self._lock:
+                state.throttled_seconds += waited
+
+    def throttle_delay(self, api_key: str) -> float:
+        with self._lock:
+            state = self._state(api_key)
+        return state.bucket.wait_time()
+
+    def capacity(self, api_keys: Sequence[str]) -> int:
+        with self._lock:
+            return sum(self._state(api_key).limit for api_key in dict.fromkeys(api_keys))
+
+    def acquire(self, api_keys: Sequence[str]) -> str:
+        """在 api_keys 中挑一个可用的 Key 占用一个在途名额，全部满载或退避中时阻塞等待。"""
+        if not api_keys:
+            raise ValueError("api_keys 不能为空")
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                states = [self._state(api_key) for api_key in dict.fromkeys(api_keys)]
+                available = [state for state in states if state.active < state.limit and state.cooldown_until <= now]
+                if available:
+                    state = min(available, key=lambda item: (item.active / item.limit, item.last_acquired))
+                    state.active += 1
+                    state.submitted += 1
+                    state.last_acquired = now
+                    return state.api_key
+                # 等到有名额释放，或最早的退避结束
+                cooldowns = [state.cooldown_until - now for state in states if state.cooldown_until > now]
+                self._lock.wait(min(cooldowns) if cooldowns else None)
+
+    def occupy(self, api_key: str) -> None:
+        """恢复已提交的任务时直接计入该 Key 的在途数，不等待名额或退避。"""
+        with self._lock:
+            state = self._state(api_key)
+            state.active += 1
+            state.last_acquired = time.monotonic()
+
+    def release(self, api_key: str) -> None:
+        with self._lock:
+            state = self._state(api_key)
+            state.active = max(0, state.active - 1)
+            self._lock.notify_all()
+
+    def record_success(self, api_key: str) -> None:
+        with self._lock:
+            self._state(api_key).consecutive_quota_errors = 0
+
+    def record_quota_error(self, api_key: str, retry_after: float | None = None) -> float:
+        """Key 触发配额限制后暂停使用一段时间，返回暂停的秒数。"""
+        with self._lock:
+            state = self._state(api_key)
+            state.quota_errors += 1
+            state.consecutive_quota_errors += 1
+            # 服务端给出 Retry-After 时以它为准，否则按连续次数指数退避
+            if retry_after is None:
+                retry_after = self.quota_backoff * 2 ** (state.consecutive_quota_errors - 1)
+            cooldown = min(KEY_MAX_BACKOFF_SECONDS, retry_after)
+            state.cooldown_until = max(state.cooldown_until, time.monotonic() + cooldown)
+            self._lock.notify_all()
+            return cooldown
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": mask_api_key(state.api_key),
+                    "active": state.active,
+                    "limit": state.limit,
+                    "submitted": state.submitted,
+                    "quota_errors": state.quota_errors,
+                    "cooldown_seconds": round(max(0.0, state.cooldown_until - now), 1),
+                    "tokens": round(state.bucket.tokens, 1),
+                    "throttled_seconds": round(state.throttled_seconds, 1),
+                }
+                for state in self._keys.values()
+            ]
+
+
+_key_pool_lock = threading.Lock()
+_key_pool: ApiKeyPool | None = None
+
+
+def get_key_pool() -> ApiKeyPool:
+    global _key_pool
+    with _key_pool_lock:
+        if _key_pool is None:
+            _key_pool = ApiKeyPool()
+        return _key_pool
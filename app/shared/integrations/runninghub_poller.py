@@ -0,0 +1,332 @@
+import heapq
+import itertools
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List
+
+from app.core.config import RUNNINGHUB_POLL_MAX_QPS
+
+
+POLL_MIN_INTERVAL_SECONDS = 2.0
+POLL_MAX_INTERVAL_SECONDS = 60.0
+# 每类任务只保留最近若干次耗时，用于估计预期完成时间
+DURATION_HISTORY = 50
+DURATION_MIN_SAMPLES = 3
+# 查询连续出现可重试错误（超时、限流、5xx）的容忍次数，期间按退避重新排期
+POLL_MAX_FAILURES = 5
+# 查询在少量工作线程中执行，单个慢请求不会拖住其他任务的轮询
+POLL_QUERY_WORKERS = 4
+
+
+@dataclass
+class _TrackedTask:
+    task_id: str
+    query: Callable[[], Dict[str, Any]]
+    future: Future
+    key: str
+    interval: float
+    started_at: float
+    deadline: float
+    log: Callable[[str], None] | None = None
+    ready: Callable[[], float] | None = None
+    last_status: str = ""
+    querying: bool = False
+    polls: int = 0
+    failures: int = 0
+
+
+@dataclass
+class PollerStats:
+    queries: int = 0
+    completed: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    external: int = 0
+    expected_seconds: Dict[str, float] = field(default_factory=dict)
+
+
+def _result_data(result: Any) -> Dict[str, Any]:
+    data = result.get("data") if isinstance(result, dict) else None
+    return data if isinstance(data, dict) else {}
+
+
+def task_status(result: Dict[str, Any]) -> str:
+    if not isinstance(result, dict):
+        return ""
+    return str(result.get("status") or _result_data(result).get("status") or "").upper()
+
+
+def task_error_message(result: Dict[str, Any]) -> str:
+    if not isinstance(result, dict):
+        return "RunningHub 任务失败"
+    return str(
+        result.get("errorMessage")
+        or result.get("message")
+        or _result_data(result).get("message")
+        or "RunningHub 任务失败"
+    )
+
+
+class RunningHubPoller:
+    """所有在途任务共用一个轮询线程：按到期时间排队，查询之间保持最小间隔，完成结果通过 Future 交付。
+
+    轮询间隔按同类任务的历史耗时自适应：离预期完成还远时少查，接近或超过预期时回到基础间隔。
+    """
+
+    def __init__(self, max_qps: float = RUNNINGHUB_POLL_MAX_QPS) -> None:
+        self.spacing = 1.0 / max(0.1, float(max_qps))
+        self._lock = threading.Condition()
+        self._tasks: Dict[str, _TrackedTask] = {}
+        self._schedule: List[tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._durations: Dict[str, Deque[float]] = {}
+        self._stats = PollerStats()
+        self._thread: threading.Thread | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._querying = 0
+
+    def track(
+        self,
+        task_id: str,
+        query: Callable[[], Dict[str, Any]],
+        *,
+        interval: float,
+        timeout: float,
+        key: str = "",
+        log: Callable[[str], None] | None = None,
+        ready: Callable[[], float] | None = None,
+    ) -> Future:
+        """登记一个已提交的任务，返回在任务成功时得到查询结果、失败或超时时抛出异常的 Future。
+
+        ready 返回距离可以查询还需等待的秒数（如熔断冷却、Key 令牌不足），大于 0 时推迟而不是阻塞查询。
+        """
+        now = time.monotonic()
+        with self._lock:
+            existing = self._tasks.get(task_id)
+            if existing is not None:
+                return existing.future
+            future: Future = Future()
+            tracked = _TrackedTask(
+                task_id=task_id,
+                query=query,
+                future=future,
+                key=key,
+                interval=max(POLL_MIN_INTERVAL_SECONDS, float(interval)),
+                started_at=now,
+                deadline=now + timeout,
+                log=log,
+                ready=ready,
+            )
+            self._tasks[task_id] = tracked
+            # 同时提交的一批任务首轮查询随机错开，避免扎堆
+            self._push(tracked, now + self._next_interval(tracked, now) * random.uniform(0.5, 1.0))
+            self._ensure_thread()
+            self._lock.notify()
+        return future
+
+    def resolve(self, task_id: str, result: Dict[str, Any]) -> bool:
+        """由外部来源（如回调）直接交付任务结果；任务不在途时返回 False。"""
+        with self._lock:
+            tracked = self._tasks.get(task_id)
+            if tracked is None:
+                return False
+            self._stats.external += 1
+        try:
+            self._handle_result(tracked, result)
+        except Exception as exc:
+            self._finish(tracked, error=exc)
+        return True
+
+    def poll_now(self, task_id: str) -> bool:
+        """把任务的下一次查询提前到现在（仍受查询间隔限制）；任务不在途时返回 False。"""
+        with self._lock:
+            tracked = self._tasks.get(task_id)
+            if tracked is None:
+                return False
+            self._push(tracked, time.monotonic())
+            self._lock.notify()
+        return True
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._tasks)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._tasks),
+                "queries": self._stats.queries,
+                "completed": self._stats.completed,
+                "failed": self._stats.failed,
+                "timed_out": self._stats.timed_out,
+                "external": self._stats.external,
+                "expected_seconds": {key: round(value, 1) for key, value in self._stats.expected_seconds.items()},
+            }
+
+    def _push(self, tracked: _TrackedTask, due: float) -> None:
+        heapq.heappush(self._schedule, (due, next(self._sequence), tracked.task_id))
+
+    def _expected_duration(self, key: str) -> float | None:
+        history = self._durations.get(key)
+        if not history or len(history) < DURATION_MIN_SAMPLES:
+            return None
+        return statistics.median(history)
+
+    def _next_interval(self, tracked: _TrackedTask, now: float) -> float:
+        expected = self._expected_duration(tracked.key)
+        if expected is None:
+            return tracked.interval
+        remaining = expected - (now - tracked.started_at)
+        if remaining <= tracked.interval:
+            return tracked.interval
+        # 离预期完成越远查得越少，每次最多跳过剩余时间的一半
+        return max(tracked.interval, min(POLL_MAX_INTERVAL_SECONDS, remaining / 2))
+
+    def _ensure_thread(self) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=POLL_QUERY_WORKERS, thread_name_prefix="runninghub-poll-query")
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="runninghub-poller", daemon=True)
+            self._thread.start()
+
+    def _loop(self) -> None:
+        """调度线程只负责按到期时间和查询间隔分派，查询本身在工作线程中执行。"""
+        last_query = 0.0
+        while True:
+            with self._lock:
+                tracked = None
+                while tracked is None:
+                    while self._schedule and self._schedule[0][2] not in self._tasks:
+                        heapq.heappop(self._schedule)
+                    if not self._schedule:
+                        self._lock.wait()
+                        continue
+                    now = time.monotonic()
+                    due = max(self._schedule[0][0], last_query + self.spacing)
+                    if due > now:
+                        self._lock.wait(due - now)
+                        continue
+                    if self._querying >= POLL_QUERY_WORKERS:
+                        self._lock.wait()
+                        continue
+                    candidate = self._tasks[heapq.heappop(self._schedule)[2]]
+                    # 同一任务正在查询时丢弃重复的排期，查询结束后会重新排期
+                    if not candidate.querying:
+                        tracked = candidate
+                tracked.querying = True
+                self._querying += 1
+            last_query = time.monotonic()
+            self._executor.submit(self._poll_once, tracked)
+
+    def _poll_once(self, tracked: _TrackedTask) -> None:
+        try:
+            self._poll(tracked)
+        except Exception as exc:
+            # 任何意外（如响应结构异常）只结束这个任务，不影响其他任务的轮询
+            self._finish(tracked, error=exc)
+        finally:
+            with self._lock:
+                tracked.querying = False
+                self._querying -= 1
+                self._lock.notify()
+
+    def _poll(self, tracked: _TrackedTask) -> None:
+        now = time.monotonic()
+        if now > tracked.deadline:
+            self._finish(tracked, error=self._timeout_error(tracked), timed_out=True)
+            return
+        wait_seconds = tracked.ready() if tracked.ready else 0.0
+        if wait_seconds > 0:
+            self._reschedule(tracked, now + min(wait_seconds, POLL_MAX_INTERVAL_SECONDS))
+            return
+
+        with self._lock:
+            self._stats.queries += 1
+            tracked.polls += 1
+        try:
+            result = tracked.query()
+        except Exception as exc:
+            if getattr(exc, "retryable", False) and tracked.failures < POLL_MAX_FAILURES:
+                tracked.failures += 1
+                backoff = tracked.interval * 2 ** (tracked.failures - 1)
+                delay = min(POLL_MAX_INTERVAL_SECONDS, max(backoff, getattr(exc, "retry_after", None) or 0))
+                self._reschedule(tracked, time.monotonic() + delay)
+                return
+            raise
+        tracked.failures = 0
+        if self._handle_result(tracked, result):
+            now = time.monotonic()
+            self._reschedule(tracked, now + self._next_interval(tracked, now))
+
+    def _reschedule(self, tracked: _TrackedTask, due: float) -> None:
+        with self._lock:
+            if tracked.task_id in self._tasks and not tracked.future.done():
+                self._push(tracked, min(tracked.deadline, due))
+                self._lock.notify()
+
+    def _handle_result(self, tracked: _TrackedTask, result: Dict[str, Any]) -> bool:
+        """处理一次状态结果；任务仍在排队/运行时返回 True。"""
+        from app.shared.integrations.runninghub import RunningHubError, TaskFailedError
+
+        status = task_status(result)
+        if status and status != tracked.last_status and tracked.log:
+            tracked.log(f"轮询状态：{status}（taskId={tracked.task_id}）")
+        tracked.last_status = status or tracked.last_status
+        if status == "SUCCESS":
+            self._finish(tracked, result=result)
+        elif status == "FAILED":
+            self._finish(tracked, error=TaskFailedError(task_error_message(result)))
+        elif status in {"QUEUED", "RUNNING"}:
+            return True
+        else:
+            self._finish(tracked, error=RunningHubError(f"未知任务状态：{status or result}"))
+        return False
+
+    @staticmethod
+    def _timeout_error(tracked: _TrackedTask) -> Exception:
+        from app.shared.integrations.runninghub import TaskTimeoutError
+
+        return TaskTimeoutError(f"RunningHub 任务轮询超时：taskId={tracked.task_id}")
+
+    def _finish(
+        self,
+        tracked: _TrackedTask,
+        *,
+        result: Dict[str, Any] | None = None,
+        error: Exception | None = None,
+        timed_out: bool = False,
+    ) -> None:
+        with self._lock:
+            if self._tasks.get(tracked.task_id) is not tracked:
+                return
+            del self._tasks[tracked.task_id]
+            if error is None:
+                history = self._durations.setdefault(tracked.key, deque(maxlen=DURATION_HISTORY))
+                history.append(time.monotonic() - tracked.started_at)
+                self._stats.expected_seconds[tracked.key or "default"] = statistics.median(history)
+                self._stats.completed += 1
+            elif timed_out:
+                self._stats.timed_out += 1
+            else:
+                self._stats.failed += 1
+        if error is None:
+            tracked.future.set_result(result)
+        else:
+            tracked.future.set_exception(error)
+
+
+_poller_lock = threading.Lock()
+_poller: RunningHubPoller | None = None
+
+
+def get_runninghub_poller() -> RunningHubPoller:
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = RunningHubPoller()
+        return _poller
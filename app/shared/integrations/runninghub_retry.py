@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable
+
+
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Retry-After 可以是秒数，也可以是 HTTP 日期。"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """指数退避 + 全抖动；服务端给出 Retry-After 时以它为准。"""
+
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """attempt 从 0 开始计，返回第 attempt 次失败后应等待的秒数。"""
+        if retry_after is not None:
+            return min(self.max_delay, retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2**attempt)))
+
+
+class CircuitBreaker:
+    """连续出现 threshold 次可重试错误后熔断 cooldown 秒，期间所有调用方一起等待；
+    冷却后放行试探，再失败则冷却时间翻倍（不超过 max_cooldown），成功即恢复。"""
+
+    def __init__(
+        self,
+        threshold: int = 5,
+        cooldown: float = 30.0,
+        max_cooldown: float = 300.0,
+        log: Callable[[str], None] | None = None,
+    ) -> None:
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.log = log
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._cooldown = cooldown
+        self._open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return time.monotonic() < self._open_until
+
+    def remaining(self) -> float:
+        """距离熔断结束还需等待的秒数，未熔断时为 0。"""
+        with self._lock:
+            return max(0.0, self._open_until - time.monotonic())
+
+    def wait_until_closed(self) -> float:
+        """熔断期间阻塞到冷却结束，返回实际等待的秒数。"""
+        with self._lock:
+            remaining = self._open_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+            return remaining
+        return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._cooldown = self.base_cooldown
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.threshold or time.monotonic() < self._open_until:
+                return
+            self._open_until = time.monotonic() + self._cooldown
+            cooldown = self._cooldown
+            self._cooldown = min(self.max_cooldown, self._cooldown * 2)
+            # 冷却后的第一次失败立即再次熔断
+            self._failures = self.threshold - 1
+        if self.log:
+            self.log(f"RunningHub 接口连续失败，暂停 {cooldown:.0f} 秒后再试")
@@ -0,0 +1,88 @@
+import hmac
+import json
+import os
+import secrets
+import threading
+from typing import Any, Dict
+
+from app.core.config import RUNNINGHUB_WEBHOOK_BASE_URL, RUNNINGHUB_WEBHOOK_TOKEN, WORKSPACE_ROOT
+from app.shared.integrations.runninghub import extract_result_urls
+from app.shared.integrations.runninghub_poller import get_runninghub_poller, task_status
+
+
+WEBHOOK_PATH = "/api/runninghub/webhook"
+WEBHOOK_TOKEN_FILE = WORKSPACE_ROOT / "runninghub_webhook_token"
+
+_webhook_token_lock = threading.Lock()
+_webhook_token: str | None = None
+
+
+def _load_or_create_token() -> str:
+    # 未配置令牌时随机生成一次并保存在工作区：重启后恢复的任务仍用原来的回调地址，令牌必须保持不变
+    try:
+        token = WEBHOOK_TOKEN_FILE.read_text(encoding="utf-8").strip()
+    except OSError:
+        token = ""
+    if token:
+        return token
+    token = secrets.token_urlsafe(24)
+    try:
+        WEBHOOK_TOKEN_FILE.parent.mkdir(parents=True, exist_ok=True)
+        descriptor = os.open(WEBHOOK_TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w", encoding="utf-8") as handle:
+            handle.write(token)
+    except OSError:
+        pass
+    return token
+
+
+def webhook_token() -> str:
+    global _webhook_token
+    with _webhook_token_lock:
+        if _webhook_token is None:
+            _webhook_token = RUNNINGHUB_WEBHOOK_TOKEN or _load_or_create_token()
+        return _webhook_token
+
+
+def local_webhook_url() -> str:
+    """未配置 RUNNINGHUB_WEBHOOK_BASE_URL 时返回空串，任务完全依赖轮询。"""
+    if not RUNNINGHUB_WEBHOOK_BASE_URL:
+        return ""
+    return f"{RUNNINGHUB_WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}?token={webhook_token()}"
+
+
+def is_local_webhook(url: str) -> bool:
+    return bool(url) and url == local_webhook_url()
+
+
+def verify_webhook_token(token: str) -> bool:
+    return hmac.compare_digest(str(token or ""), webhook_token())
+
+
+def parse_webhook_payload(body: Dict[str, Any]) -> tuple[str, Dict[str, Any]]:
+    """兼容两种回调格式：结果直接在顶层，或以 JSON 字符串放在 eventData 中。"""
+    result = dict(body)
+    event_data = body.get("eventData")
+    if isinstance(event_data, str):
+        try:
+            event_data = json.loads(event_data)
+        except ValueError:
+            event_data = None
+    if isinstance(event_data, dict):
+        result.update(event_data)
+    data = result.get("data")
+    task_id = str(result.get("taskId") or (data.get("taskId") if isinstance(data, dict) else "") or "").strip()
+    return task_id, result
+
+
+def handle_webhook(body: Dict[str, Any]) -> str:
+    """返回 resolved（直接交付结果）、polled（内容不完整，立即补查一次）或 unknown（没有对应的在途任务）。"""
+    task_id, result = parse_webhook_payload(body)
+    if not task_id:
+        return "unknown"
+    poller = get_runninghub_poller()
+    status = task_status(result)
+    complete = status == "FAILED" or (status == "SUCCESS" and extract_result_urls(result))
+    if complete and poller.resolve(task_id, result):
+        return "resolved"
+    return "polled" if poller.poll_now(task_id) else "unknown"
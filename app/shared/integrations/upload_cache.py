@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict
+
+from app.core.config import CACHE_DIR, RUNNINGHUB_UPLOAD_CACHE_TTL
+from app.shared.integrations.runninghub_keys import api_key_fingerprint
+
+
+UPLOAD_CACHE_FILE = CACHE_DIR / "runninghub_uploads.json"
+HASH_CHUNK_SIZE = 1024 * 1024
+# 与姿态缓存一样攒够一定数量或隔一段时间才整体写盘，避免每次上传都重写整个文件
+FLUSH_EVERY = 64
+FLUSH_INTERVAL_SECONDS = 30.0
+
+
+def hash_bytes(payload: bytes) -> str:
+    return hashlib.sha256(payload).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with Path(path).open("rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadCache:
+    """按 内容哈希 + API Key 哈希 记录已上传图片的 download_url，带过期时间并持久化为 JSON。
+
+    同一个键的并发上传会串行化，后到的线程直接复用先完成的结果。新条目先记在内存里，
+    按 FLUSH_EVERY / FLUSH_INTERVAL_SECONDS 批量写盘，批量任务结束时调用 flush 写入剩余部分。
+    """
+
+    def __init__(self, file_path: Path = UPLOAD_CACHE_FILE, ttl: int = RUNNINGHUB_UPLOAD_CACHE_TTL) -> None:
+        self.file_path = Path(file_path)
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        # 键 -> [锁, 正在使用该锁的线程数]，没有线程使用时移除
+        self._key_locks: Dict[str, list] = {}
+        self._entries: Dict[str, Dict] = {}
+        self._loaded = False
+        self._dirty = 0
+        self._last_flush = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(content_hash: str, api_key: str) -> str:
+        # 只保存 API Key 的哈希，缓存文件里不出现明文
+        return f"{content_hash}:{api_key_fingerprint(api_key)}"
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with self.file_path.open("r", encoding="utf-8") as handle:
+                data = json.load(handle)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        if isinstance(data, dict):
+            self._entries = {
+                key: entry
+                for key, entry in data.items()
+                if isinstance(entry, dict) and entry.get("url") and float(entry.get("expires_at") or 0) > now
+            }
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if float(entry.get("expires_at") or 0) <= time.time():
+                self._entries.pop(key, None)
+                return None
+            return str(entry["url"])
+
+    def put(self, key: str, url: str) -> None:
+        with self._lock:
+            self._ensure_loaded()
+            self._entries[key] = {"url": url, "expires_at": time.time() + self.ttl}
+            self._dirty += 1
+            due = self._dirty >= FLUSH_EVERY or time.monotonic() - self._last_flush >= FLUSH_INTERVAL_SECONDS
+        if due:
+            self.flush()
+
+    def get_or_upload(self, content_hash: str, api_key: str, upload: Callable[[], str]) -> tuple[str, bool]:
+        """返回 (download_url, 是否命中缓存)；未命中时调用 upload 并写入缓存。"""
+        if self.ttl <= 0:
+            return upload(), False
+        key = self.make_key(content_hash, api_key)
+        with self._lock:
+            slot = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            slot[1] += 1
+        try:
+            with slot[0]:
+                cached = self.get(key)
+                if cached:
+                    with self._lock:
+                        self.hits += 1
+                    return cached, True
+                url = upload()
+                self.put(key, url)
+                with self._lock:
+                    self.misses += 1
+                return url, False
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if not slot[1]:
+                    self._key_locks.pop(key, None)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            self._entries = {
+                key: entry for key, entry in self._entries.items() if float(entry.get("expires_at") or 0) > now
+            }
+            self._dirty = 0
+            self._last_flush = time.monotonic()
+            temp_path = self.file_path.with_name(f"{self.file_path.name}.tmp")
+            try:
+                self.file_path.parent.mkdir(parents=True, exist_ok=True)
+                with temp_path.open("w", encoding="utf-8") as handle:
+                    json.dump(self._entries, handle, ensure_ascii=False)
+                os.replace(temp_path, self.file_path)
+            except OSError:
+                temp_path.unlink(missing_ok=True)
+
+
+_upload_cache_lock = threading.Lock()
+_upload_cache: UploadCache | None = None
+
+
+def get_upload_cache() -> UploadCache:
+    global _upload_cache
+    with _upload_cache_lock:
+        if _upload_cache is None:
+            _upload_cache = UploadCache()
+        return _upload_cache
@@ -2,6 +2,7 @@ import io
 import os
 import re
 import shutil
+import uuid
 import zipfile
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -89,17 +90,11 @@ def extract_zip_file(zip_path: Path) -> Tuple[int, List[str]]:
     return len(saved), saved
 
 
-def save_generation_outputs(
-    payloads: List[bytes],
-    relative_path: str,
-    source_bucket: str,
-    overwrite: bool,
-) -> List[str]:
-    original_path = safe_bucket_path(source_bucket, relative_path)
+def generation_output_paths(relative_path: str, source_bucket: str, overwrite: bool, count: int) -> List[Path]:
+    """按生成结果序号给出目标路径：覆盖模式下第 1 张写回原图，其余写入 generated 桶。"""
     relative_parent = Path(relative_path).parent
-    saved_files: List[str] = []
-
-    for index, payload in enumerate(payloads, start=1):
+    destinations: List[Path] = []
+    for index in range(1, count + 1):
         if overwrite and index == 1:
             target_bucket = source_bucket
             file_name = Path(relative_path).name
@@ -112,7 +107,28 @@ def save_generation_outputs(
         destination_root = safe_bucket_path(target_bucket)
         destination = (destination_root / relative_parent / file_name).resolve()
         destination.parent.mkdir(parents=True, exist_ok=True)
-        destination.write_bytes(payload)
+        destinations.append(destination)
+    return destinations
+
+
+def generation_part_path(destination: Path) -> Path:
+    """与目标文件同目录的隐藏临时文件，保证最终 os.replace 是同一文件系统内的原子替换。"""
+    return destination.with_name(f".{destination.name}.{uuid.uuid4().hex[:8]}.part")
+
+
+def commit_generation_outputs(
+    part_files: List[Path],
+    relative_path: str,
+    source_bucket: str,
+    overwrite: bool,
+) -> List[str]:
+    """把已下载完成的临时文件原子地移动到各自的目标路径。"""
+    original_path = safe_bucket_path(source_bucket, relative_path)
+    destinations = generation_output_paths(relative_path, source_bucket, overwrite, len(part_files))
+    saved_files: List[str] = []
+
+    for index, (part_file, destination) in enumerate(zip(part_files, destinations), start=1):
+        os.replace(part_file, destination)
         saved_files.append(str(destination))
 
         if overwrite and index == 1 and destination != original_path:
@@ -56,6 +56,7 @@ export const dom = {
     aspectRatioBackBtn: document.getElementById("aspectRatioBackBtn"),
     runninghubImageUrlInput: document.getElementById("runninghubImageUrlInput"),
     runninghubQueryUrlInput: document.getElementById("runninghubQueryUrlInput"),
+    runninghubConcurrencyInput: document.getElementById("runninghubConcurrencyInput"),
     runninghubExtraParamsInput: document.getElementById("runninghubExtraParamsInput"),
     extraReferenceInput: document.getElementById("extraReferenceInput"),
     extraReferenceList: document.getElementById("extraReferenceList"),
@@ -64,6 +65,7 @@ export const dom = {
     runninghubExampleTextInput: document.getElementById("runninghubExampleTextInput"),
     runninghubParseBtn: document.getElementById("runninghubParseBtn"),
     generateBtn: document.getElementById("generateBtn"),
+    resumeGenerationBtn: document.getElementById("resumeGenerationBtn"),
     clearSelectionBtn: document.getElementById("clearSelectionBtn"),
     clearAiSelectionBtn: document.getElementById("clearAiSelectionBtn"),
     selectionHint: document.getElementById("selectionHint"),
@@ -124,6 +126,7 @@ export const dom = {
     aiCleanPoseOverlayRow: document.getElementById("aiCleanPoseOverlayRow"),
     aiCleanPoseOverlayToggle: document.getElementById("aiCleanPoseOverlayToggle"),
     aiCleanRunBtn: document.getElementById("aiCleanRunBtn"),
+    aiCleanCancelBtn: document.getElementById("aiCleanCancelBtn"),
     aiCleanRemoveRefBtn: document.getElementById("aiCleanRemoveRefBtn"),
     aiCleanResetBtn: document.getElementById("aiCleanResetBtn"),
     aiCleanGrid: document.getElementById("aiCleanGrid"),
@@ -31,8 +31,8 @@ const dictionary = {
         "images.startNumberPlaceholder": "起始数字", "images.keywordPlaceholder": "关键字", "images.keywordActionNone": "仅重命名", "images.keywordActionFilter": "只作用于命中项",
         "images.keywordActionDelete": "删除命中项", "images.keywordActionKeep": "仅保留命中项", "images.renameBtn": "执行整理", "images.exportTitle": "批量导出",
         "images.exportBtn": "导出图片包", "images.generateTitle": "AI 批量生成", "images.promptPlaceholder": "描述你想生成的目标风格或修改效果...", "images.overwriteLabel": "生成后覆盖同名文件",
-        "images.apiKeyPlaceholder": "输入 RunningHub API Key", "images.configRequired": "请填写 RunningHub API Key", "images.requestUrlPlaceholder": "输入 RunningHub 模型接口地址",
-        "images.queryUrlPlaceholder": "输入查询接口地址", "images.aspectRatioCustom": "自定义", "images.customAspectRatioPlaceholder": "输入自定义 aspectRatio，例如 7:10",
+        "images.apiKeyPlaceholder": "输入 RunningHub API Key，多个用逗号分隔", "images.configRequired": "请填写 RunningHub API Key", "images.requestUrlPlaceholder": "输入 RunningHub 模型接口地址",
+        "images.queryUrlPlaceholder": "输入查询接口地址", "images.concurrencyPlaceholder": "同时进行的任务数（默认 4）", "images.aspectRatioCustom": "自定义", "images.customAspectRatioPlaceholder": "输入自定义 aspectRatio，例如 7:10",
         "images.requestUrlRequired": "请填写 RunningHub 模型接口地址", "images.queryUrlRequired": "请填写查询接口地址", "images.customAspectRatioRequired": "请选择自定义后再填写 aspectRatio",
         "images.extraReferenceLabel": "附加参考图（图2~图N）", "images.extraReferenceSelectBtn": "选择附加参考图", "images.extraReferenceSummaryIdle": "未选择文件",
         "images.extraReferenceSummarySelected": "已选择 {{count}} 个文件", "images.extraReferenceHint": "默认图像处理区的原图会作为图1；这里上传的图片会按顺序作为图2、图3、图4……",
@@ -45,7 +45,7 @@ const dictionary = {
         "images.workflowAspectConfigInvalid": "比例节点的 nodeId 和 fieldName 需要同时填写，或同时留空", "images.advancedToggle": "高级设置（自动解析 / 手动节点）", "images.autoParseToggle": "自动解析", "images.manualNodeToggle": "高级设置（模型参数）", "images.runninghubModelLabel": "RunningHub 模型", "images.runninghubModelPlaceholder": "上传示例后自动回填，或手动输入模型名", "images.runninghubModelRequired": "请填写 RunningHub 模型", "images.runninghubManualParamsHint": "这里可填写不同模型的额外请求参数，格式为 JSON 对象；自动解析也会回填到这里。", "images.runninghubExtraParamsPlaceholder": "{\"resolution\":\"2k\"}", "images.runninghubExtraParamsInvalid": "高级设置中的模型参数必须是合法的 JSON 对象",
         "images.exampleFileLabel": "上传官方 Python 示例", "images.exampleTextareaPlaceholder": "粘贴官方 Python 请求示例，点击解析后自动回填配置", "images.parseExampleBtn": "解析示例",
         "images.exampleParseRequired": "请先上传或粘贴 RunningHub 官方 Python 请求示例", "images.exampleParseSuccess": "示例解析成功，已自动回填工作流配置",
-        "images.selectionHint": "未选择图片时默认处理全部", "images.selectionSelected": "已选择 {{count}} 张图片", "images.generateBtn": "开始生成", "images.clearSelection": "清空",
+        "images.selectionHint": "未选择图片时默认处理全部", "images.selectionSelected": "已选择 {{count}} 张图片", "images.generateBtn": "开始生成", "images.resumeGenerationBtn": "恢复任务", "images.clearSelection": "清空",
         "images.galleryTitle": "图像瀑布流", "images.galleryFilter": "搜索...", "images.filterBtn": "搜索", "images.galleryEmpty": "暂无图片", "images.uploadProgressTitle": "上传进度",
         "images.uploadProgressIdle": "暂无上传任务", "images.uploadProgressPreparing": "共有 {{count}} 个文件待上传", "images.uploadProgressRunning": "正在上传 {{done}} / {{total}}",
         "images.uploadProgressDone": "全部上传完成", "images.uploadProgressError": "上传结束，但部分文件失败", "images.uploadProgressWaiting": "等待上传", "images.uploadProgressSuccess": "上传完成",
@@ -71,7 +71,7 @@ const dictionary = {
         "ai.imageCleanPoseMatchMode": "匹配方式", "ai.imageCleanPoseMatchAny": "任意匹配", "ai.imageCleanPoseMatchAnyDesc": "任意一个动作匹配即可",
         "ai.imageCleanPoseMatchPrecise": "精准匹配", "ai.imageCleanPoseMatchPreciseDesc": "必须包含所选全部动作",
         "ai.imageCleanReferenceLabel": "参考图", "ai.imageCleanSelectRefBtn": "选择参考图", "ai.imageCleanRefSummaryIdle": "未选择文件", "ai.imageCleanReferencePreview": "参考图预览",
-        "ai.imageCleanLimitLabel": "展示数量", "ai.imageCleanHint": "概率越接近 100% 表示越相似。", "ai.imageCleanRunBtn": "筛选相似图片", "ai.imageCleanResetBtn": "清空结果",
+        "ai.imageCleanLimitLabel": "展示数量", "ai.imageCleanHint": "概率越接近 100% 表示越相似。", "ai.imageCleanRunBtn": "筛选相似图片", "ai.imageCleanCancelBtn": "取消筛选", "ai.imageCleanResetBtn": "清空结果",
         "ai.imageCleanResultTitle": "相似图片结果", "ai.imageCleanEmpty": "暂无图片", "ai.imageCleanMissingRef": "请先上传参考图", "ai.imageCleanDone": "筛选完成",
         "ai.imageCleanFail": "筛选失败", "ai.imageCleanUploadDrop": "拖拽图片到此处，或点击选择参考图", "ai.imageCleanUploadNote": "仅支持上传 1 张参考图",
         "ai.imageCleanUploadSelected": "已选择：{{name}}", "ai.imageCleanRefTooMany": "一次只支持上传 1 张参考图，请重新选择。", "ai.imageCleanRefNotImage": "请选择图片文件。",
@@ -111,8 +111,8 @@ const dictionary = {
         "images.deleteConfirm": "Delete the selected images? This cannot be undone.", "images.clearConfirm": "Clear all images? This cannot be undone.", "images.clearSuccess": "All images were cleared", "images.deleteSuccess": "Selected images were deleted",
         "images.renameTitle": "Batch Rename", "images.prefixPlaceholder": "Prefix", "images.startNumberPlaceholder": "Start number", "images.keywordPlaceholder": "Keyword", "images.keywordActionNone": "Rename only", "images.keywordActionFilter": "Apply to matches",
         "images.keywordActionDelete": "Delete matches", "images.keywordActionKeep": "Keep matches only", "images.renameBtn": "Apply", "images.exportTitle": "Batch Export", "images.exportBtn": "Export Image Pack", "images.generateTitle": "AI Batch Generate",
-        "images.promptPlaceholder": "Describe the target style or edit you want...", "images.overwriteLabel": "Overwrite files with the same name", "images.apiKeyPlaceholder": "Enter the RunningHub API key", "images.configRequired": "Enter the RunningHub API key",
-        "images.requestUrlPlaceholder": "Enter the RunningHub model endpoint URL", "images.queryUrlPlaceholder": "Enter the query endpoint URL", "images.aspectRatioCustom": "Custom", "images.customAspectRatioPlaceholder": "Enter a custom aspectRatio, such as 7:10",
+        "images.promptPlaceholder": "Describe the target style or edit you want...", "images.overwriteLabel": "Overwrite files with the same name", "images.apiKeyPlaceholder": "Enter the RunningHub API key (comma-separate several keys)", "images.configRequired": "Enter the RunningHub API key",
+        "images.requestUrlPlaceholder": "Enter the RunningHub model endpoint URL", "images.queryUrlPlaceholder": "Enter the query endpoint URL", "images.concurrencyPlaceholder": "Tasks in flight at once (default 4)", "images.aspectRatioCustom": "Custom", "images.customAspectRatioPlaceholder": "Enter a custom aspectRatio, such as 7:10",
         "images.requestUrlRequired": "Enter the RunningHub model endpoint URL", "images.queryUrlRequired": "Enter the query endpoint URL", "images.customAspectRatioRequired": "Enter a custom aspectRatio", "images.extraReferenceLabel": "Extra reference images (Image 2~N)",
         "images.extraReferenceSelectBtn": "Choose extra references", "images.extraReferenceSummaryIdle": "No files selected", "images.extraReferenceSummarySelected": "{{count}} file(s) selected", "images.extraReferenceHint": "The original image from the Images page is always submitted as Image 1. Files uploaded here are sent in order as Image 2, Image 3, Image 4, and so on.",
         "images.extraReferenceItem": "Image {{index}} · {{name}}", "images.extraReferenceRemove": "Remove", "images.workflowExtraImageNodesPlaceholder": "Extra image nodes, one per line, format: nodeId:fieldName", "images.workflowExtraImageNodesInvalid": "Invalid extra image node format. Use one nodeId:fieldName per line.",
@@ -121,7 +121,7 @@ const dictionary = {
         "images.workflowHint": "Different RunningHub workflows may use different nodeId / fieldName values. If you see NODE_INFO_MISMATCH in logs, update them here first.", "images.workflowImageConfigRequired": "Enter the image nodeId and fieldName", "images.workflowPromptConfigInvalid": "Prompt nodeId and fieldName must be filled together or left blank together",
         "images.workflowAspectConfigInvalid": "Aspect nodeId and fieldName must be filled together or left blank together", "images.advancedToggle": "Advanced Settings (Auto Parse / Manual Nodes)", "images.autoParseToggle": "Auto Parse", "images.manualNodeToggle": "Advanced Settings (Model Params)", "images.runninghubModelLabel": "RunningHub Model", "images.runninghubModelPlaceholder": "Auto-filled from the uploaded example, or enter the model name manually", "images.runninghubModelRequired": "Enter the RunningHub model", "images.runninghubManualParamsHint": "Fill extra model parameters here as a JSON object. Auto parse will also write back into this box.", "images.runninghubExtraParamsPlaceholder": "{\"resolution\":\"2k\"}", "images.runninghubExtraParamsInvalid": "Advanced model parameters must be a valid JSON object", "images.exampleFileLabel": "Upload official Python example", "images.exampleTextareaPlaceholder": "Paste the official RunningHub Python request example and click Parse to fill the config automatically",
         "images.parseExampleBtn": "Parse Example", "images.exampleParseRequired": "Upload or paste the official RunningHub Python request example first", "images.exampleParseSuccess": "Example parsed and workflow config filled automatically", "images.selectionHint": "All images will be used when none are selected", "images.selectionSelected": "{{count}} image(s) selected",
-        "images.generateBtn": "Generate", "images.clearSelection": "Clear", "images.galleryTitle": "Image Gallery", "images.galleryFilter": "Search...", "images.filterBtn": "Search", "images.galleryEmpty": "No images yet", "images.uploadProgressTitle": "Upload Progress",
+        "images.generateBtn": "Generate", "images.resumeGenerationBtn": "Resume Job", "images.clearSelection": "Clear", "images.galleryTitle": "Image Gallery", "images.galleryFilter": "Search...", "images.filterBtn": "Search", "images.galleryEmpty": "No images yet", "images.uploadProgressTitle": "Upload Progress",
         "images.uploadProgressIdle": "No upload tasks", "images.uploadProgressPreparing": "{{count}} file(s) waiting to upload", "images.uploadProgressRunning": "Uploading {{done}} / {{total}}", "images.uploadProgressDone": "All uploads finished", "images.uploadProgressError": "Uploads finished with some failures",
         "images.uploadProgressWaiting": "Waiting", "images.uploadProgressSuccess": "Uploaded", "images.uploadProgressFailed": "Failed", "images.uploadProgressNetwork": "Network error, please try again later", "images.uploadSummarySuccess": "{{count}} succeeded", "images.uploadSummarySkip": "{{count}} skipped", "images.uploadSummaryFail": "{{count}} failed", "images.uploadBusy": "Another upload is already running",
         "images.consoleTitle": "AI Generation Logs", "images.uploadEmpty": "Choose at least one file", "images.manualUploadTitle": "Upload generated image", "images.manualUploadSuccess": "Upload succeeded", "images.manualUploadFailed": "Upload failed", "ai.title": "AI Processing",
@@ -142,7 +142,7 @@ const dictionary = {
         "ai.imageCleanPoseMatchMode": "Match Mode", "ai.imageCleanPoseMatchAny": "Any Match", "ai.imageCleanPoseMatchAnyDesc": "Any selected pose is enough",
         "ai.imageCleanPoseMatchPrecise": "Precise Match", "ai.imageCleanPoseMatchPreciseDesc": "Must include all selected poses",
         "ai.imageCleanReferenceLabel": "Reference", "ai.imageCleanSelectRefBtn": "Select Reference", "ai.imageCleanRefSummaryIdle": "No file selected", "ai.imageCleanReferencePreview": "Reference Preview",
-        "ai.imageCleanLimitLabel": "Show Top", "ai.imageCleanHint": "Scores closer to 100% indicate higher similarity.", "ai.imageCleanRunBtn": "Find Similar Images", "ai.imageCleanResetBtn": "Clear Results",
+        "ai.imageCleanLimitLabel": "Show Top", "ai.imageCleanHint": "Scores closer to 100% indicate higher similarity.", "ai.imageCleanRunBtn": "Find Similar Images", "ai.imageCleanCancelBtn": "Cancel", "ai.imageCleanResetBtn": "Clear Results",
         "ai.imageCleanResultTitle": "Similarity Results", "ai.imageCleanEmpty": "No images", "ai.imageCleanMissingRef": "Please upload a reference image first.", "ai.imageCleanDone": "Filtering complete",
         "ai.imageCleanFail": "Filtering failed", "ai.imageCleanUploadDrop": "Drop an image here, or click to choose a reference", "ai.imageCleanUploadNote": "Only 1 reference image is supported",
         "ai.imageCleanUploadSelected": "Selected: {{name}}", "ai.imageCleanRefTooMany": "Only 1 reference image is supported. Please reselect.", "ai.imageCleanRefNotImage": "Please choose an image file.",
@@ -95,6 +95,7 @@ export const state = {
         referencePersonIds: new Set(),
         poseMatchMode: "any",
         referenceImageSize: null,
+        referenceToken: null,
         referenceFile: null,
         referencePreviewUrl: null,
         filterKeyword: "",
@@ -103,6 +104,8 @@ export const state = {
         hasSimilarity: false,
         selected: new Set(),
         running: false,
+        runId: null,
+        cancelling: false,
     },
     generating: {
         active: false,
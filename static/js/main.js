@@ -8,7 +8,7 @@ import {applyTheme, toggleTheme} from "./core/theme.js";
 import {showToast} from "./core/toast.js";
 import {initAiTagModule, renderAiTagFilters, renderAiTagGallery, syncTagBaseFromGallery, updateAiTagSelectionHint} from "./modules/ai_tag.js";
 import {initAiCleanModule, loadAiCleanGallery} from "./modules/ai_clean.js";
-import {initAiGenerateModule, initializeGenerationDefaults, loadAiGallery, renderExtraReferenceList} from "./modules/ai_generate.js";
+import {initAiGenerateModule, initializeGenerationDefaults, loadAiGallery, renderExtraReferenceList, syncResumeGenerationButton} from "./modules/ai_generate.js";
 import {applySectionState, initConsoleModule} from "./modules/console.js";
 import {initDownloadModule} from "./modules/download.js";
 import {initImagesModule, loadGallery, registerGalleryHook, updateSelectionHint} from "./modules/images.js";
@@ -140,6 +140,7 @@ function handleStatusPayload(data) {
     applySectionState("generation", data.image_generation);
     applySectionState("ai_clean", data.ai_clean);
     applySectionState("ai_tag", data.ai_tag);
+    syncResumeGenerationButton(data.image_generation);
 
     if (showSectionErrorIfNeeded("setup", data.setup)) return;
     if (showSectionErrorIfNeeded("download", data.download)) return;
@@ -1,9 +1,12 @@
 import {dom, formatBytes} from "../core/dom.js";
-import {fetchJSON} from "../core/api.js";
+import {fetchJSON, postJSON} from "../core/api.js";
 import {formatText, getText, registerTranslationHook} from "../core/i18n.js";
 import {showModal} from "../core/modal.js";
 import {state} from "../core/state.js";
 
+// 后台筛选时轮询结果游标的间隔
+const RESULT_POLL_INTERVAL_MS = 1000;
+
 const COCO_KEYPOINT_EDGES = [
     [5, 7], [7, 9],
     [6, 8], [8, 10],
@@ -21,7 +24,11 @@ async function postForm(url, formData) {
     const response = await fetch(url, {method: "POST", body: formData});
     const data = await response.json();
     if (!response.ok) {
-        throw new Error(data.message || "Request failed");
+        const error = new Error(data.message || "Request failed");
+        // 后端用 error_code 标识可以自动处理的错误（如参考图令牌过期），不依赖提示文案
+        error.status = response.status;
+        error.code = data.error_code || "";
+        throw error;
     }
     return data;
 }
@@ -37,6 +44,7 @@ function clearPoseReferenceState() {
     state.aiCleaning.referencePersons = [];
     state.aiCleaning.referencePersonIds?.clear();
     state.aiCleaning.referenceImageSize = null;
+    state.aiCleaning.referenceToken = null;
     state.aiCleaning.referencePoseLoading = false;
     state.aiCleaning.poseMatchMode = "any";
     if (dom.aiCleanPosePickerOverlay) dom.aiCleanPosePickerOverlay.innerHTML = "";
@@ -168,6 +176,7 @@ async function loadReferencePosePreview() {
         const persons = Array.isArray(response.persons) ? response.persons : [];
         state.aiCleaning.referencePersons = persons;
         state.aiCleaning.referenceImageSize = response.image_size || null;
+        state.aiCleaning.referenceToken = response.reference_token || null;
 
         if (!persons.length) {
             dom.aiCleanPosePickerHint.textContent = getText("ai.imageCleanPoseNoPersons");
@@ -432,26 +441,84 @@ async function handleAiCleanSubmit(event) {
     state.aiCleaning.running = true;
     dom.aiCleanRunBtn.disabled = true;
     try {
-        const formData = new FormData();
-        formData.append("reference", reference);
-        formData.append("mode", state.aiCleaning.mode || "similarity");
-        if (state.aiCleaning.mode === "pose") {
-            const selected = Array.from(state.aiCleaning.referencePersonIds || []);
-            formData.append("reference_person_ids", JSON.stringify(selected));
-            formData.append("pose_match_mode", state.aiCleaning.poseMatchMode === "precise" ? "precise" : "any");
+        const buildFormData = (useToken) => {
+            const formData = new FormData();
+            // 骨骼点模式下预览已解析过参考图，优先传令牌让后端复用结果
+            if (useToken) formData.append("reference_token", state.aiCleaning.referenceToken);
+            else formData.append("reference", reference);
+            formData.append("mode", state.aiCleaning.mode || "similarity");
+            // 后台执行并立即返回 run_id，边筛选边通过游标拿到当前最相似的结果
+            formData.append("async", "1");
+            if (state.aiCleaning.mode === "pose") {
+                const selected = Array.from(state.aiCleaning.referencePersonIds || []);
+                formData.append("reference_person_ids", JSON.stringify(selected));
+                formData.append("pose_match_mode", state.aiCleaning.poseMatchMode === "precise" ? "precise" : "any");
+            }
+            return formData;
+        };
+
+        const useToken = state.aiCleaning.mode === "pose" && Boolean(state.aiCleaning.referenceToken);
+        let response;
+        try {
+            response = await postForm("/api/ai/clean/similar", buildFormData(useToken));
+        } catch (error) {
+            if (!useToken || error.code !== "reference_expired") throw error;
+            state.aiCleaning.referenceToken = null;
+            response = await postForm("/api/ai/clean/similar", buildFormData(false));
         }
-
-        const response = await postForm("/api/ai/clean/similar", formData);
-        state.aiCleaning.displayItems = Array.isArray(response.items) ? response.items : [];
+        state.aiCleaning.runId = response.run_id;
+        state.aiCleaning.displayItems = [];
         state.aiCleaning.hasSimilarity = true;
         state.aiCleaning.selected.clear();
         renderAiCleanResults();
-        showModal(getText("modal.title"), response.message || getText("ai.imageCleanDone"));
+        syncAiCleanCancelButton();
+        const result = await followFilterRun(response.run_id);
+        if (result.status === "error") {
+            showModal(getText("modal.title"), result.message || getText("ai.imageCleanFail"));
+        } else {
+            showModal(getText("modal.title"), result.message || getText("ai.imageCleanDone"));
+        }
     } catch (error) {
         showModal(getText("modal.title"), error.message || getText("ai.imageCleanFail"));
     } finally {
         state.aiCleaning.running = false;
+        state.aiCleaning.runId = null;
+        state.aiCleaning.cancelling = false;
         dom.aiCleanRunBtn.disabled = false;
+        syncAiCleanCancelButton();
+    }
+}
+
+async function followFilterRun(runId) {
+    let cursor = null;
+    while (true) {
+        const query = cursor === null ? "" : `&cursor=${cursor}`;
+        const snapshot = await fetchJSON(`/api/ai/clean/results?run_id=${encodeURIComponent(runId)}${query}&_=${Date.now()}`);
+        cursor = snapshot.cursor;
+        if (snapshot.changed && Array.isArray(snapshot.items)) {
+            state.aiCleaning.displayItems = snapshot.items;
+            renderAiCleanResults();
+        }
+        if (snapshot.done) return snapshot;
+        await new Promise((resolve) => setTimeout(resolve, RESULT_POLL_INTERVAL_MS));
+    }
+}
+
+function syncAiCleanCancelButton() {
+    if (!dom.aiCleanCancelBtn) return;
+    dom.aiCleanCancelBtn.classList.toggle("hidden", !state.aiCleaning.runId);
+    dom.aiCleanCancelBtn.disabled = Boolean(state.aiCleaning.cancelling);
+}
+
+async function handleAiCleanCancel() {
+    if (!state.aiCleaning.runId || state.aiCleaning.cancelling) return;
+    state.aiCleaning.cancelling = true;
+    syncAiCleanCancelButton();
+    try {
+        await postJSON("/api/ai/clean/cancel", {run_id: state.aiCleaning.runId});
+    } catch (error) {
+        // 任务可能刚好结束，结果仍由轮询带回
+        console.warn("cancel filter run failed", error);
     }
 }
 
@@ -604,6 +671,7 @@ export function initAiCleanModule() {
     dom.aiCleanForm?.addEventListener("submit", handleAiCleanSubmit);
     dom.aiCleanRemoveRefBtn?.addEventListener("click", handleAiCleanRemoveReference);
     dom.aiCleanResetBtn?.addEventListener("click", handleAiCleanReset);
+    dom.aiCleanCancelBtn?.addEventListener("click", handleAiCleanCancel);
     dom.aiCleanPoseOverlayToggle?.addEventListener("change", () => {
         state.aiCleaning.showPoseOverlay = Boolean(dom.aiCleanPoseOverlayToggle.checked);
         renderAiCleanResults();
@@ -281,10 +281,11 @@ async function handleGenerateSubmit(event) {
         aspect_ratio: resolveAspectRatioValue(),
         image_api_url: dom.runninghubImageUrlInput?.value.trim() || "",
         query_url: dom.runninghubQueryUrlInput?.value.trim() || appConfig.runninghubQueryUrl || "",
+        concurrency: dom.runninghubConcurrencyInput?.value.trim() || "",
         extra_params: extraParams,
     };
 
-    if (!payload.api_key) {
+    if (!payload.api_key && !appConfig.runninghubKeyPoolSize) {
         showModal(getText("modal.title"), getText("images.configRequired"));
         dom.generateBtn.disabled = false;
         return;
@@ -335,6 +336,29 @@ async function handleGenerateSubmit(event) {
     }
 }
 
+export function syncResumeGenerationButton(generation) {
+    dom.resumeGenerationBtn?.classList.toggle("hidden", !generation?.needs_key);
+}
+
+async function handleResumeGeneration() {
+    // 上次的任务所用 Key 不在服务端 Key 池中：用重新填写的 Key 继续，已提交的条目不会重复提交
+    const apiKey = dom.runninghubApiKeyInput?.value.trim() || "";
+    if (!apiKey && !appConfig.runninghubKeyPoolSize) {
+        showModal(getText("modal.title"), getText("images.configRequired"));
+        return;
+    }
+    dom.resumeGenerationBtn.disabled = true;
+    try {
+        const response = await postJSON("/api/ai/generate/resume", {api_key: apiKey});
+        dom.resumeGenerationBtn.classList.add("hidden");
+        showModal(getText("modal.title"), response.message);
+    } catch (error) {
+        showModal(getText("modal.title"), error.message);
+    } finally {
+        dom.resumeGenerationBtn.disabled = false;
+    }
+}
+
 async function handleTagSubmit(event) {
     event.preventDefault();
     const submitButton = dom.tagForm?.querySelector('button[type="submit"]');
@@ -377,6 +401,7 @@ export function initAiGenerateModule() {
         }
     });
     dom.generationForm?.addEventListener("submit", handleGenerateSubmit);
+    dom.resumeGenerationBtn?.addEventListener("click", handleResumeGeneration);
     dom.clearAiSelectionBtn?.addEventListener("click", clearAiSelection);
     dom.applyAiFilterBtn?.addEventListener("click", () => loadAiGallery(dom.aiGalleryFilter?.value.trim() || ""));
     dom.tagForm?.addEventListener("submit", handleTagSubmit);